@@ -37,15 +37,23 @@ Render GeoJSON as ASCII with Python.
 
 
 from .core import (
-    array2ascii, ascii2array, dict2table, min_bbox, paginate, render,
-    render_multiple, stack, style, style_multiple
+    array2ascii, ascii2array, dict2table, dicts2table, min_bbox, paginate, render,
+    render_labels, render_multiple, render_to_file, stack, stack_labels, style, style_multiple
 )
 
 from .core import (
     DEFAULT_WIDTH, DEFAULT_FILL, DEFAULT_CHAR, DEFAULT_CHAR_RAMP,
-    DEFAULT_CHAR_COLOR, DEFAULT_COLOR_CHAR, ANSI_COLORMAP
+    DEFAULT_CHAR_COLOR, DEFAULT_COLOR_CHAR, ANSI_COLORMAP, DENSITY_METHODS,
+    DEFAULT_BBOX_MARGIN, MaxCellsError
 )
 
+from .geobuffer import GeometryBuffer
+from .pool import DatasourcePool
+from .pyramid import Pyramid
+from .subcell import pack_labels, render_subcell
+from .tiles import TileStore
+from .tiling import paginate_tiles
+
 
 __version__ = '0.4.1'
 __author__ = 'Kevin Wurster'
@@ -28,23 +28,55 @@ $ cat sample-data/polygons.geojson | gj2ascii - \\
 """
 
 
+import atexit
+from contextlib import contextmanager
 import itertools
 import os
 import random
 import string
+import warnings
 
 import gj2ascii
+from gj2ascii import encoders
+from gj2ascii import geobuffer
+from gj2ascii import parallel
+from gj2ascii import server
+from gj2ascii.index import FeatureIndex
+from gj2ascii.index import sidecar as index_sidecar
+from gj2ascii.pool import DatasourcePool
+from gj2ascii.prefetch import DEFAULT_PREFETCH_SIZE
+from gj2ascii.prefetch import Prefetcher
+from gj2ascii.pyramid import Pyramid
+from gj2ascii.pyramid import sidecar
+from gj2ascii.reproject import reproject
+from gj2ascii.reproject import transform_bounds
+from gj2ascii.subcell import GLYPHS
+from gj2ascii.tiles import TileStore
+from gj2ascii.tiles import is_store
+from .pycompat import BadZipFile
+from .pycompat import shared_memory
 from .pycompat import zip_longest
 from .pycompat import string_types
 
 import click
-import fiona as fio
+from click.globals import resolve_color_default
+import click.utils
 try:  # pragma no cover
     import emoji
 except ImportError:  # pragma no cover
     emoji = None
 
 
+# Datasources are opened to list layers, compute the bbox, and render, so keep
+# them open.  When running as a server the handles persist between requests,
+# so they are only closed when the interpreter exits.
+_POOL = DatasourcePool()
+atexit.register(_POOL.close)
+
+# Number of characters to collect before writing paginated output
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
 def _build_colormap(c_map, f_map):
 
     """
@@ -54,6 +86,43 @@ def _build_colormap(c_map, f_map):
     return {k: v for k, v in c_map + f_map if v is not None}
 
 
+def _drop_ansi_colors(colormap, outfile):
+
+    """
+    `click.echo()` strips ANSI codes when writing to something that isn't a
+    terminal so don't spend time adding them to every page when dumping
+    features or tiles.  Emoji are kept.  Pages left unstyled are identical to
+    `--no-style` rather than to stripped `style()` output, which has a
+    trailing space after every cell.
+    """
+
+    if colormap and click.utils.should_strip_ansi(outfile, resolve_color_default()):
+        return {k: v for k, v in colormap.items() if v not in gj2ascii.ANSI_COLORMAP}
+    return colormap
+
+
+def _write_pages(pages, outfile, bufsize=_WRITE_BUFFER_SIZE):
+
+    """
+    Write paginated output in large batches rather than one page at a time so
+    encoding, newline handling, and flushing happen once per batch.  The output
+    is identical to calling `click.echo()` once per page.
+    """
+
+    batch = []
+    size = 0
+    for page in pages:
+        batch.append(page)
+        batch.append('\n')
+        size += len(page) + 1
+        if size >= bufsize:
+            click.echo(''.join(batch), file=outfile, nl=False)
+            batch = []
+            size = 0
+    if batch:
+        click.echo(''.join(batch), file=outfile, nl=False)
+
+
 def _cb_char_and_fill(ctx, param, value):
 
     """
@@ -122,6 +191,31 @@ def _cb_properties(ctx, param, value):
         return value.split(',')
 
 
+def _cb_ramp(ctx, param, value):
+
+    """
+    Click callback to validate --ramp.  Either a string of characters or a
+    comma separated list of colors.  Colors are converted to characters.
+
+    Returns
+    -------
+    tuple
+        A list of characters and a colormap.
+    """
+
+    if value is None:
+        return None, {}
+    colors = value.split(',')
+    if len(colors) > 1 or value in gj2ascii.DEFAULT_COLOR_CHAR:
+        for color in colors:
+            if color not in gj2ascii.DEFAULT_COLOR_CHAR:
+                raise click.BadParameter("unrecognized color: `{color}'.".format(color=color))
+        chars = [gj2ascii.DEFAULT_COLOR_CHAR[c] for c in colors]
+        return chars, dict(zip(chars, colors))
+    else:
+        return list(value), {}
+
+
 def _cb_multiple_default(ctx, param, value):
 
     """
@@ -138,6 +232,17 @@ def _cb_multiple_default(ctx, param, value):
         return value
 
 
+def _cb_aspect(ctx, param, value):
+
+    """
+    Click callback to validate --aspect.
+    """
+
+    if value <= 0:
+        raise click.BadParameter("must be > 0: {value}".format(value=value))
+    return value
+
+
 def _cb_bbox(ctx, param, value):
 
     """
@@ -198,8 +303,10 @@ def _cb_infile(ctx, param, value):
         _split = ds_layers.split(',')
         ds = _split[0]
         layers = _split[1:]
-        if ds != '-' and (len(layers) is 0 or '%all' in layers):
-            layers = fio.listlayers(ds)
+        if ds != '-' and is_store(ds):
+            layers = [None]
+        elif ds != '-' and (len(layers) is 0 or '%all' in layers):
+            layers = _POOL.listlayers(ds)
         elif ds == '-':
             layers = [None]
         output.append((ds, layers))
@@ -207,6 +314,237 @@ def _cb_infile(ctx, param, value):
     return output
 
 
+def _load_pyramid(ds, layer, crs, all_touched):
+
+    """
+    Load a datasource's pyramid sidecar file, building and writing it first if
+    it is missing, out of date, or was built with a different `all_touched`.
+    """
+
+    path = sidecar(ds, layer, crs=crs)
+    if os.path.exists(path):
+        # Unreadable sidecars, like those from an older version or a build
+        # that was interrupted, are rebuilt
+        try:
+            pyramid = Pyramid.load(path)
+        except (BadZipFile, KeyError, ValueError):
+            pyramid = None
+        if pyramid is not None and not pyramid.is_stale(ds) \
+                and pyramid.all_touched == all_touched:
+            return pyramid
+    with _POOL.open(ds, layer=layer, crs=crs) as src:
+        pyramid = Pyramid.build(src, bbox=src.bounds, all_touched=all_touched, source=ds)
+    pyramid.save(path)
+    return pyramid
+
+
+def _load_geometries(ds, layer, crs):
+
+    """
+    Load a datasource's geometry sidecar file, building and writing it first
+    if it is missing or out of date.
+    """
+
+    path = geobuffer.sidecar(ds, layer)
+    if os.path.exists(path):
+        try:
+            geometries = geobuffer.GeometryBuffer.load(path)
+        except ValueError:
+            geometries = None
+        if geometries is not None and not geometries.is_stale(ds):
+            return geometries
+    with _POOL.open(ds, layer=layer, crs=crs) as src:
+        geometries = geobuffer.GeometryBuffer.from_features(src)
+    geometries.save(path, source=ds)
+    return geometries
+
+
+def _load_index(ds, layer, crs):
+
+    """
+    Load a datasource's feature index sidecar file, building and writing it
+    first if it is missing or out of date.
+    """
+
+    path = index_sidecar(ds, layer)
+    if os.path.exists(path):
+        index = FeatureIndex.load(path)
+        if not index.is_stale(ds):
+            return index
+    with _POOL.open(ds, layer=layer, crs=crs) as src:
+        index = FeatureIndex.build(src, source=ds)
+    index.save(path)
+    return index
+
+
+@contextmanager
+def _iterate_source(ds, layer, crs, ignore_fields, direct=False):
+
+    """
+    Open the layer `--iterate` reads from.  Produces `None` when features
+    are read directly from their byte range in the file.
+    """
+
+    if direct:
+        yield None
+    else:
+        with _POOL.open(ds, layer=layer, crs=crs, ignore_fields=ignore_fields) as src:
+            yield src
+
+
+def _source_crs(src):
+
+    """
+    Get a layer's CRS for reprojection.
+    """
+
+    if not src.crs:
+        raise click.ClickException(
+            "Cannot reproject `{name}' because it does not have a CRS.  Use `--crs` to "
+            "assign one.".format(name=src.path))
+    return src.crs
+
+
+def _reprojected(src, dst_crs):
+
+    """
+    Reproject a layer's features to `--dst-crs` while they are read.
+    """
+
+    if not dst_crs:
+        return src
+    return reproject(src, _source_crs(src), dst_crs)
+
+
+def _sampled(src, sample):
+
+    """
+    Determine if `--bbox-sample` applies to an input.  Inputs producing
+    labels directly, like tile stores, pyramids, and geometry caches, already
+    know their exact bounds.
+    """
+
+    return bool(sample) and not hasattr(src, 'labels')
+
+
+def _bounds(src, dst_crs, sample=None, margin=0):
+
+    """
+    Get a layer's bbox in the `--dst-crs`.  When sampling, the bbox is
+    estimated from the first features rather than asking the layer for its
+    bounds, which can mean reading the entire layer.
+    """
+
+    if _sampled(src, sample):
+        bounds = gj2ascii.min_bbox(src, sample=sample, margin=margin)
+    elif hasattr(src, 'bounds'):
+        bounds = src.bounds
+    else:
+        bounds = gj2ascii.min_bbox(src)
+    if dst_crs:
+        bounds = transform_bounds(_source_crs(src), dst_crs, bounds)
+    return list(bounds)
+
+
+@contextmanager
+def _echo_warnings():
+
+    """
+    Print warnings raised while rendering as `Warning: ...` on stderr rather
+    than with Python's default file and line number format.
+    """
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        yield
+    for message in caught:
+        click.echo("Warning: {message}".format(message=message.message), err=True)
+
+
+@contextmanager
+def _open_source(ds, layer, crs, all_touched, pyramid=False, geometry_cache=False):
+
+    """
+    Open something `gj2ascii.render()` can render: a tile store, a pyramid
+    when `--pyramid` is set, a geometry buffer when `--geometry-cache` is set,
+    or a pooled datasource.
+    """
+
+    if is_store(ds):
+        store = TileStore(ds)
+        if store.all_touched != bool(all_touched):
+            raise click.ClickException(
+                "Tile store `%s' was built %s `--all-touched` and must be rendered the same way."
+                % (ds, 'with' if store.all_touched else 'without'))
+        yield store
+    elif pyramid:
+        yield _load_pyramid(ds, layer, crs, all_touched)
+    elif geometry_cache:
+        yield _load_geometries(ds, layer, crs)
+    else:
+        with _POOL.open(ds, layer=layer, crs=crs) as src:
+            yield src
+
+
+def _prompt_pages(pages, outfile, noun, prefetch=0, jump=False):
+
+    """
+    Echo pages one at a time and wait for the user to press enter between
+    each.  `pages` is called to get the pages, and when `jump` is set the
+    user can enter a number to call it again with the offset to start at.
+    Upcoming pages are rendered in the background while waiting at the
+    prompt.
+    """
+
+    if jump:
+        message = "Press enter for next {noun}, a {noun} number to jump to it, or 'q + enter' " \
+                  "to exit".format(noun=noun)
+    else:
+        message = "Press enter for next {noun} or 'q + enter' to exit".format(noun=noun)
+
+    # Only the prefetching thread reads from the input until it is closed
+    def _prefetched(*args):
+        if prefetch:
+            return Prefetcher(pages(*args), size=prefetch)
+        return pages(*args)
+
+    current = _prefetched()
+    try:
+        while True:
+            page = next(current, None)
+            if page is None:
+                break
+            click.echo(page, file=outfile)
+            answer = click.prompt(message, default='', show_default=False, err=True)
+            if jump and answer.strip().isdigit():
+                if prefetch:
+                    current.close()
+                current = _prefetched(int(answer))
+            elif answer not in ('', os.linesep):
+                raise click.Abort()
+    finally:
+        if prefetch:
+            current.close()
+
+
+def _cb_tiles(ctx, param, value):
+
+    """
+    Click callback to parse --tiles from `NxM` to `(N, M)`.
+    """
+
+    if value is None:
+        return None
+    try:
+        cols, rows = [int(v) for v in value.lower().split('x')]
+    except ValueError:
+        raise click.BadParameter("must be formatted as `NxM`, like `3x2`: {value}".format(
+            value=value))
+    if cols < 1 or rows < 1:
+        raise click.BadParameter("must be at least 1x1: {value}".format(value=value))
+    return cols, rows
+
+
 def _cb_print_colors(ctx, param, value):
 
     """
@@ -220,7 +558,74 @@ def _cb_print_colors(ctx, param, value):
     ctx.exit()
 
 
-@click.command()
+def _cb_serve(ctx, param, value):
+
+    """
+    Click callback to start a render server and exit when it is stopped.
+    """
+
+    if not value or ctx.resilient_parsing:
+        return
+    try:
+        server.serve(ctx.command, value)
+    except KeyboardInterrupt:  # pragma no cover
+        pass
+    ctx.exit()
+
+
+class _Command(click.Command):
+
+    """
+    Forwards arguments to a render server when `--server` is given.  This has
+    to happen before the arguments are parsed because the callbacks open the
+    input datasources, which is the work the server exists to avoid.
+    """
+
+    def parse_args(self, ctx, args):
+
+        address = None
+        forward = []
+        args_iter = iter(args)
+        for arg in args_iter:
+            arg = str(arg)
+            if arg == '--server':
+                address = next(args_iter, None)
+            elif arg.startswith('--server='):
+                address = arg.split('=', 1)[1]
+            else:
+                forward.append(arg)
+
+        if address is None:
+            return super(_Command, self).parse_args(ctx, args)
+
+        if '--iterate' in forward and '--no-prompt' not in forward:
+            raise click.UsageError(
+                "Features cannot be interactively paged through a server.  Use `--no-prompt`.",
+                ctx=ctx)
+
+        stdin = None
+        if any(forward[idx] == '-' for idx, opt, _ in server._walk(self, forward) if opt is None):
+            stdin = click.get_text_stream('stdin').read()
+
+        try:
+            response = server.request(address, forward, input=stdin)
+        except (IOError, OSError) as e:
+            raise click.ClickException(
+                "Could not reach server at `{address}': {e}".format(address=address, e=e))
+        click.echo(response['output'], nl=False)
+        ctx.exit(response['exit_code'])
+
+    def invoke(self, ctx):
+
+        # `--max-cells` can only be checked against the bbox once it is known,
+        # which happens deep inside every rendering mode.
+        try:
+            return super(_Command, self).invoke(ctx)
+        except gj2ascii.MaxCellsError as e:
+            raise click.ClickException(str(e))
+
+
+@click.command(cls=_Command)
 @click.version_option(version=gj2ascii.__version__)
 @click.argument('infile', nargs=-1, required=True, callback=_cb_infile)
 @click.option(
@@ -231,6 +636,17 @@ def _cb_print_colors(ctx, param, value):
     '-w', '--width', type=click.INT, default=gj2ascii.DEFAULT_WIDTH,
     help="Render across N text columns.  Height is auto-computed."
 )
+@click.option(
+    '--max-cells', metavar='N', type=click.IntRange(min=1),
+    help="Reduce `--width` until the rendering has at most N cells, which keeps tall areas "
+         "from producing enormous output.  Each cell is 2 bytes of text."
+)
+@click.option(
+    '--aspect', metavar='RATIO', type=click.FLOAT, default=1.0, callback=_cb_aspect,
+    help="Height of a rendered cell divided by its width on screen.  The default assumes "
+         "characters are twice as tall as they are wide.  Use a larger value if renderings "
+         "look vertically stretched."
+)
 @click.option(
     '--iterate', is_flag=True,
     help="Iterate over input features and display each individually."
@@ -257,7 +673,12 @@ def _cb_print_colors(ctx, param, value):
 @click.option(
     '--crs', 'crs_def', metavar='DEF', multiple=True, callback=_cb_multiple_default,
     help="Specify input CRS.  No transformations are performed but this will override the "
-         "input CRS or assign a new one."
+         "input CRS or assign a new one.  Use `--dst-crs` to reproject."
+)
+@click.option(
+    '--dst-crs', metavar='DEF',
+    help="Reproject every layer to this CRS while rendering so layers with different "
+         "coordinate reference systems can be stacked.  `--bbox` is in this CRS."
 )
 @click.option(
     '--no-prompt', is_flag=True,
@@ -274,6 +695,20 @@ def _cb_print_colors(ctx, param, value):
          "will be computed from all input layers, which can be expensive for layers with a "
          "large number of features."
 )
+@click.option(
+    '--bbox-sample', metavar='N', type=click.IntRange(min=1),
+    help="Estimate the bbox from the first N features of each layer instead of reading "
+         "every feature.  Much faster for huge layers and streams but a warning is printed if "
+         "any features fall outside of the estimated area.  Tile stores, pyramids, and "
+         "geometry caches always use their exact bounds.  Not supported with `--iterate` or "
+         "`--tiles`."
+)
+@click.option(
+    '--bbox-margin', metavar='FLOAT', type=click.FLOAT, default=gj2ascii.DEFAULT_BBOX_MARGIN,
+    show_default=True,
+    help="Fraction of the estimated bbox's width and height to add to each side when using "
+         "`--bbox-sample`."
+)
 @click.option(
     '--no-style', is_flag=True,
     help="Disable colors and emoji even if they are specified with `--char`.  Emoji will be "
@@ -283,8 +718,95 @@ def _cb_print_colors(ctx, param, value):
     '--colors', is_flag=True, callback=_cb_print_colors, expose_value=False, is_eager=True,
     help="Print a list of available colors and exit."
 )
-def main(infile, outfile, width, iterate, fill_map, char_map, all_touched, crs_def, no_prompt,
-         properties, bbox, no_style):
+@click.option(
+    '--density', type=click.Choice(gj2ascii.DENSITY_METHODS),
+    help="Render the number of features intersecting each cell with a character ramp "
+         "instead of rendering every intersecting cell with the same character.  Counts are "
+         "classified linearly, on a log scale, or by quantiles.  Only one layer can be "
+         "rendered."
+)
+@click.option(
+    '--ramp', metavar='CHARS', callback=_cb_ramp,
+    help="Characters used by `--density` from lowest to highest, like `.:-=+*#%@`, or a comma "
+         "separated list of colors like `blue,green,yellow,red`."
+)
+@click.option(
+    '--by', metavar='FIELD',
+    help="Render each feature with a character and color based on the value of a field.  "
+         "Characters are assigned in the order values are encountered.  Only one layer can be "
+         "rendered."
+)
+@click.option(
+    '--pyramid', is_flag=True,
+    help="Render from a level-of-detail pyramid stored next to each input datasource, or "
+         "in ~/.cache/gj2ascii if its directory is not writable, which is built on the first "
+         "run and rebuilt when the datasource changes.  "
+         "Makes repeatedly rendering large layers at different widths fast at the cost of "
+         "some accuracy."
+)
+@click.option(
+    '--geometry-cache', is_flag=True,
+    help="Load geometries from a binary cache stored next to each input datasource, which is "
+         "built on the first run and rebuilt when the datasource changes.  Skips parsing "
+         "large layers on every run without changing the output."
+)
+@click.option(
+    '--feature-index', is_flag=True,
+    help="Page through features with `--iterate` using an index of feature bounds stored "
+         "next to the datasource, which is built on the first run and rebuilt when the "
+         "datasource changes.  Features outside of `--bbox` are skipped without being read "
+         "and a feature number can be entered at the prompt to jump to that feature."
+)
+@click.option(
+    '--tiles', metavar='NxM', callback=_cb_tiles,
+    help="Split the bbox into N columns and M rows of tiles and render each tile as a "
+         "page, like `--iterate` does for features.  `--width` applies to each tile.  Only "
+         "one layer can be rendered."
+)
+@click.option(
+    '--glyphs', type=click.Choice(GLYPHS),
+    help="Pack several cells into each character with Unicode braille (2x4) or quadrant "
+         "block (2x2) characters for a more detailed rendering at the same width.  Only "
+         "one layer can be rendered and `--char` is not supported."
+)
+@click.option(
+    '--format', 'fmt', type=click.Choice(sorted(encoders.ENCODERS)), default='text',
+    show_default=True,
+    help="Output format.  `compact` is text without spaces between cells, `html` is a "
+         "<pre> element with a CSS class per layer and colors from `--char` as CSS rules, "
+         "and `npy` writes the label array where 0 is fill and N is the Nth layer, which "
+         "requires `--outfile`.  Only `text` and `html` are styled."
+)
+@click.option(
+    '--prefetch', metavar='N', type=click.IntRange(min=0), default=DEFAULT_PREFETCH_SIZE,
+    show_default=True,
+    help="Number of features rendered ahead of time in a background thread while waiting "
+         "at the `--iterate` prompt.  Use 0 to disable."
+)
+@click.option(
+    '--processes', metavar='N', type=click.IntRange(min=1), default=1,
+    help="Rasterize each layer with N processes by splitting it into ranges of features.  "
+         "Only used when rendering layers from files."
+)
+@click.option(
+    '--build-cache', metavar='DIR', type=click.Path(file_okay=False),
+    help="Rasterize a single layer into a tile store at several zoom levels and exit.  The "
+         "store can be rendered in place of a datasource without reading any vector data, "
+         "which is useful for large layers that rarely change."
+)
+@click.option(
+    '--serve', metavar='SOCKET', callback=_cb_serve, expose_value=False, is_eager=True,
+    help="Start a long-running render server listening on a Unix socket and exit when it is "
+         "stopped.  Use `-` to read newline delimited JSON requests from stdin."
+)
+@click.option(
+    '--server', metavar='SOCKET', expose_value=False,
+    help="Forward all other arguments to a server started with `--serve`."
+)
+def main(infile, outfile, width, max_cells, aspect, iterate, fill_map, char_map, all_touched,
+         crs_def, dst_crs, no_prompt, properties, bbox, bbox_sample, bbox_margin, no_style,
+         density, ramp, by, pyramid, geometry_cache, feature_index, tiles, glyphs, fmt,
+         prefetch, processes, build_cache):
 
     """
     Render spatial vector data as ASCII with colors and emoji.
@@ -339,6 +861,68 @@ def main(infile, outfile, width, iterate, fill_map, char_map, all_touched, crs_d
     fill_char = [c[0] for c in fill_map][-1]
     num_layers = sum([len(layers) for ds, layers in infile])
 
+    stores = [ds for ds, layers in infile if ds != '-' and is_store(ds)]
+    if iterate and (density or by):
+        raise click.ClickException("`--iterate` cannot be combined with `--density` or `--by`.")
+    if ramp[0] is not None and not density:
+        raise click.ClickException("`--ramp` can only be used with `--density`.")
+    if tiles and (iterate or density or by or build_cache):
+        raise click.ClickException(
+            "`--tiles` cannot be combined with `--iterate`, `--density`, `--by`, or "
+            "`--build-cache`.")
+
+    if glyphs and (iterate or tiles or density or by or build_cache or processes > 1):
+        raise click.ClickException(
+            "`--glyphs` cannot be combined with `--iterate`, `--tiles`, `--density`, `--by`, "
+            "`--build-cache`, or `--processes`.")
+
+    if fmt != 'text':
+        if iterate or tiles or density or by or glyphs or build_cache or processes > 1:
+            raise click.ClickException(
+                "`--format` cannot be combined with `--iterate`, `--tiles`, `--density`, "
+                "`--by`, `--glyphs`, `--build-cache`, or `--processes`.")
+        if fmt == 'npy' and (not hasattr(outfile, 'name') or outfile.name == '<stdout>'):
+            raise click.ClickException("`--format npy` requires `--outfile`.")
+
+    if stores and (iterate or density or by or build_cache):
+        raise click.ClickException(
+            "Tile stores can only be rendered.  Cannot use `--iterate`, `--density`, `--by`, "
+            "or `--build-cache` with: %s" % ', '.join(stores))
+
+    # ==== Build a tile store ==== #
+    if build_cache:
+        if num_layers > 1 or len(crs_def) > 1 or len(all_touched) > 1:
+            raise click.ClickException(
+                "Can only build a tile store from a single layer - all layer-specific "
+                "arguments can only be specified once each.")
+        layer = infile[-1][1][-1] if num_layers > 0 else None
+        with _POOL.open(infile[-1][0], layer=layer, crs=crs_def[-1]) as src:
+            TileStore.build(
+                _reprojected(src, dst_crs), build_cache, bbox=bbox or _bounds(src, dst_crs),
+                all_touched=all_touched[-1])
+        return
+
+    if dst_crs and (pyramid or geometry_cache or processes > 1 or stores):
+        raise click.ClickException(
+            "`--dst-crs` cannot be combined with `--pyramid`, `--geometry-cache`, "
+            "`--processes`, or tile stores.")
+
+    for flag, enabled in (('--pyramid', pyramid), ('--geometry-cache', geometry_cache)):
+        if not enabled:
+            continue
+        if iterate or density or by:
+            raise click.ClickException(
+                "`%s` cannot be combined with `--iterate`, `--density`, or `--by`." % flag)
+        if '-' in [ds for ds, layers in infile]:
+            raise click.ClickException("`%s` cannot be used when reading from stdin." % flag)
+    if pyramid and geometry_cache:
+        raise click.ClickException("`--pyramid` cannot be combined with `--geometry-cache`.")
+    if bbox_sample and (iterate or tiles):
+        raise click.ClickException(
+            "`--bbox-sample` cannot be combined with `--iterate` or `--tiles`.")
+    if feature_index and not iterate:
+        raise click.ClickException("`--feature-index` can only be used with `--iterate`.")
+
     # ==== Render individual features ==== #
     if iterate:
 
@@ -381,10 +965,32 @@ def main(infile, outfile, width, iterate, fill_map, char_map, all_touched, crs_d
                 os.linesep * 2 +
                 "This issue has been logged: https://github.com/geowurster/gj2ascii/issues/25"
             )
-        with fio.open(infile[-1][0], layer=layer, crs=crs_def[-1]) as src:
+        index = None
+        if feature_index:
+            if in_ds == '-':
+                raise click.ClickException(
+                    "`--feature-index` cannot be used when reading from stdin.")
+            index = _load_index(in_ds, layer, crs_def[-1])
+
+        # Only read the fields that will be displayed.  The schema comes from a pooled
+        # handle so this is cheap, but stdin can only be read once.
+        ignore_fields = None
+        if in_ds != '-':
+            if index is not None:
+                fields = index.fields
+            else:
+                with _POOL.open(in_ds, layer=layer, crs=crs_def[-1]) as src:
+                    fields = list(src.schema['properties'].keys())
+            if properties == '%all':
+                properties = fields
+            ignore_fields = [f for f in fields if properties is None or f not in properties]
+
+        # GeoJSON features with a known byte range are read without opening the file
+        direct = index is not None and index.positions is not None and not dst_crs
+        with _iterate_source(in_ds, layer, crs_def[-1], ignore_fields, direct) as src:
 
             if properties == '%all':
-                properties = src.schema['properties'].keys()
+                properties = list(src.schema['properties'].keys())
 
             # Get the last specified parameter when possible in case there's a bug in the
             # validation above.
@@ -395,18 +1001,134 @@ def main(infile, outfile, width, iterate, fill_map, char_map, all_touched, crs_d
                 'properties': properties,
                 'all_touched': all_touched[-1],
                 'bbox': bbox,
-                'colormap': _build_colormap(char_map, fill_map)
+                'colormap': _build_colormap(char_map, fill_map),
+                'max_cells': max_cells,
+                'aspect': aspect
             }
             if no_style:
                 kwargs['colormap'] = None
+            else:
+                kwargs['colormap'] = _drop_ansi_colors(kwargs['colormap'], outfile)
+
+            # Features are filtered in the layer's CRS
+            src_bbox = bbox or None
+            if dst_crs:
+                src_bbox = bbox and transform_bounds(dst_crs, _source_crs(src), bbox)
+
+            def _pages(start=0):
+                if index is None:
+                    features = src.filter(bbox=src_bbox)
+                else:
+                    features = index.read(
+                        index.select(bbox=src_bbox, start=start), src=src, path=in_ds,
+                        bbox=src_bbox)
+                if dst_crs:
+                    features = reproject(features, _source_crs(src), dst_crs)
+                return gj2ascii.paginate(features, **kwargs)
+
+            if no_prompt:
+                _write_pages(_pages(), outfile)
+            else:
+                _prompt_pages(
+                    _pages, outfile, 'feature', prefetch=prefetch, jump=index is not None)
 
-            for feature in gj2ascii.paginate(src.filter(bbox=bbox), **kwargs):
-                click.echo(feature, file=outfile)
-                if not no_prompt and click.prompt(
-                        "Press enter for next feature or 'q + enter' to exit",
-                        default='', show_default=False, err=True) \
-                        not in ('', os.linesep):  # pragma no cover
-                    raise click.Abort()
+    # ==== Render a grid of tiles ==== #
+    elif tiles:
+
+        if num_layers > 1 or len(crs_def) > 1 or len(char_map) > 1 or len(all_touched) > 1:
+            raise click.ClickException(
+                "Can only render tiles for a single layer - all layer-specific arguments can "
+                "only be specified once each.")
+        if not no_prompt and hasattr(outfile, 'name') and outfile.name != '<stdout>':
+            no_prompt = True
+        in_ds = infile[-1][0]
+        if in_ds == '-' and not no_prompt:
+            raise click.ClickException(
+                "Cannot prompt for the next tile when reading from stdin.  Use `--no-prompt`.")
+        layer = infile[-1][1][-1] if num_layers > 0 else None
+        if not char_map:
+            char_map = [(gj2ascii.DEFAULT_CHAR, None)]
+        colormap = None
+        if not no_style:
+            colormap = _drop_ansi_colors(_build_colormap(char_map, fill_map), outfile)
+
+        with _open_source(in_ds, layer, crs_def[-1], all_touched[-1], pyramid=pyramid,
+                          geometry_cache=geometry_cache) as src, _echo_warnings():
+            # Tile stores, pyramids, and geometry buffers all have bounds
+            bbox = bbox or _bounds(src, dst_crs)
+
+            def _pages():
+                return gj2ascii.paginate_tiles(
+                    _reprojected(src, dst_crs), tiles, width=width, bbox=bbox,
+                    char=char_map[-1][0], fill=fill_char, all_touched=all_touched[-1],
+                    colormap=colormap, max_cells=max_cells, aspect=aspect)
+
+            if no_prompt:
+                _write_pages(_pages(), outfile)
+            else:
+                _prompt_pages(_pages, outfile, 'tile', prefetch=prefetch)
+
+    # ==== Render feature density or categories ==== #
+    elif density or by:
+
+        if density and by:
+            raise click.ClickException("`--density` and `--by` cannot be combined.")
+        if num_layers > 1 or len(crs_def) > 1 or len(all_touched) > 1:
+            raise click.ClickException(
+                "Can only render density or categories for a single layer - all layer-specific "
+                "arguments can only be specified once each.")
+        if char_map:
+            raise click.ClickException(
+                "`--char` cannot be combined with `--density` or `--by`.  Use `--ramp` to set "
+                "density characters.")
+
+        chars, colormap = ramp
+        charmap = {}
+        layer = infile[-1][1][-1] if num_layers > 0 else None
+        with _POOL.open(infile[-1][0], layer=layer, crs=crs_def[-1]) as src, \
+                _echo_warnings():
+            # Features are only checked against a bbox estimated from a sample
+            if bbox or not _sampled(src, bbox_sample):
+                bbox_sample = None
+            bbox = bbox or _bounds(src, dst_crs, sample=bbox_sample, margin=bbox_margin)
+            rendered = gj2ascii.render(
+                _reprojected(src, dst_crs), width=width, fill=fill_char,
+                all_touched=all_touched[-1], bbox=bbox, density=density, ramp=chars, by=by,
+                charmap=charmap, bbox_sample=bbox_sample, bbox_margin=bbox_margin,
+                max_cells=max_cells, aspect=aspect)
+
+        for char in charmap.values():
+            if char in gj2ascii.DEFAULT_CHAR_COLOR:
+                colormap[char] = gj2ascii.DEFAULT_CHAR_COLOR[char]
+
+        if not no_style:
+            colormap.update(_build_colormap([], fill_map))
+            rendered = gj2ascii.style(rendered, stylemap=colormap)
+        click.echo(rendered, file=outfile)
+
+    # ==== Render a single layer with sub-cell characters ==== #
+    elif glyphs:
+
+        if num_layers > 1 or len(crs_def) > 1 or len(all_touched) > 1:
+            raise click.ClickException(
+                "Can only render a single layer with `--glyphs` - all layer-specific "
+                "arguments can only be specified once each.")
+        if char_map:
+            raise click.ClickException("`--char` cannot be combined with `--glyphs`.")
+
+        in_ds = infile[-1][0]
+        layer = infile[-1][1][-1] if num_layers > 0 else None
+        with _open_source(in_ds, layer, crs_def[-1], all_touched[-1], pyramid=pyramid,
+                          geometry_cache=geometry_cache) as src, _echo_warnings():
+            # Features are only checked against a bbox estimated from a sample
+            if bbox or not _sampled(src, bbox_sample):
+                bbox_sample = None
+            bbox = bbox or _bounds(src, dst_crs, sample=bbox_sample, margin=bbox_margin)
+            rendered = gj2ascii.render_subcell(
+                _reprojected(src, dst_crs), width=width, glyphs=glyphs, fill=fill_char,
+                all_touched=all_touched[-1], bbox=bbox, bbox_sample=bbox_sample,
+                bbox_margin=bbox_margin, max_cells=max_cells, aspect=aspect)
+        click.echo(rendered, file=outfile)
 
     # ==== Render all input layers ==== #
     else:
@@ -435,28 +1157,83 @@ def main(infile, outfile, width, iterate, fill_map, char_map, all_touched, crs_d
             char_map = {gj2ascii.DEFAULT_CHAR: None}
 
         # User didn't specify a bounding box.  Compute the minimum bbox for all layers.
+        # Features are only checked against the bbox if it was estimated from a sample.
+        estimated = False
         if not bbox:
             coords = []
             for ds, layer_names in infile:
                 for layer, crs in zip_longest(layer_names, crs_def):
-                    with fio.open(ds, layer=layer, crs=crs) as src:
-                        coords += list(src.bounds)
+                    if is_store(ds):
+                        coords += list(TileStore(ds).bounds)
+                        continue
+                    if geometry_cache:
+                        coords += list(_load_geometries(ds, layer, crs).bounds)
+                        continue
+                    with _POOL.open(ds, layer=layer, crs=crs) as src:
+                        estimated = estimated or _sampled(src, bbox_sample)
+                        coords += _bounds(src, dst_crs, sample=bbox_sample, margin=bbox_margin)
             bbox = (min(coords[0::4]), min(coords[1::4]), max(coords[2::4]), max(coords[3::4]))
+        if not estimated:
+            bbox_sample = None
 
         # Render everything
-        rendered_layers = []
-        overall_lyr_idx = 0
-        for ds, layer_names in infile:
-            for layer, crs, at in zip_longest(layer_names, crs_def, all_touched):
-                char = [_c[0] for _c in char_map][overall_lyr_idx]
-                overall_lyr_idx += 1
-                with fio.open(ds, layer=layer, crs=crs) as src:
-                    rendered_layers.append(
-                        # Layers will be stacked, which requires fill to be set to a space
-                        gj2ascii.render(
-                            src, width=width, fill=' ', char=char, all_touched=at, bbox=bbox))
-
-        stacked = gj2ascii.stack(rendered_layers, fill=fill_char)
+        sources = [ds for ds, layer_names in infile]
+        if fmt != 'text':
+            # Rasterize each layer into labels and encode them all at once
+            layers = []
+            for ds, layer_names in infile:
+                for layer, crs, at in zip_longest(layer_names, crs_def, all_touched):
+                    with _open_source(ds, layer, crs, at, pyramid=pyramid,
+                                      geometry_cache=geometry_cache) as src, \
+                            _echo_warnings():
+                        layers.append(gj2ascii.render_labels(
+                            _reprojected(src, dst_crs), width=width, all_touched=at,
+                            bbox=bbox, bbox_sample=bbox_sample, max_cells=max_cells,
+                            aspect=aspect))
+            kwargs = {}
+            if fmt == 'html' and not no_style:
+                kwargs['stylemap'] = _build_colormap(char_map, fill_map)
+            encoded = encoders.encode(
+                layers, [_c[0] for _c in char_map], fmt, fill=fill_char, **kwargs)
+            click.echo(encoded, file=outfile, nl=not isinstance(encoded, bytes))
+            return
+        if processes > 1 and num_layers > 1 and shared_memory is not None and not pyramid \
+                and not geometry_cache \
+                and not bbox_sample and '-' not in sources and not any(map(is_store, sources)):
+            # Render each layer in its own process and stack in shared memory
+            layers = []
+            for ds, layer_names in infile:
+                for layer, crs, at in zip_longest(layer_names, crs_def, all_touched):
+                    layers.append({
+                        'path': ds, 'layer': layer, 'crs': crs, 'all_touched': at,
+                        'char': char_map[len(layers)][0]})
+            stacked = parallel.render_layers(
+                layers, width=width, fill=fill_char, bbox=bbox, processes=processes,
+                max_cells=max_cells, aspect=aspect)
+        else:
+            rendered_layers = []
+            overall_lyr_idx = 0
+            for ds, layer_names in infile:
+                for layer, crs, at in zip_longest(layer_names, crs_def, all_touched):
+                    char = [_c[0] for _c in char_map][overall_lyr_idx]
+                    overall_lyr_idx += 1
+                    if processes > 1 and shared_memory is not None and ds != '-' \
+                            and not pyramid and not geometry_cache and not is_store(ds):
+                        rendered_layers.append(parallel.render_sharded(
+                            ds, width=width, fill=' ', char=char, all_touched=at, bbox=bbox,
+                            layer=layer, crs=crs, processes=processes, max_cells=max_cells,
+                            aspect=aspect))
+                        continue
+                    with _open_source(ds, layer, crs, at, pyramid=pyramid,
+                                      geometry_cache=geometry_cache) as src, \
+                            _echo_warnings():
+                        rendered_layers.append(
+                            # Layers will be stacked, which requires fill to be set to a space
+                            gj2ascii.render(
+                                _reprojected(src, dst_crs), width=width, fill=' ', char=char,
+                                all_touched=at, bbox=bbox, bbox_sample=bbox_sample,
+                                max_cells=max_cells, aspect=aspect))
+            stacked = gj2ascii.stack(rendered_layers, fill=fill_char)
         if no_style:
             styled = stacked
         else:
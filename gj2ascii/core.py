@@ -5,17 +5,20 @@ Core components for gj2ascii
 
 from __future__ import division
 
-from collections import OrderedDict
 import itertools
 import math
+import operator
 import os
+import tempfile
 from types import GeneratorType
+import warnings
 
 from .pycompat import text_type
 
 import affine
 import numpy as np
 import rasterio as rio
+from rasterio.enums import MergeAlg
 from rasterio.features import rasterize
 from shapely.geometry import asShape
 from shapely.geometry import mapping
@@ -26,9 +29,11 @@ except ImportError:  # pragma no cover
 
 __all__ = [
     'render', 'stack', 'style', 'render_multiple', 'style_multiple', 'paginate', 'dict2table',
+    'dicts2table', 'render_to_file', 'render_labels', 'stack_labels',
     'ascii2array', 'array2ascii', 'min_bbox',
     'DEFAULT_WIDTH', 'DEFAULT_FILL', 'DEFAULT_CHAR', 'DEFAULT_CHAR_RAMP', 'DEFAULT_CHAR_COLOR',
-    'DEFAULT_COLOR_CHAR', 'ANSI_COLORMAP',
+    'DEFAULT_COLOR_CHAR', 'ANSI_COLORMAP', 'DENSITY_METHODS', 'DEFAULT_BBOX_MARGIN',
+    'MaxCellsError',
 ]
 
 
@@ -36,7 +41,7 @@ DEFAULT_FILL = ' '
 DEFAULT_CHAR = '+'
 DEFAULT_WIDTH = 80
 DEFAULT_CHAR_RAMP = [
-    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '*', '#', '@', '0', '=', '-', '%', '$']
+    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '*', '#', '@', '&', '=', '-', '%', '$']
 _ANSI_RESET = '\033[0m'
 ANSI_COLORMAP = {
     'black': '\x1b[30m\x1b[40m',
@@ -59,6 +64,108 @@ DEFAULT_CHAR_COLOR = {
     '7': 'black'
 }
 DEFAULT_COLOR_CHAR = {v: k for k, v in DEFAULT_CHAR_COLOR.items()}
+DENSITY_METHODS = ('linear', 'log', 'quantile')
+
+# Number of point coordinates to collect before burning them into the raster
+_POINT_BATCH_SIZE = 65536
+# Number of line vertices to collect before burning them into the raster
+_LINE_BATCH_SIZE = 65536
+# Lines are left to GDAL when segments cross more cells than this on average
+_LINE_MAX_STEPS = 1.5
+_TOUCHED_LINE_MAX_STEPS = 0.5
+# Lines with pixel coordinates beyond this are left to GDAL to avoid overflow
+_MAX_LINE_PIXEL = 2 ** 30
+# GDAL does not burn the last cell of an all_touched segment that ends within
+# this distance of a cell boundary
+_LINE_END_TOLERANCE = 1e-4
+# Number of rows to rasterize or encode at a time when rendering to a file
+_BLOCK_ROWS = 1024
+# Fraction of a sampled bbox's width and height to add to each side
+DEFAULT_BBOX_MARGIN = 0.05
+
+
+class MaxCellsError(ValueError):
+
+    """
+    A `max_cells` budget is too small for the bbox at any width.
+    """
+
+
+class _TableFormatter(object):
+
+    """
+    Formats attribute tables for dictionaries that share the same keys, like
+    the properties of features in a single layer.  The key column only depends
+    on the keys so it is built once and reused for every table.
+
+
+    Parameters
+    ----------
+    keys : iterable
+        Keys in the order they should appear in the table.
+    """
+
+    def __init__(self, keys):
+        keys = [text_type(k) for k in keys]
+        if not keys:
+            raise ValueError("Cannot format table - no keys.")
+        self.keys = keys
+        self.key_width = max(len(k) for k in keys)
+
+        # Add 2 to the prop/value width to account for the single space padding around the
+        # properties and values
+        # +----------+-------+
+        # | Property | Value |
+        #  ^        ^ ^     ^
+        self._key_divider = '+' + '-' * (self.key_width + 2) + '+'
+        self._prefixes = ['| ' + k.ljust(self.key_width) + ' | ' for k in keys]
+
+    def _lines(self, values):
+        values = [text_type(v) for v in values]
+        value_width = max(len(v) for v in values)
+        divider = self._key_divider + '-' * (value_width + 2) + '+'
+        yield divider
+        for prefix, value in zip(self._prefixes, values):
+            yield prefix + value.rjust(value_width) + ' |'
+        yield divider
+
+    def format(self, values):
+
+        """
+        Format a single table.
+
+
+        Parameters
+        ----------
+        values : iterable
+            One value per key in the same order as the keys.
+
+
+        Returns
+        -------
+        str
+        """
+
+        return os.linesep.join(self._lines(values))
+
+    def format_many(self, rows):
+
+        """
+        Format one table per row into a single block of text.
+
+
+        Parameters
+        ----------
+        rows : iterable
+            Produces one iterable of values per table.
+
+
+        Returns
+        -------
+        str
+        """
+
+        return os.linesep.join(itertools.chain.from_iterable(self._lines(r) for r in rows))
 
 
 def dict2table(dictionary):
@@ -101,31 +208,46 @@ def dict2table(dictionary):
     if not dictionary:
         raise ValueError("Cannot format table - input dictionary is empty.")
 
-    # Cast everything to a string now so we don't have to do it again later
-    dictionary = OrderedDict(((text_type(k), text_type(v)) for k, v in dictionary.items()))
+    return _TableFormatter(dictionary.keys()).format(dictionary.values())
 
-    # Add two at the end to account for spaces around |
-    prop_width = max([len(e) for e in dictionary.keys()])
-    value_width = max([len(e) for e in dictionary.values()])
 
-    # Add 2 to the prop/value width to account for the single space padding around the
-    # properties and values
-    # +----------+-------+
-    # | Property | Value |
-    #  ^        ^ ^     ^
-    # We don't need it later so only add it here
-    divider = ''.join(['+', '-' * (prop_width + 2), '+', '-' * (value_width + 2), '+'])
-    output = [divider]
-    for prop, value in dictionary.items():
-        value = text_type(value)
-        prop_content = prop + ' ' * (prop_width - len(prop))
-        value_content = ' ' * (value_width - len(value)) + value
-        output.append('| ' + prop_content + ' | ' + value_content + ' |')
+def dicts2table(dictionaries, keys=None):
 
-    # Add trailing divider
-    output.append(divider)
+    """
+    Convert many dictionaries sharing the same keys to ASCII formatted tables
+    in a single block of text.  Equivalent to joining the output of
+    `dict2table()` for every dictionary with a newline, but the key column is
+    only formatted once.  Useful for dumping the attributes of an entire layer.
 
-    return os.linesep.join(output)
+
+    Parameters
+    ----------
+    dictionaries : iterable
+        Produces one dictionary per iteration.
+
+    keys : list or None, optional
+        Keys to include in every table.  Defaults to the keys of the first
+        dictionary.
+
+
+    Returns
+    -------
+    str
+    """
+
+    dictionaries = iter(dictionaries)
+    if keys is None:
+        try:
+            first = next(dictionaries)
+        except StopIteration:
+            raise ValueError("Cannot format table - no input dictionaries.")
+        keys = list(first.keys())
+        dictionaries = itertools.chain([first], dictionaries)
+    else:
+        keys = list(keys)
+
+    formatter = _TableFormatter(keys)
+    return formatter.format_many([d[k] for k in keys] for d in dictionaries)
 
 
 def _geometry_extractor(ftrz):
@@ -169,11 +291,794 @@ def _geometry_extractor(ftrz):
                 "__geo_interface__: %s" % obj)
 
 
-def ascii2array(ascii):
+# Number of nesting levels between a geometry's coordinates and its positions
+_POSITION_DEPTH = {
+    'Point': 0, 'MultiPoint': 1, 'LineString': 1, 'MultiLineString': 2, 'Polygon': 2,
+    'MultiPolygon': 3}
+
+
+def _positions(geom, out):
+
+    """
+    Append every position in a GeoJSON geometry to a list.  Flattening with
+    `itertools.chain` keeps the per-position work in C.
+    """
+
+    if geom['type'] == 'GeometryCollection':
+        for g in geom['geometries']:
+            _positions(g, out)
+        return
+    coords = [geom['coordinates']]
+    for _ in range(_POSITION_DEPTH[geom['type']]):
+        coords = list(itertools.chain.from_iterable(coords))
+    out.extend(coords)
+
+
+def _positions_outside(positions, bbox):
+
+    """
+    Determine if any position in a list of positions is outside of a bbox.
+    """
+
+    if not positions:
+        return False
+    try:
+        arr = np.array(positions, dtype=np.float64)
+    except ValueError:
+        # Mixed 2D and 3D positions
+        arr = np.array([p[:2] for p in positions], dtype=np.float64)
+    x_min, y_min, x_max, y_max = bbox
+    return bool(
+        arr[:, 0].min() < x_min or arr[:, 1].min() < y_min
+        or arr[:, 0].max() > x_max or arr[:, 1].max() > y_max)
+
+
+def _warn_outside(ftrz, bbox, skip=0):
+
+    """
+    Pass input objects through unchanged and emit a `UserWarning` the first
+    time an object's geometry extends outside of `bbox`.  The first `skip`
+    objects are assumed to be within the bbox, like those used to estimate it.
+    Positions are checked with numpy in batches of `_POINT_BATCH_SIZE`, so up
+    to one batch of objects is held before being passed through.
+    """
+
+    ftrz = iter(ftrz)
+    for obj in itertools.islice(ftrz, skip):
+        yield obj
+
+    pending = []
+    positions = []
+    for obj in ftrz:
+        pending.append(obj)
+        for geom in _geometry_extractor(obj):
+            _positions(geom, positions)
+        if len(positions) < _POINT_BATCH_SIZE:
+            continue
+        if _positions_outside(positions, bbox):
+            break
+        for obj in pending:
+            yield obj
+        pending = []
+        positions = []
+    else:
+        if not _positions_outside(positions, bbox):
+            for obj in pending:
+                yield obj
+            return
+
+    warnings.warn(
+        "Some features are outside of the rendered area %s, which may have been estimated "
+        "from a sample.  Use a larger sample or margin, or supply a bbox." % (tuple(bbox),),
+        UserWarning)
+    for obj in itertools.chain(pending, ftrz):
+        yield obj
+
+
+def _categorize(ftrz, field, charmap, chars, exclude=()):
+
+    """
+    A generator that yields `(geometry, label)` pairs for burning a
+    categorical raster in a single pass.  Labels start at `1` and index into
+    `chars`, which is extended as new characters are used.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()` that produces features.
+
+    field : str
+        Property containing the category.
+
+    charmap : dict
+        Maps property values to characters.  Values that are not in the map
+        are assigned the next available character from `DEFAULT_CHAR_RAMP`,
+        preferring characters with a color in `DEFAULT_CHAR_COLOR`, and added
+        to the map.
+
+    chars : list
+        Characters referenced by the labels.  Label `N` is `chars[N - 1]`.
+
+    exclude : iterable, optional
+        Characters that cannot be auto-assigned, like the fill character.
+
+
+    Yields
+    ------
+    tuple
+
+
+    Raises
+    ------
+    TypeError
+        An input object is not a feature.
+
+    ValueError
+        Ran out of characters to auto-assign or there are more than 255
+        characters.
+    """
+
+    labels = {}
+    for c in chars:
+        labels.setdefault(c, len(labels) + 1)
+    available = [
+        c for c in sorted(DEFAULT_CHAR_COLOR) + DEFAULT_CHAR_RAMP
+        if c not in exclude and c not in charmap.values()]
+
+    if isinstance(ftrz, dict) or hasattr(ftrz, '__geo_interface__'):
+        ftrz = [ftrz]
+    for obj in ftrz:
+        if hasattr(obj, '__geo_interface__'):
+            obj = mapping(obj)
+        if obj.get('type') != 'Feature':
+            raise TypeError(
+                "Categorical rendering requires features with properties: %s" % obj)
+
+        value = obj['properties'][field]
+        try:
+            char = charmap[value]
+        except TypeError:
+            value = text_type(value)
+            char = charmap.get(value)
+        except KeyError:
+            char = None
+        if char is None:
+            while available and available[0] in labels:
+                available.pop(0)
+            if not available:
+                raise ValueError(
+                    "Too many categories in `%s' to auto-assign characters - supply a "
+                    "charmap." % field)
+            char = charmap[value] = available.pop(0)
+
+        if char not in labels:
+            if len(labels) >= 255:
+                raise ValueError("Cannot render more than 255 categories")
+            chars.append(char)
+            labels[char] = len(labels) + 1
+        yield obj['geometry'], labels[char]
+
+
+def _burn_points(x, y, out, transform, count=False):
+
+    """
+    Burn point coordinates into an array in place by computing cell indices
+    directly rather than going through GDAL.  The inverse transform is computed
+    the same way GDAL does for north-up rasters so points on cell boundaries
+    land in the same cell as they would with `rasterize()`.
+
+
+    Parameters
+    ----------
+    x : array_like
+        X coordinates.
+
+    y : array_like
+        Y coordinates.
+
+    out : np.ndarray
+        Array to burn a value of `1` into.
+
+    transform : affine.Affine
+        Transform for `out`.  Must be north-up.
+
+    count : bool, optional
+        Add the number of points in each cell to `out` rather than burning `1`.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    height, width = out.shape
+    cols = np.floor(x * (1.0 / transform.a) + (-transform.c / transform.a))
+    rows = np.floor(y * (1.0 / transform.e) + (-transform.f / transform.e))
+    inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+    rows = rows[inside].astype(np.intp)
+    cols = cols[inside].astype(np.intp)
+    if count:
+        out += np.bincount(
+            rows * width + cols, minlength=height * width).reshape(out.shape).astype(out.dtype)
+    else:
+        out[rows, cols] = 1
+
+
+def _ranges(starts, stops):
+
+    """
+    Expand inclusive integer ranges into a flat array of values along with
+    the index of the range each value came from.
+    """
+
+    counts = np.maximum(stops - starts + 1, 0)
+    idx = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return starts[idx] + offsets, idx
+
+
+def _burn_bresenham(x0, y0, x1, y1, out):
+
+    """
+    Burn line segments in pixel coordinates with the same integer Bresenham
+    walk GDAL uses when `all_touched=False`.  The step along the minor axis is
+    computed in closed form so every segment is drawn at once, and only the
+    steps that land inside of `out` are generated.
+    """
+
+    height, width = out.shape
+    ix0 = np.floor(x0).astype(np.int64)
+    iy0 = np.floor(y0).astype(np.int64)
+    ix1 = np.floor(x1).astype(np.int64)
+    iy1 = np.floor(y1).astype(np.int64)
+    dx = np.abs(ix1 - ix0)
+    dy = np.abs(iy1 - iy0)
+    x_step = np.where(ix0 > ix1, -1, 1)
+    y_step = np.where(iy0 > iy1, -1, 1)
+
+    # Both ends of a segment are always burned.  Consecutive segments share
+    # an end so only steps between the ends are generated.
+    for cols, rows in ((ix0, iy0), (ix1, iy1)):
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        out[rows[inside], cols[inside]] = 1
+
+    # Walk along the major axis and clip the walk to the raster
+    x_major = dx >= dy
+    major = np.where(x_major, dx, dy)
+    interior = np.nonzero(major > 1)[0]
+    ix0, iy0, x_step, y_step = ix0[interior], iy0[interior], x_step[interior], y_step[interior]
+    x_major = x_major[interior]
+    major = major[interior]
+    minor = np.where(x_major, dy[interior], dx[interior])
+    start = np.where(x_major, ix0, iy0)
+    step = np.where(x_major, x_step, y_step)
+    size = np.where(x_major, width, height)
+    k_min = np.maximum(np.where(step > 0, -start, start - (size - 1)), 1)
+    k_max = np.minimum(np.where(step > 0, size - 1 - start, start), major - 1)
+
+    k, idx = _ranges(k_min, k_max)
+    major = major[idx]
+    # Number of minor axis steps taken after `k` major axis steps
+    m = (2 * k * minor[idx] - major) // (2 * major) + 1
+    x_major = x_major[idx]
+    cols = ix0[idx] + x_step[idx] * np.where(x_major, k, m)
+    rows = iy0[idx] + y_step[idx] * np.where(x_major, m, k)
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    out[rows[inside], cols[inside]] = 1
+
+
+def _burn_touched(x0, y0, x1, y1, out):
+
+    """
+    Burn line segments in pixel coordinates into every cell they touch,
+    replicating GDAL's `all_touched=True` line walk step for step so the
+    floating point error matches.  Nearly vertical and horizontal segments
+    are burned as ranges and the remaining segments are walked in lockstep,
+    one cell per iteration.
+    """
+
+    height, width = out.shape
+
+    # Skip segments that are entirely off one side of the raster
+    keep = ~(((y0 < 0) & (y1 < 0)) | ((y0 > height) & (y1 > height))
+             | ((x0 < 0) & (x1 < 0)) | ((x0 > width) & (x1 > width)))
+    x0, y0, x1, y1 = x0[keep], y0[keep], x1[keep], y1[keep]
+
+    # Walk from left to right
+    swap = x0 > x1
+    x0, x1 = np.where(swap, x1, x0), np.where(swap, x0, x1)
+    y0, y1 = np.where(swap, y1, y0), np.where(swap, y0, y1)
+
+    vertical = (np.floor(x0) == np.floor(x1)) | (np.abs(x0 - x1) < .01)
+    cols = np.floor(x1[vertical]).astype(np.int64)
+    starts = np.maximum(np.floor(np.minimum(y0, y1)[vertical]), 0).astype(np.int64)
+    stops = np.minimum(
+        np.floor(np.maximum(y0, y1)[vertical] - _LINE_END_TOLERANCE), height - 1
+    ).astype(np.int64)
+    inside = (cols >= 0) & (cols < width)
+    rows, idx = _ranges(starts[inside], stops[inside])
+    out[rows, cols[inside][idx]] = 1
+
+    x0, y0, x1, y1 = x0[~vertical], y0[~vertical], x1[~vertical], y1[~vertical]
+    horizontal = (np.floor(y0) == np.floor(y1)) | (np.abs(y0 - y1) < .01)
+    rows = np.floor(y0[horizontal]).astype(np.int64)
+    starts = np.maximum(np.floor(x0[horizontal]), 0).astype(np.int64)
+    stops = np.minimum(
+        np.floor(x1[horizontal] - _LINE_END_TOLERANCE), width - 1).astype(np.int64)
+    inside = (rows >= 0) & (rows < height)
+    cols, idx = _ranges(starts[inside], stops[inside])
+    out[rows[inside][idx], cols] = 1
+
+    x, y, x_end, y_end = x0[~horizontal], y0[~horizontal], x1[~horizontal], y1[~horizontal]
+    slope = (y_end - y) / (x_end - x)
+
+    # Clip in x
+    clip = x_end > width
+    y_end = np.where(clip, y_end - (x_end - width) * slope, y_end)
+    x_end = np.where(clip, width, x_end)
+    clip = x < 0
+    y = np.where(clip, y + (0.0 - x) * slope, y)
+    x = np.where(clip, 0.0, x)
+
+    # Clip in y
+    down = y_end > y
+    clip = down & (y < 0)
+    x = np.where(clip, x + (0.0 - y) / slope, x)
+    y = np.where(clip, 0.0, y)
+    clip = down & (y_end >= height)
+    x_end = np.where(clip, x_end + (y_end - height) / slope, x_end)
+    x_end = np.where(clip & (x_end > width), width, x_end)
+    clip = ~down & (y >= height)
+    x = np.where(clip, x + (height - y) / slope, x)
+    y = np.where(clip, float(height), y)
+    clip = ~down & (y_end < 0)
+    x_end = np.where(clip, x_end - (y_end - 0) / slope, x_end)
+
+    # Step every segment to its next cell boundary until it is finished
+    active = np.nonzero((x >= 0) & (x < x_end))[0]
+    while len(active):
+        cx = x[active]
+        cy = y[active]
+        cs = slope[active]
+        col = np.floor(cx).astype(np.int64)
+        row = np.floor(cy).astype(np.int64)
+        # GDAL only checks the row, so a segment starting on the right edge
+        # of the raster and leaving it can spill into the next row
+        flat = row * width + col
+        inside = (row >= 0) & (row < height) & (flat < height * width)
+        out[flat[inside] // width, flat[inside] % width] = 1
+
+        x_step = np.floor(cx + 1.0) - cx
+        y_step = x_step * cs
+        right = np.floor(cy + y_step).astype(np.int64) == row
+        y_step = np.where(
+            right, y_step,
+            np.where(cs < 0, np.minimum(row - cy, -0.000000001),
+                     np.maximum((row + 1) - cy, 0.000000001)))
+        x_step = np.where(right, x_step, y_step / cs)
+        x[active] = cx + x_step
+        y[active] = cy + y_step
+        active = active[(x[active] >= 0) & (x[active] < x_end[active])]
+
+
+def _burn_lines(parts, out, transform, all_touched=False):
+
+    """
+    Burn line coordinates into an array in place without going through GDAL.
+    See `_burn_line_coords()`.
+
+
+    Parameters
+    ----------
+    parts : list
+        Coordinate sequences for each `LineString` or part of a
+        `MultiLineString`.
+
+    out : np.ndarray
+        Array to burn a value of `1` into.
+
+    transform : affine.Affine
+        Transform for `out`.  Must be north-up.
+
+    all_touched : bool, optional
+        See `render()`.
+
+
+    Returns
+    -------
+    list
+        Parts that were not burned.  These should be handed to
+        `rasterize()`.
+    """
+
+    lengths = np.array([len(p) for p in parts], dtype=np.intp)
+    num_coords = int(lengths.sum())
+    coords = itertools.chain.from_iterable(parts)
+    xy = np.fromiter(itertools.chain.from_iterable(coords), dtype=np.float64)
+    if len(xy) != 2 * num_coords:
+        # At least some coordinates have a Z value
+        xy = np.fromiter(itertools.chain.from_iterable(
+            c[:2] for c in itertools.chain.from_iterable(parts)), dtype=np.float64)
+    skipped = _burn_line_coords(
+        xy.reshape(num_coords, 2), lengths, out, transform, all_touched=all_touched)
+    return [parts[i] for i in skipped]
+
+
+def _burn_line_coords(coords, lengths, out, transform, all_touched=False):
+
+    """
+    Burn lines stored as a flat coordinate array into an array in place.
+    Every vertex is converted to pixel coordinates at once, like in
+    `_burn_points()`, and segments are drawn exactly like `rasterize()` would
+    draw them.
+
+    Skipping GDAL's per-geometry conversion only pays off when segments are
+    short relative to the cell size, which is typical for text sized
+    renderings.  Drawing long segments cell by cell in numpy is slower than
+    GDAL, so a batch whose segments cross more than `_LINE_MAX_STEPS` cells,
+    or `_TOUCHED_LINE_MAX_STEPS` with `all_touched`, on average is not
+    burned at all.
+
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        `(N, 2)` array of x and y coordinates for every line.
+
+    lengths : np.ndarray
+        Number of coordinates in each line.
+
+    out : np.ndarray
+        Array to burn a value of `1` into.
+
+    transform : affine.Affine
+        Transform for `out`.  Must be north-up.
+
+    all_touched : bool, optional
+        See `render()`.
+
+
+    Returns
+    -------
+    np.ndarray
+        Indexes of the lines that were not burned.
+    """
+
+    x = coords[:, 0] * (1.0 / transform.a) + (-transform.c / transform.a)
+    y = coords[:, 1] * (1.0 / transform.e) + (-transform.f / transform.e)
+
+    # Lines with coordinates that would overflow are left to GDAL
+    line_ids = np.repeat(np.arange(len(lengths)), lengths)
+    too_far = np.zeros(len(lengths), dtype=bool)
+    np.logical_or.at(
+        too_far, line_ids, ~((np.abs(x) < _MAX_LINE_PIXEL) & (np.abs(y) < _MAX_LINE_PIXEL)))
+
+    # Segments join consecutive vertices within a line
+    first = np.ones(len(coords), dtype=bool)
+    first[1:] = line_ids[1:] != line_ids[:-1]
+    end = np.nonzero(~first & ~too_far[line_ids])[0]
+    steps = np.maximum(
+        np.abs(np.floor(x[end]) - np.floor(x[end - 1])),
+        np.abs(np.floor(y[end]) - np.floor(y[end - 1])))
+    if len(end) and steps.mean() > (
+            _TOUCHED_LINE_MAX_STEPS if all_touched else _LINE_MAX_STEPS):
+        return np.arange(len(lengths))
+
+    burn = _burn_touched if all_touched else _burn_bresenham
+    burn(x[end - 1], y[end - 1], x[end], y[end], out)
+
+    return np.nonzero(too_far)[0]
+
+
+def _rasterize(geometries, out_shape, transform, all_touched=False, count=False):
+
+    """
+    Rasterize GeoJSON geometries into an array containing `1` for cells that
+    intersect a geometry and `0` everywhere else, or the number of geometries
+    intersecting each cell if `count=True`.
+
+    Point and line layers are burned directly with numpy, which is faster
+    than handing GDAL one geometry at a time and produces the same output.
+    See `_burn_line_coords()` for when lines are still drawn by GDAL.  The
+    decision is made by looking at the first geometry so a stream is only
+    read once.  Any other geometries encountered along the way are set aside
+    and handed to `rasterio.features.rasterize()`.  Lines are always handed
+    to GDAL when counting.  Points are counted individually, including every
+    point of a `MultiPoint`.
+
+
+    Parameters
+    ----------
+    geometries : iterator
+        Produces one GeoJSON geometry per iteration.
+
+    out_shape : tuple
+        Output (rows, cols).
+
+    transform : affine.Affine
+        North-up transform for the output array.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    count : bool, optional
+        Count the number of geometries intersecting each cell.
+
+
+    Returns
+    -------
+    np.ndarray
+        `uint8` or `uint32` if counting.
+    """
+
+    dtype = rio.uint32 if count else rio.uint8
+    merge_alg = MergeAlg.add if count else MergeAlg.replace
+
+    geometries = iter(geometries)
+    first = next(geometries, None)
+    direct = ('Point', 'MultiPoint') if count else \
+        ('Point', 'MultiPoint', 'LineString', 'MultiLineString')
+    if first is None or first['type'] not in direct:
+        return rasterize(
+            fill=0,
+            default_value=1,
+            shapes=itertools.chain([first] if first is not None else [], geometries),
+            out_shape=out_shape,
+            transform=transform,
+            all_touched=all_touched,
+            merge_alg=merge_alg,
+            dtype=dtype
+        )
+
+    output_array = np.zeros(out_shape, dtype=dtype)
+    other = []
+    x = []
+    y = []
+    lines = []
+    num_vertices = 0
+    # Lines stay with GDAL once a batch is found to be faster there
+    burn_lines = not count
+    for geom in itertools.chain([first], geometries):
+        gtype = geom['type']
+        if gtype == 'Point':
+            x.append(geom['coordinates'][0])
+            y.append(geom['coordinates'][1])
+        elif gtype == 'MultiPoint':
+            for coord in geom['coordinates']:
+                x.append(coord[0])
+                y.append(coord[1])
+        elif gtype == 'LineString' and burn_lines:
+            lines.append(geom['coordinates'])
+            num_vertices += len(geom['coordinates'])
+        elif gtype == 'MultiLineString' and burn_lines:
+            lines.extend(geom['coordinates'])
+            num_vertices += sum(len(p) for p in geom['coordinates'])
+        else:
+            other.append(geom)
+        if len(x) >= _POINT_BATCH_SIZE:
+            _burn_points(x, y, output_array, transform, count=count)
+            x = []
+            y = []
+        if num_vertices >= _LINE_BATCH_SIZE:
+            skipped = _burn_lines(lines, output_array, transform, all_touched=all_touched)
+            burn_lines = len(skipped) < len(lines)
+            other += [{'type': 'LineString', 'coordinates': p} for p in skipped]
+            lines = []
+            num_vertices = 0
+    if x:
+        _burn_points(x, y, output_array, transform, count=count)
+    if lines:
+        other += [{'type': 'LineString', 'coordinates': p}
+                  for p in _burn_lines(lines, output_array, transform, all_touched=all_touched)]
+
+    if other:
+        rasterize(
+            shapes=other,
+            out=output_array,
+            default_value=1,
+            transform=transform,
+            all_touched=all_touched,
+            merge_alg=merge_alg)
+
+    return output_array
+
+
+def _rasterize_blocks(geometries, out, transform, all_touched=False, block_rows=_BLOCK_ROWS):
+
+    """
+    Like `_rasterize()` but burns into an existing array, like a `np.memmap`,
+    one block of rows at a time so only one block has to fit in memory.
+    `rasterio.features.rasterize()` copies its output array, which would
+    otherwise defeat the purpose of a memory-mapped array.  Points are burned
+    directly into `out`.  Other geometries are held in memory along with their
+    bounds so each block only rasterizes the geometries that intersect it.
+
+
+    Parameters
+    ----------
+    geometries : iterator
+        Produces one GeoJSON geometry per iteration.
+
+    out : np.ndarray
+        A `uint8` array to burn a value of `1` into.
+
+    transform : affine.Affine
+        North-up transform for `out`.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    block_rows : int, optional
+        Number of rows to rasterize at a time.
+    """
+
+    height, width = out.shape
+    geometries = iter(geometries)
+    first = next(geometries, None)
+    if first is None:
+        return
+    geometries = itertools.chain([first], geometries)
+
+    other = []
+    if first['type'] in ('Point', 'MultiPoint'):
+        x = []
+        y = []
+        for geom in geometries:
+            if geom['type'] == 'Point':
+                x.append(geom['coordinates'][0])
+                y.append(geom['coordinates'][1])
+            elif geom['type'] == 'MultiPoint':
+                for coord in geom['coordinates']:
+                    x.append(coord[0])
+                    y.append(coord[1])
+            else:
+                other.append(geom)
+            if len(x) >= _POINT_BATCH_SIZE:
+                _burn_points(x, y, out, transform)
+                x = []
+                y = []
+        if x:
+            _burn_points(x, y, out, transform)
+    else:
+        other = list(geometries)
+
+    if not other:
+        return
+
+    bounds = np.array([asShape(g).bounds for g in other], dtype=np.float64)
+    for row in range(0, height, block_rows):
+        nrows = min(block_rows, height - row)
+        block_transform = affine.Affine(
+            transform.a, transform.b, transform.c,
+            transform.d, transform.e, transform.f + row * transform.e)
+        # Pad by a cell so geometries touching the block edge are included
+        top = block_transform.f - transform.e
+        bottom = block_transform.f + (nrows + 1) * transform.e
+        selected = np.nonzero((bounds[:, 3] >= bottom) & (bounds[:, 1] <= top))[0]
+        if len(selected):
+            out[row:row + nrows] |= rasterize(
+                shapes=[other[i] for i in selected],
+                out_shape=(nrows, width),
+                fill=0,
+                default_value=1,
+                transform=block_transform,
+                all_touched=all_touched,
+                dtype=rio.uint8)
+
+
+def _quantize(counts, levels, method='linear'):
+
+    """
+    Map feature counts onto `levels` classes.
+
+
+    Parameters
+    ----------
+    counts : np.ndarray
+        Number of features intersecting each cell.
+
+    levels : int
+        Number of output classes.
+
+    method : str, optional
+        `linear` splits the range of counts into equal intervals, `log` does
+        the same but on a log scale, and `quantile` places the same number of
+        non-empty cells in each class.
+
+
+    Returns
+    -------
+    np.ndarray
+        Class for each cell ranging from `0` to `levels - 1`.  Empty cells are
+        assigned class `0` and must be masked by the caller.
+    """
+
+    counts = counts.astype(np.float64)
+    max_count = counts.max()
+    if max_count == 0:
+        return np.zeros(counts.shape, dtype=np.intp)
+
+    if method == 'linear':
+        scaled = counts / max_count
+    elif method == 'log':
+        scaled = np.log1p(counts) / np.log1p(max_count)
+    elif method == 'quantile':
+        nonzero = counts[counts > 0]
+        edges = np.percentile(nonzero, np.linspace(0, 100, levels + 1)[1:-1])
+        return np.searchsorted(edges, counts, side='left').astype(np.intp)
+    else:
+        raise ValueError(
+            "Invalid density method `%s' - must be one of: %s"
+            % (method, ', '.join(DENSITY_METHODS)))
+
+    return np.clip(np.ceil(scaled * levels) - 1, 0, levels - 1).astype(np.intp)
+
+
+def _ascii2ndarray(ascii):
+
+    """
+    Decode a rendering into a `(rows, cols)` array of single characters by
+    viewing the text as a UCS-4 buffer and striding over the spaces between
+    pixels rather than building one Python string per pixel.  Rows that are
+    shorter than the longest row, like those with trailing whitespace removed,
+    are padded with spaces.
+    """
+
+    lines = ascii.splitlines()
+    if not lines:
+        return np.empty((0, 0), dtype='U1')
+    line_width = max(len(l) for l in lines)
+    if line_width % 2 == 0:
+        line_width += 1
+    lines = [l.ljust(line_width) for l in lines]
+    buf = text_type('').join(lines).encode('utf-32-le')
+    return np.frombuffer(buf, dtype='<U1').reshape(len(lines), line_width)[:, ::2]
+
+
+def _ndarray2ascii(arr):
+
+    """
+    Encode a `(rows, cols)` array of single characters into a rendering with a
+    single buffer join.  Returns `None` if an element is not a single
+    character, in which case the caller should fall back to joining strings.
+    """
+
+    if arr.ndim != 2 or arr.dtype.kind != 'U' or 0 in arr.shape:
+        return None
+    lengths = np.char.str_len(arr)
+    if lengths.min() != 1 or lengths.max() != 1:
+        return None
+    rows, cols = arr.shape
+
+    newline = os.linesep
+    text_width = 2 * cols - 1
+    out = np.full((rows, text_width + len(newline)), ' ', dtype='U1')
+    out[:, 0:text_width:2] = arr
+    out[:, text_width:] = list(newline)
+    return out.tobytes().decode('utf-32-le')[:-len(newline)]
+
+
+def _join_rows(arr):
+
+    """
+    Encode a `(rows, cols)` array of single characters into text with no
+    space between columns and a single buffer join.
+    """
+
+    if 0 in arr.shape:
+        return ''
+    rows, cols = arr.shape
+    newline = os.linesep
+    out = np.empty((rows, cols + len(newline)), dtype='U1')
+    out[:, :cols] = arr
+    out[:, cols:] = list(newline)
+    return out.tobytes().decode('utf-32-le')[:-len(newline)]
+
+
+def ascii2array(ascii, as_ndarray=False):
 
     """
     Convert an ASCII rendering to an array.  The returned object is not a numpy
-    array but can easily be converted with `np.array()`.
+    array unless `as_ndarray=True` but can easily be converted with
+    `np.array()`.
 
     Example input:
 
@@ -194,13 +1099,20 @@ def ascii2array(ascii):
     ascii : str
         Rendered ASCII from `render()` or `stack()`.
 
+    as_ndarray : bool, optional
+        Return a `(rows, cols)` numpy array of single characters, which is
+        much faster for large renderings.  Rows shorter than the longest row
+        are padded with spaces.
+
 
     Returns
     -------
-    list
+    list or np.ndarray
         A list where each element is a list containing one value per pixel.
     """
 
+    if as_ndarray:
+        return _ascii2ndarray(ascii)
     return [list(row[::2]) for row in ascii.splitlines()]
 
 
@@ -236,6 +1148,10 @@ def array2ascii(arr):
         A block of ASCII text similar to the output of `render()`.
     """
 
+    if isinstance(arr, np.ndarray):
+        encoded = _ndarray2ascii(arr)
+        if encoded is not None:
+            return encoded
     return os.linesep.join([' '.join(row) for row in arr])
 
 
@@ -311,26 +1227,122 @@ def stack(rendered_items, fill=DEFAULT_FILL):
     if len(fill) is not 1:
         raise ValueError("Invalid fill value `%s' - must be 1 character long" % fill)
 
-    output_array = []
-    for row_stack in zip(*map(ascii2array, rendered_items)):
+    rendered_items = list(rendered_items)
+    if not rendered_items:
+        return ''
+    # Decoding pads short rows so compare the number of cells in every row first
+    if len(set(tuple((len(row) + 1) // 2 for row in r.splitlines())
+               for r in rendered_items)) != 1:
+        raise ValueError("Input layers have heterogeneous dimensions")
+    layers = [_ascii2ndarray(r) for r in rendered_items]
+
+    # Find the top-most opaque pixel in every cell
+    layers = np.stack(layers)
+    opaque = layers != ' '
+    top = len(layers) - 1 - np.argmax(opaque[::-1], axis=0)
+    rows, cols = np.indices(top.shape)
+    output_array = layers[top, rows, cols]
+    output_array[~opaque.any(axis=0)] = fill
 
-        if len(set((len(_r) for _r in row_stack))) is not 1:
-            raise ValueError("Input layers have heterogeneous dimensions")
+    return array2ascii(output_array)
 
-        o_row = []
-        for pixel_stack in zip(*row_stack):
-            opaque_pixels = [_p for _p in pixel_stack if _p != ' ']
-            if len(opaque_pixels) is 0:
-                o_row.append(fill)
-            else:
-                o_row.append(opaque_pixels[-1])
-        output_array.append(o_row)
 
-    return array2ascii(output_array)
+def _grid(ftrz, width, bbox=None, sample=None, margin=DEFAULT_BBOX_MARGIN, max_cells=None,
+          aspect=1.0):
+
+    """
+    Compute the output grid for a rendering.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()`.
+
+    width : int
+        Number of pixel columns, not text columns.
+
+    bbox : tuple or None, optional
+        See `render()`.
+
+    sample : int or None, optional
+        See `render()`.
+
+    margin : float, optional
+        See `render()`.
+
+    max_cells : int or None, optional
+        See `render()`.
+
+    aspect : float, optional
+        See `render()`.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    tuple
+        `(ftrz, transform, (height, width))` where `ftrz` must be used in
+        place of the input object in case it was a generator.
+    """
+
+    if max_cells is not None and max_cells < 1:
+        raise ValueError("Invalid max_cells `%s' - must be >= 1" % max_cells)
+    if aspect <= 0:
+        raise ValueError("Invalid aspect `%s' - must be > 0" % aspect)
+
+    # If the input is a generator and the min/max values were not supplied we have to compute
+    # them from the features, but we need them again later and generators cannot be reset.
+    # This potentially creates a large in-memory object so if processing an entire layer it is
+    # best to explicitly define min/max, especially because its also faster.
+    # Objects used to estimate the bbox are known to be inside of it.  Inputs
+    # producing labels directly know their own extent.
+    estimated = not bbox
+    if not bbox:
+        bbox, ftrz = min_bbox(
+            ftrz, return_iter=True, sample=sample, margin=margin if sample else 0)
+    if sample is not None and _is_stream(ftrz) and not hasattr(ftrz, 'labels'):
+        ftrz = _warn_outside(ftrz, bbox, skip=sample if estimated else 0)
+    x_min, y_min, x_max, y_max = bbox
+
+    x_delta = x_max - x_min
+    y_delta = y_max - y_min
+
+    def _height(w):
+        return int(y_delta / (x_delta / w * aspect)) or 1
+
+    # Reduce the width until the grid fits in the budget.  Start from the
+    # width that would fit exactly if height could be fractional.
+    if max_cells is not None and width * _height(width) > max_cells:
+        rows_per_col = y_delta / (x_delta * aspect)
+        if rows_per_col > 0:
+            width = min(width, max(int(math.sqrt(max_cells / rows_per_col)), 1))
+        else:
+            width = min(width, max_cells)
+        while width > 1 and width * _height(width) > max_cells:
+            width -= 1
+        if width * _height(width) > max_cells:
+            raise MaxCellsError(
+                "Invalid max_cells `%s' - bbox requires at least %s cells"
+                % (max_cells, _height(width)))
+
+    cell_size = x_delta / width
+    height = _height(width)
+
+    transform = affine.Affine.from_gdal(
+        *(x_min, cell_size, 0.0, y_max, 0.0, -cell_size * aspect))
+
+    return ftrz, transform, (height, width)
 
 
 def render(ftrz, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
-           all_touched=False, bbox=None):
+           all_touched=False, bbox=None, density=None, ramp=None, by=None, charmap=None,
+           bbox_sample=None, bbox_margin=DEFAULT_BBOX_MARGIN, max_cells=None, aspect=1.0):
 
     """
     Render GeoJSON features, geometries, or objects supporting `__geo_interface__`
@@ -379,7 +1391,10 @@ def render(ftrz, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
     ftrz : dict or iterator
         Can be a single GeoJSON feature, geometry, object supporting
         `__geo_interface__`, or an iterable producing one of those types per
-        iteration.
+        iteration.  Can also be an input that produces labels directly with
+        a `bounds` property and a `labels(out_shape, transform, all_touched)`
+        method, like a `gj2ascii.pyramid.Pyramid()` or a
+        `gj2ascii.geobuffer.GeometryBuffer()`.
 
     width : int, optional
         Render across N text columns.  Height is auto-computed.
@@ -405,6 +1420,56 @@ def render(ftrz, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
         supplied and the input object has a `bounds` property, that value will
         be used.
 
+    density : str or None, optional
+        Count the number of features intersecting each cell and render the
+        counts with the characters in `ramp` instead of rendering every
+        intersecting cell as `char`.  Counts are classified with one of
+        `DENSITY_METHODS`: `linear`, `log`, or `quantile`.  Lines and polygons
+        are counted with `all_touched` semantics as set by that parameter.
+        Every point of a `MultiPoint` is counted, so a feature with several
+        points in one cell counts more than once.
+
+    ramp : list or str or None, optional
+        Characters to use for density classes from lowest to highest.  The
+        number of classes is the number of characters.  Defaults to
+        `DEFAULT_CHAR_RAMP`.  Use `style()` to map these characters to colors.
+
+    by : str or None, optional
+        Render each feature with a character based on the value of this
+        property rather than rendering everything as `char`.  Features are
+        burned in a single pass and overlapping features are drawn with the
+        painters algorithm.  Input objects must be features.
+
+    charmap : dict or None, optional
+        Used with `by`.  Maps property values to characters.  Values that are
+        not in the map are assigned characters from `DEFAULT_CHAR_RAMP` in
+        the order they are encountered, starting with those that have a color
+        in `DEFAULT_CHAR_COLOR`, and are added to the dictionary so the
+        caller can build a legend or stylemap.
+
+    bbox_sample : int or None, optional
+        Estimate the bbox from the first N input objects rather than reading
+        every object before rendering anything, which is much faster for
+        large streams.  A `UserWarning` is emitted if any of the remaining
+        objects extend outside of the rendered area, including when `bbox`
+        is supplied.
+
+    bbox_margin : float, optional
+        Used with `bbox_sample`.  Fraction of the estimated bbox's width and
+        height to add to each side.
+
+    max_cells : int or None, optional
+        Maximum number of cells in the rendering.  `width` is reduced until
+        the rendering fits, which keeps tall areas from producing enormous
+        output.  Each cell is 2 bytes of text and 1 byte of label array.
+
+    aspect : float, optional
+        Height of a cell divided by its width on screen.  Cells are drawn as
+        a character and a space, so the default of `1` assumes characters are
+        twice as tall as they are wide.  A font with characters 2.4 times as
+        tall as they are wide needs `1.2` to avoid stretching the map
+        vertically.
+
 
     Raises
     ------
@@ -430,33 +1495,52 @@ def render(ftrz, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
         raise ValueError("Invalid pixel value `%s' - must be 1 character long" % char)
     if width <= 0:
         raise ValueError("Invalid width `%s' - must be > 0" % width)
-
-    # If the input is a generator and the min/max values were not supplied we have to compute
-    # them from the features, but we need them again later and generators cannot be reset.
-    # This potentially creates a large in-memory object so if processing an entire layer it is
-    # best to explicitly define min/max, especially because its also faster.
-    if bbox:
-        x_min, y_min, x_max, y_max = bbox
+    if density is not None:
+        if density not in DENSITY_METHODS:
+            raise ValueError(
+                "Invalid density method `%s' - must be one of: %s"
+                % (density, ', '.join(DENSITY_METHODS)))
+        ramp = [str(c) for c in (ramp or DEFAULT_CHAR_RAMP)]
+        if any(len(c) != 1 for c in ramp):
+            raise ValueError("Invalid ramp `%s' - characters must be 1 character long" % ramp)
+    if by is not None:
+        charmap = {} if charmap is None else charmap
+        if any(len(str(c)) != 1 for c in charmap.values()):
+            raise ValueError(
+                "Invalid charmap `%s' - characters must be 1 character long" % charmap)
+
+    ftrz, transform, (height, width) = _grid(
+        ftrz, width, bbox, sample=bbox_sample, margin=bbox_margin, max_cells=max_cells,
+        aspect=aspect)
+
+    # Inputs like a `gj2ascii.pyramid.Pyramid()` produce labels directly
+    if hasattr(ftrz, 'labels'):
+        if density is not None or by is not None:
+            raise ValueError(
+                "Inputs producing labels directly cannot be rendered with density or by")
+        output_array = ftrz.labels((height, width), transform, all_touched=all_touched)
+    elif by is not None:
+        chars = []
+        output_array = rasterize(
+            shapes=_categorize(ftrz, by, charmap, chars, exclude=(fill,)),
+            fill=0,
+            out_shape=(height, width),
+            transform=transform,
+            all_touched=all_touched,
+            dtype=rio.uint8)
+        return array2ascii(np.array([fill] + chars)[output_array])
     else:
-        _bbox, ftrz = min_bbox(ftrz, return_iter=True)
-        x_min, y_min, x_max, y_max = _bbox
-
-    x_delta = x_max - x_min
-    y_delta = y_max - y_min
-    cell_size = x_delta / width
-    height = int(y_delta / cell_size)
-    if height is 0:
-        height = 1
-
-    output_array = rasterize(
-        fill=0,
-        default_value=1,
-        shapes=(g for g in _geometry_extractor(ftrz)),
-        out_shape=(height, width),
-        transform=affine.Affine.from_gdal(*(x_min, cell_size, 0.0, y_max, 0.0, -cell_size)),
-        all_touched=all_touched,
-        dtype=rio.uint8
-    )
+        output_array = _rasterize(
+            _geometry_extractor(ftrz),
+            out_shape=(height, width),
+            transform=transform,
+            all_touched=all_touched,
+            count=density is not None)
+
+    if density is not None:
+        classes = _quantize(output_array, len(ramp), method=density)
+        output_array = np.where(output_array > 0, np.array(ramp)[classes], fill)
+        return array2ascii(output_array)
 
     # Convert to string dtype and do character replacements
     output_array = output_array.astype(np.str_)
@@ -468,6 +1552,255 @@ def render(ftrz, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
     return array2ascii(output_array)
 
 
+def render_labels(ftrz, width=DEFAULT_WIDTH, all_touched=False, bbox=None, out=None,
+                  bbox_sample=None, bbox_margin=DEFAULT_BBOX_MARGIN, max_cells=None,
+                  aspect=1.0):
+
+    """
+    Rasterize input objects into a label array rather than text.  Cells
+    intersecting a geometry are `1` and everything else is `0`.  Use
+    `stack_labels()` to combine label arrays into text.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()`.
+
+    width : int, optional
+        See `render()`.  Text columns, not cells.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    bbox : tuple, optional
+        See `render()`.
+
+    out : np.ndarray or None, optional
+        Write into this array instead of allocating a new one, like a shared
+        memory buffer.  Only cells intersecting a geometry are written, so
+        several renders into the same array are combined with a logical OR.
+        Must have the same shape as the rendering.
+
+    bbox_sample : int or None, optional
+        See `render()`.
+
+    bbox_margin : float, optional
+        See `render()`.
+
+    max_cells : int or None, optional
+        See `render()`.
+
+    aspect : float, optional
+        See `render()`.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    np.ndarray
+        A `uint8` array or `out`.
+    """
+
+    width = int(math.ceil(width / 2))
+    if width <= 0:
+        raise ValueError("Invalid width `%s' - must be > 0" % width)
+
+    ftrz, transform, shape = _grid(
+        ftrz, width, bbox, sample=bbox_sample, margin=bbox_margin, max_cells=max_cells,
+        aspect=aspect)
+    if out is not None and out.shape != shape:
+        raise ValueError("Invalid out shape `%s' - must be %s" % (out.shape, shape))
+
+    if hasattr(ftrz, 'labels'):
+        labels = ftrz.labels(shape, transform, all_touched=all_touched)
+    else:
+        labels = _rasterize(
+            _geometry_extractor(ftrz), out_shape=shape, transform=transform,
+            all_touched=all_touched)
+
+    if out is None:
+        return labels
+    out[labels != 0] = 1
+    return out
+
+
+def stack_labels(layers, chars, fill=DEFAULT_FILL):
+
+    """
+    Combine label arrays into text with the painters algorithm.  Equivalent
+    to rendering each layer and combining them with `stack()` but without
+    building and parsing intermediate text.
+
+
+    Parameters
+    ----------
+    layers : list
+        Label arrays from `render_labels()` with identical shapes.
+
+    chars : list
+        One character per layer.
+
+    fill : str, optional
+        Character for cells that are not set in any layer.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str
+    """
+
+    top, palette = _stack_labels(layers, chars, fill)
+    if top is None:
+        return ''
+    return array2ascii(np.array(palette)[top])
+
+
+def _stack_labels(layers, chars, fill):
+
+    """
+    Validate the arguments for `stack_labels()` and combine the layers into
+    a single array of indexes into `[fill] + chars` with the painters
+    algorithm.  Returns `(None, palette)` if there are no layers.
+    """
+
+    chars = [str(c) for c in chars]
+    fill = str(fill)
+    if len(layers) != len(chars):
+        raise ValueError(
+            "Invalid chars `%s' - must have one character per layer" % chars)
+    if any(len(c) != 1 for c in chars + [fill]):
+        raise ValueError("Invalid chars `%s' - must be 1 character long" % (chars + [fill]))
+    if not layers:
+        return None, [fill]
+    if len(set(l.shape for l in layers)) != 1:
+        raise ValueError("Input layers have heterogeneous dimensions")
+
+    top = np.zeros(layers[0].shape, dtype=np.min_scalar_type(len(layers)))
+    for idx, layer in enumerate(layers, 1):
+        top[layer != 0] = idx
+
+    return top, [fill] + chars
+
+
+def render_to_file(ftrz, path, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
+                   all_touched=False, bbox=None, block_rows=_BLOCK_ROWS, max_cells=None,
+                   aspect=1.0):
+
+    """
+    Render directly to a text file without building the rendering in memory.
+    Geometries are rasterized into a memory-mapped temporary file one block of
+    rows at a time and then encoded into a memory-mapped output file, so
+    renderings larger than the available memory are possible.
+
+    The output is the same as `render()` with a trailing newline, and every
+    row has the same length, so row `N` starts at byte `N * stride` and can be
+    read without scanning the file.
+
+        >>> import gj2ascii
+        >>> import fiona
+        >>> with fiona.open('sample-data/polygons.geojson') as src:
+        ...     rows, stride = gj2ascii.render_to_file(src, 'poster.txt', 20000)
+        >>> with open('poster.txt', 'rb') as f:
+        ...     f.seek(500 * stride)
+        ...     row = f.read(stride)
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()`.
+
+    path : str
+        Output file.
+
+    width : int, optional
+        See `render()`.
+
+    fill : str, optional
+        See `render()`.  Must be an ASCII character.
+
+    char : str, optional
+        See `render()`.  Must be an ASCII character.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    bbox : tuple, optional
+        See `render()`.  Supplying a bbox is strongly recommended for large
+        inputs.
+
+    block_rows : int, optional
+        Number of rows to rasterize and encode at a time.
+
+    max_cells : int or None, optional
+        See `render()`.
+
+    aspect : float, optional
+        See `render()`.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    tuple
+        Number of rows and the number of bytes in each row, including the
+        newline.
+    """
+
+    width = int(math.ceil(width / 2))
+    fill = str(fill)
+    char = str(char)
+    for name, value in (('fill', fill), ('pixel', char)):
+        if len(value) != 1 or ord(value) > 127:
+            raise ValueError(
+                "Invalid %s value `%s' - must be 1 ASCII character long" % (name, value))
+    if width <= 0:
+        raise ValueError("Invalid width `%s' - must be > 0" % width)
+
+    ftrz, transform, (height, width) = _grid(
+        ftrz, width, bbox, max_cells=max_cells, aspect=aspect)
+
+    newline = os.linesep.encode('ascii')
+    text_width = 2 * width - 1
+    stride = text_width + len(newline)
+    lookup = np.array([ord(fill), ord(char)], dtype=np.uint8)
+
+    with tempfile.TemporaryFile() as f:
+        labels = np.memmap(f, dtype=rio.uint8, mode='w+', shape=(height, width))
+        _rasterize_blocks(
+            _geometry_extractor(ftrz), labels, transform, all_touched=all_touched,
+            block_rows=block_rows)
+
+        output = np.memmap(path, dtype=np.uint8, mode='w+', shape=(height, stride))
+        for row in range(0, height, block_rows):
+            block = output[row:row + block_rows]
+            block[:, 0:text_width:2] = lookup[labels[row:row + block_rows]]
+            block[:, 1:text_width:2] = ord(' ')
+            block[:, text_width:] = np.frombuffer(newline, dtype=np.uint8)
+        output.flush()
+        del output
+        del labels
+
+    return height, stride
+
+
 def paginate(ftrz, width=DEFAULT_WIDTH, properties=None, colormap=None, **kwargs):
 
     """
@@ -498,13 +1831,23 @@ def paginate(ftrz, width=DEFAULT_WIDTH, properties=None, colormap=None, **kwargs
         One feature (with attribute table and colors if specified) as ascii.
     """
 
+    # Compile the property lookup and table layout once for the whole layer
+    if properties is not None:
+        properties = list(properties)
+        formatter = _TableFormatter(properties)
+        getter = operator.itemgetter(*properties)
+        if len(properties) == 1:
+            def project(props):
+                return (getter(props),)
+        else:
+            project = getter
+
     for item in ftrz:
 
         output = []
 
         if properties is not None:
-            output.append(
-                dict2table(OrderedDict((p, item['properties'][p]) for p in properties)))
+            output.append(formatter.format(project(item['properties'])))
         r = render(item, width=width, **kwargs)
         if not colormap:
             output.append(r)
@@ -536,20 +1879,20 @@ def style(rendered_ascii, stylemap):
         A formatted string containing ANSI codes that is ready for `print()`.
     """
 
-    output = []
-    for row in ascii2array(rendered_ascii):
-        o_row = []
-        for char in row:
-            if char in stylemap:
-                emoji_or_color = stylemap[char]
-                if emoji_or_color in ANSI_COLORMAP:
-                    o_row.append(ANSI_COLORMAP[emoji_or_color] + char + ' ' + _ANSI_RESET)
-                else:
-                    o_row.append(emoji.emojize(emoji_or_color + ' ', use_aliases=True))
+    # Only style each distinct character once
+    rows = ascii2array(rendered_ascii)
+    styled = {}
+    for char in set(itertools.chain.from_iterable(rows)):
+        if char in stylemap:
+            emoji_or_color = stylemap[char]
+            if emoji_or_color in ANSI_COLORMAP:
+                styled[char] = ANSI_COLORMAP[emoji_or_color] + char + ' ' + _ANSI_RESET
             else:
-                o_row.append(char + ' ')
-        output.append(''.join(o_row))
-    return os.linesep.join(output)
+                styled[char] = emoji.emojize(emoji_or_color + ' ', use_aliases=True)
+        else:
+            styled[char] = char + ' '
+
+    return os.linesep.join(''.join([styled[char] for char in row]) for row in rows)
 
 
 def render_multiple(ftr_char_pairs, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, **kwargs):
@@ -712,7 +2055,18 @@ def style_multiple(ftr_style_pairs, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, **kw
         render_multiple(ftr_char_pairs, width=width, fill=fill_char, **kwargs), stylemap)
 
 
-def min_bbox(input_iter, return_iter=False):
+def _is_stream(obj):
+
+    """
+    Determine if an object is an iterable of input objects rather than a
+    single feature, geometry, or pre-rasterized input.
+    """
+
+    return hasattr(obj, '__iter__') and not isinstance(obj, dict) \
+        and not hasattr(obj, '__geo_interface__')
+
+
+def min_bbox(input_iter, return_iter=False, sample=None, margin=0):
 
     """
     Compute a bbox from an iterable object containing features, geometries, or
@@ -732,6 +2086,21 @@ def min_bbox(input_iter, return_iter=False):
         `bbox`, return (bbox, iter) where `iter` is a copy of the iterator
         if its a generator, otherwise the input iterator is returned.
 
+    sample : int or None, optional
+        Estimate the bbox from the first N objects instead of using the
+        `bounds` property or reading every object.  Only the sampled objects
+        are held in memory when the input is a generator.
+
+    margin : float, optional
+        Fraction of the bbox's width and height to add to each side.  Useful
+        when sampling.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
 
     Returns
     -------
@@ -739,7 +2108,17 @@ def min_bbox(input_iter, return_iter=False):
         (x_min, y_min, x_max, y_max) or ((x_min, y_min, x_max, y_max), <iterable>)
     """
 
-    if hasattr(input_iter, 'bounds'):
+    if sample is not None and sample < 1:
+        raise ValueError("Invalid sample `%s' - must be >= 1" % sample)
+
+    if sample is not None and _is_stream(input_iter):
+        head = list(itertools.islice(iter(input_iter), sample))
+        if iter(input_iter) is input_iter:
+            output_iterator = itertools.chain(head, input_iter)
+        else:
+            output_iterator = input_iter
+        bbox = min_bbox(head)
+    elif hasattr(input_iter, 'bounds'):
         bbox = input_iter.bounds
         output_iterator = input_iter
     else:
@@ -753,6 +2132,12 @@ def min_bbox(input_iter, return_iter=False):
             itertools.chain(*[asShape(g).bounds for g in _geometry_extractor(coord_iter)]))
         bbox = (min(coords[0::4]), min(coords[1::4]), max(coords[2::4]), max(coords[3::4]))
 
+    if margin:
+        x_min, y_min, x_max, y_max = bbox
+        x_pad = (x_max - x_min) * margin
+        y_pad = (y_max - y_min) * margin
+        bbox = (x_min - x_pad, y_min - y_pad, x_max + x_pad, y_max + y_pad)
+
     if return_iter:
         return bbox, output_iterator
     else:
@@ -0,0 +1,223 @@
+"""
+Encode label arrays as text, HTML, or raw arrays
+
+`render()` produces space separated text and `style()` only adds ANSI codes.
+Encoders instead work on the label arrays produced by `render_labels()`, so
+layers are rasterized once and then encoded into as many formats as needed:
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii import encoders
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     labels = gj2ascii.render_labels(src, 40)
+    >>> text = encoders.encode([labels], ['+'])
+    >>> html = encoders.encode([labels], ['+'], 'html', stylemap={'+': 'red'})
+    >>> raw = encoders.encode([labels], ['+'], 'npy')
+
+Every encoder is a function registered in `ENCODERS` and is called with an
+integer array of indexes into a palette of characters, where `0` is the fill
+character and `N` is the character of the Nth layer, and any additional
+keyword arguments passed to `encode()`.  Add an entry to `ENCODERS` to
+support another format.
+"""
+
+
+import io
+import os
+
+import numpy as np
+
+from .core import ANSI_COLORMAP
+from .core import DEFAULT_FILL
+from .core import _join_rows
+from .core import _stack_labels
+from .core import array2ascii
+from .pycompat import text_type
+try:  # pragma no cover
+    import emoji
+except ImportError:  # pragma no cover
+    emoji = None
+
+
+__all__ = [
+    'ENCODERS', 'encode', 'encode_compact', 'encode_html', 'encode_npy', 'encode_text']
+
+
+_HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}
+
+
+def encode_text(labels, palette):
+
+    """
+    Encode labels as space separated text identical to `stack_labels()`.
+    """
+
+    return array2ascii(np.array(palette)[labels])
+
+
+def encode_compact(labels, palette):
+
+    """
+    Encode labels as text without a space between cells.  Half as wide as
+    `encode_text()`, so shapes appear vertically stretched in a terminal.
+    """
+
+    return _join_rows(np.array(palette, dtype='U1')[labels])
+
+
+def _runs(labels):
+
+    """
+    Split every row of a label array into runs of identical values.  Returns
+    the flat start index, length, and value of every run, and whether each
+    run ends a row.
+    """
+
+    rows, cols = labels.shape
+    flat = labels.ravel()
+    changed = np.empty(flat.shape, dtype=np.bool_)
+    changed[0] = True
+    np.not_equal(flat[1:], flat[:-1], out=changed[1:])
+    changed[::cols] = True
+
+    starts = np.flatnonzero(changed)
+    stops = np.append(starts[1:], flat.size)
+    return starts, stops - starts, flat[starts], stops % cols == 0
+
+
+def encode_html(labels, palette, stylemap=None, compact=False, css_class='gj2ascii'):
+
+    """
+    Encode labels as a `<pre>` element where every run of cells from the
+    same layer is wrapped in a `<span>` with the class `{css_class}-{N}`,
+    where `N` is the layer's position in the palette.  Runs of fill are not
+    wrapped unless the fill character is in `stylemap`.  Work is done per
+    run rather than per cell.
+
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        Integer array of indexes into `palette`.
+
+    palette : list
+        Fill character followed by one character per layer.
+
+    stylemap : dict or None, optional
+        Characters mapped to colors or emoji like `style()`.  Colors are
+        added as CSS rules in a `<style>` element and emoji replace their
+        character.
+
+    compact : bool, optional
+        Do not add a space between cells.
+
+    css_class : str, optional
+        Class of the `<pre>` element and prefix of the run classes.
+
+
+    Returns
+    -------
+    str
+    """
+
+    stylemap = stylemap or {}
+    sep = '' if compact else ' '
+
+    texts = []
+    rules = []
+    for idx, char in enumerate(palette):
+        styled = stylemap.get(char)
+        if styled in ANSI_COLORMAP:
+            rules.append(
+                '.%s .%s-%s { color: %s; background-color: %s; }'
+                % (css_class, css_class, idx, styled, styled))
+        elif styled is not None and emoji is not None:
+            char = emoji.emojize(styled, use_aliases=True)
+        texts.append(''.join(_HTML_ESCAPES.get(c, c) for c in text_type(char)))
+    wrapped = [idx != 0 or palette[0] in stylemap for idx in range(len(palette))]
+
+    pieces = []
+    if rules:
+        pieces.append(os.linesep.join(['<style>'] + rules + ['</style>']) + os.linesep)
+    pieces.append('<pre class="%s">' % css_class)
+    if 0 not in labels.shape:
+        _, lengths, values, row_ends = _runs(labels)
+        for length, value, row_end in zip(lengths.tolist(), values.tolist(), row_ends.tolist()):
+            text = (texts[value] + sep) * length
+            if row_end and sep:
+                text = text[:-len(sep)]
+            if wrapped[value]:
+                text = '<span class="%s-%s">%s</span>' % (css_class, value, text)
+            pieces.append(text)
+            if row_end:
+                pieces.append(os.linesep)
+        pieces.pop()
+    pieces.append('</pre>')
+
+    return ''.join(pieces)
+
+
+def encode_npy(labels, palette):
+
+    """
+    Encode labels as the bytes of a `.npy` file, which can be read with
+    `np.load()`.  The palette is not included.
+    """
+
+    buf = io.BytesIO()
+    np.save(buf, labels)
+    return buf.getvalue()
+
+
+ENCODERS = {
+    'compact': encode_compact,
+    'html': encode_html,
+    'npy': encode_npy,
+    'text': encode_text
+}
+
+
+def encode(layers, chars, format='text', fill=DEFAULT_FILL, **kwargs):
+
+    """
+    Combine label arrays with the painters algorithm like `stack_labels()`
+    and encode the result.
+
+
+    Parameters
+    ----------
+    layers : list
+        Label arrays from `render_labels()` with identical shapes.
+
+    chars : list
+        One character per layer.
+
+    format : str, optional
+        Name of an encoder in `ENCODERS`.
+
+    fill : str, optional
+        Character for cells that are not set in any layer.
+
+    kwargs : **kwargs, optional
+        Additional keyword arguments for the encoder.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str or bytes
+        `bytes` for `npy` and `str` for everything else.
+    """
+
+    if format not in ENCODERS:
+        raise ValueError(
+            "Invalid format `%s' - must be one of: %s" % (format, ', '.join(sorted(ENCODERS))))
+    labels, palette = _stack_labels(layers, chars, fill)
+    if labels is None:
+        labels = np.zeros((0, 0), dtype=np.uint8)
+    return ENCODERS[format](labels, palette, **kwargs)
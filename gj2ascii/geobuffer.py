@@ -0,0 +1,675 @@
+"""
+Compact in-memory geometry storage
+
+Features are normally passed around as GeoJSON dictionaries of nested lists,
+which are large in memory and are converted to OGR geometries every time they
+are rasterized.  A `GeometryBuffer` stores every coordinate of a layer in a
+single flat `float64` array along with offset arrays describing how the
+coordinates are grouped into rings, parts, and geometries, similar to the
+GeoArrow memory layout.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii.geobuffer import GeometryBuffer
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     geometries = GeometryBuffer.from_features(src)
+    >>> print(gj2ascii.render(geometries, 40))
+    >>> print(gj2ascii.render(geometries.filter((0, 0, 10, 10)), 40))
+
+Layout:
+
+    coords[ring_offsets[i]:ring_offsets[i + 1]]         ring or line i
+    rings[part_offsets[j]:part_offsets[j + 1]]          part j
+    parts[geom_offsets[k]:geom_offsets[k + 1]]          geometry k
+
+Every point is stored as a ring with a single coordinate and every line as a
+part with a single ring.  Only x and y are kept.
+
+Parsing a large layer is often slower than rendering it, so a buffer can be
+written to a sidecar file next to its datasource with `save()`.  The arrays
+are stored uncompressed and aligned so `load()` memory maps them instead of
+reading them, which makes loading nearly free regardless of the layer size.
+
+    >>> from gj2ascii.geobuffer import sidecar
+    >>> path = 'sample-data/polygons.geojson'
+    >>> with fiona.open(path) as src:
+    ...     GeometryBuffer.from_features(src).save(sidecar(path), source=path)
+    >>> geometries = GeometryBuffer.load(sidecar(path))
+    >>> geometries.is_stale(path)
+    False
+"""
+
+
+import itertools
+import json
+import os
+import struct
+
+import numpy as np
+from rasterio.features import rasterize
+
+from .core import _burn_line_coords
+from .core import _burn_points
+from .core import _geometry_extractor
+from .core import _ranges
+from .pycompat import replace
+from .pyramid import _source_signature
+
+
+__all__ = ['GeometryBuffer', 'sidecar']
+
+
+_MAGIC = b'GJ2AGEOM'
+_VERSION = 1
+_ALIGNMENT = 64
+_ARRAYS = (
+    'types', 'geom_offsets', 'part_offsets', 'ring_offsets', 'coords', 'geometry_bounds')
+
+
+_TYPES = {
+    'Point': 1,
+    'LineString': 2,
+    'Polygon': 3,
+    'MultiPoint': 4,
+    'MultiLineString': 5,
+    'MultiPolygon': 6
+}
+_TYPE_NAMES = {v: k for k, v in _TYPES.items()}
+_POINTS = (1, 4)
+_LINES = (2, 5)
+_POLYGONS = (3, 6)
+
+
+def _parts(gtype, coordinates):
+
+    """
+    Normalize the coordinates of a GeoJSON geometry to a list of parts, each
+    containing a list of rings.
+    """
+
+    if gtype == 'Point':
+        return [[[coordinates]]]
+    elif gtype == 'LineString':
+        return [[coordinates]]
+    elif gtype == 'Polygon':
+        return [coordinates]
+    elif gtype == 'MultiPoint':
+        return [[[c]] for c in coordinates]
+    elif gtype == 'MultiLineString':
+        return [[l] for l in coordinates]
+    else:
+        return coordinates
+
+
+def sidecar(path, layer=None):
+
+    """
+    Get the path to a datasource's geometry sidecar file.
+
+
+    Parameters
+    ----------
+    path : str
+        Datasource.
+
+    layer : str or None, optional
+        Layer within the datasource.
+
+
+    Returns
+    -------
+    str
+    """
+
+    if layer is None:
+        return path + '.geometries'
+    return '%s.%s.geometries' % (path, layer)
+
+
+def _aligned(offset):
+
+    """
+    Round a byte offset up to the next multiple of `_ALIGNMENT`.
+    """
+
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _offsets(lengths):
+
+    """
+    Convert a sequence of lengths to an offset array.
+    """
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class GeometryBuffer(object):
+
+    """
+    A layer of geometries stored as flat numpy arrays.  Use
+    `GeometryBuffer.from_features()` to build one from anything `render()`
+    accepts.
+
+    A buffer can be passed to `render()`, `render_labels()`, and
+    `min_bbox()` in place of features.  Points and lines are rasterized
+    directly from the coordinate array and only polygons are converted back
+    to GeoJSON to be handed to GDAL.  Iterating over a buffer produces every
+    geometry as GeoJSON, like `geometry()`, for code that does not understand
+    buffers.
+
+
+    Parameters
+    ----------
+    types : np.ndarray
+        `uint8` geometry type code for each geometry.
+
+    geom_offsets : np.ndarray
+        Offsets into the parts for each geometry.
+
+    part_offsets : np.ndarray
+        Offsets into the rings for each part.
+
+    ring_offsets : np.ndarray
+        Offsets into `coords` for each ring.
+
+    coords : np.ndarray
+        `(N, 2)` `float64` array of x and y coordinates.
+
+    geometry_bounds : np.ndarray or None, optional
+        `(N, 4)` array of bounds for each geometry.  Computed from `coords`
+        if not given.
+
+    signature : tuple or None, optional
+        Modification time and size of the source datasource.
+    """
+
+    def __init__(self, types, geom_offsets, part_offsets, ring_offsets, coords,
+                 geometry_bounds=None, signature=None):
+        self.types = np.asarray(types, dtype=np.uint8)
+        self.geom_offsets = np.asarray(geom_offsets, dtype=np.int64)
+        self.part_offsets = np.asarray(part_offsets, dtype=np.int64)
+        self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(self.geom_offsets) != len(self.types) + 1 \
+                or self.geom_offsets[-1] != len(self.part_offsets) - 1 \
+                or self.part_offsets[-1] != len(self.ring_offsets) - 1 \
+                or self.ring_offsets[-1] != len(self.coords):
+            raise ValueError("Invalid offsets - do not match the number of items they index")
+        self.signature = signature
+        self._polygons = None
+
+        if geometry_bounds is not None:
+            self.geometry_bounds = np.asarray(geometry_bounds, dtype=np.float64).reshape(-1, 4)
+            if len(self.geometry_bounds) != len(self.types):
+                raise ValueError(
+                    "Invalid geometry_bounds - must have one row for every geometry")
+            return
+
+        # Per geometry bounds.  Empty geometries have NaN bounds.
+        coord_offsets = self.ring_offsets[self.part_offsets[self.geom_offsets]]
+        nonempty = np.nonzero(np.diff(coord_offsets))[0]
+        self.geometry_bounds = np.full((len(self.types), 4), np.nan)
+        if len(nonempty):
+            starts = coord_offsets[nonempty]
+            self.geometry_bounds[nonempty, :2] = np.minimum.reduceat(self.coords, starts)
+            self.geometry_bounds[nonempty, 2:] = np.maximum.reduceat(self.coords, starts)
+
+    def __repr__(self):
+        return "<%s geometries=%s coords=%s>" % (
+            self.__class__.__name__, len(self), len(self.coords))
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.geometry(idx)
+
+    @classmethod
+    def from_features(cls, ftrz):
+
+        """
+        Build a buffer with a single pass over the input.
+
+
+        Parameters
+        ----------
+        ftrz : dict or iterator
+            Anything accepted by `render()`.
+
+
+        Raises
+        ------
+        ValueError
+            An input geometry has an unsupported type.
+
+
+        Returns
+        -------
+        GeometryBuffer
+        """
+
+        types = []
+        geom_lengths = []
+        part_lengths = []
+        ring_lengths = []
+        coords = []
+
+        for geom in _geometry_extractor(ftrz):
+            gtype = geom['type']
+            if gtype not in _TYPES:
+                raise ValueError("Invalid geometry type `%s'" % gtype)
+            parts = _parts(gtype, geom['coordinates'])
+            types.append(_TYPES[gtype])
+            geom_lengths.append(len(parts))
+            for part in parts:
+                part_lengths.append(len(part))
+                for ring in part:
+                    ring_lengths.append(len(ring))
+                    coords.extend(ring)
+
+        xy = np.fromiter(itertools.chain.from_iterable(coords), dtype=np.float64)
+        if len(xy) != 2 * len(coords):
+            # At least some coordinates have a Z value
+            xy = np.fromiter(
+                itertools.chain.from_iterable(c[:2] for c in coords), dtype=np.float64)
+
+        return cls(
+            types, _offsets(geom_lengths), _offsets(part_lengths), _offsets(ring_lengths), xy)
+
+    @classmethod
+    def load(cls, path):
+
+        """
+        Load a buffer written by `save()`.  Arrays are memory mapped
+        read-only so only the parts that are used are read from disk.
+
+
+        Parameters
+        ----------
+        path : str
+            Sidecar file.
+
+
+        Raises
+        ------
+        ValueError
+            The file is not a geometry sidecar file, is truncated or corrupt,
+            or was written by an incompatible version.
+
+
+        Returns
+        -------
+        GeometryBuffer
+        """
+
+        # Sidecar files are rebuilt when they cannot be loaded so anything
+        # wrong with one, including truncation, is reported as a ValueError
+        header = None
+        with open(path, 'rb') as f:
+            magic = f.read(len(_MAGIC))
+            size = f.read(8)
+            if magic == _MAGIC and len(size) == 8:
+                try:
+                    header = json.loads(f.read(struct.unpack('<Q', size)[0]).decode('utf-8'))
+                except ValueError:
+                    pass
+            file_size = os.fstat(f.fileno()).st_size
+        if not isinstance(header, dict):
+            raise ValueError("Invalid geometry sidecar file `%s'" % path)
+        if header.get('version') != _VERSION:
+            raise ValueError(
+                "Invalid geometry sidecar file `%s' - unsupported version %s"
+                % (path, header.get('version')))
+
+        arrays = {}
+        for name in _ARRAYS:
+            try:
+                dtype, shape, offset = header['arrays'][name]
+                dtype = np.dtype(dtype)
+                shape = tuple(int(s) for s in shape)
+                offset = int(offset)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(
+                    "Invalid geometry sidecar file `%s' - bad layout for `%s'" % (path, name))
+            if not np.prod(shape):
+                # Empty regions of a file cannot be mapped
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            elif offset < 0 or offset + int(np.prod(shape)) * dtype.itemsize > file_size:
+                raise ValueError("Invalid geometry sidecar file `%s' - truncated" % path)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+        signature = header.get('signature')
+        return cls(
+            arrays['types'], arrays['geom_offsets'], arrays['part_offsets'],
+            arrays['ring_offsets'], arrays['coords'], geometry_bounds=arrays['geometry_bounds'],
+            signature=None if signature is None else tuple(signature))
+
+    def save(self, path, source=None):
+
+        """
+        Write the buffer to an uncompressed sidecar file that can be memory
+        mapped by `load()`.  The file is written next to `path` and moved
+        into place so processes that have the previous version mapped are
+        not affected.
+
+
+        Parameters
+        ----------
+        path : str
+            Output file.  See `sidecar()`.
+
+        source : str or None, optional
+            Path to the datasource the geometries came from.  Used to detect
+            a stale sidecar file with `is_stale()`.  Defaults to the
+            buffer's existing signature.
+        """
+
+        signature = self.signature if source is None else _source_signature(source)
+        arrays = [(n, np.ascontiguousarray(getattr(self, n))) for n in _ARRAYS]
+
+        def _header(start):
+            entries = {}
+            offset = start
+            for name, a in arrays:
+                entries[name] = [a.dtype.str, list(a.shape), offset]
+                offset = _aligned(offset + a.nbytes)
+            return entries, json.dumps({
+                'version': _VERSION,
+                'signature': None if signature is None else list(signature),
+                'arrays': entries
+            }).encode('utf-8')
+
+        # The header contains the offsets of the arrays that follow it, so
+        # grow the space reserved for it until the offsets fit.  Offsets only
+        # get longer as the space grows so this settles within a few passes.
+        start = _aligned(len(_MAGIC) + 8)
+        while True:
+            entries, header = _header(start)
+            needed = _aligned(len(_MAGIC) + 8 + len(header))
+            if needed <= start:
+                break
+            start = needed
+        header = header.ljust(start - len(_MAGIC) - 8)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for name, a in arrays:
+                f.seek(entries[name][2])
+                f.write(a.tobytes())
+        replace(tmp_path, path)
+        self.signature = signature
+
+    def is_stale(self, path):
+
+        """
+        Determine if the source datasource has changed since the buffer was
+        saved.
+
+
+        Parameters
+        ----------
+        path : str
+            Source datasource.
+
+
+        Returns
+        -------
+        bool
+        """
+
+        signature = _source_signature(path)
+        return signature is None or self.signature != signature
+
+    @property
+    def bounds(self):
+
+        """
+        (x_min, y_min, x_max, y_max) of every geometry.
+        """
+
+        if not len(self.coords):
+            raise ValueError("Cannot compute bounds of an empty buffer")
+        return (
+            float(np.nanmin(self.geometry_bounds[:, 0])),
+            float(np.nanmin(self.geometry_bounds[:, 1])),
+            float(np.nanmax(self.geometry_bounds[:, 2])),
+            float(np.nanmax(self.geometry_bounds[:, 3])))
+
+    @property
+    def nbytes(self):
+
+        """
+        Number of bytes used by the buffer's arrays.
+        """
+
+        return sum(a.nbytes for a in (
+            self.types, self.geom_offsets, self.part_offsets, self.ring_offsets, self.coords,
+            self.geometry_bounds))
+
+    def geometry(self, idx):
+
+        """
+        Get a single geometry as GeoJSON.
+
+
+        Parameters
+        ----------
+        idx : int
+            Geometry index.
+
+
+        Returns
+        -------
+        dict
+        """
+
+        code = int(self.types[idx])
+        parts = []
+        for part in range(self.geom_offsets[idx], self.geom_offsets[idx + 1]):
+            parts.append([
+                self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]].tolist()
+                for r in range(self.part_offsets[part], self.part_offsets[part + 1])])
+        if code == 1:
+            coordinates = parts[0][0][0]
+        elif code == 2:
+            coordinates = parts[0][0]
+        elif code == 3:
+            coordinates = parts[0]
+        elif code == 4:
+            coordinates = [p[0][0] for p in parts]
+        elif code == 5:
+            coordinates = [p[0] for p in parts]
+        else:
+            coordinates = parts
+        return {'type': _TYPE_NAMES[code], 'coordinates': coordinates}
+
+    def take(self, indexes):
+
+        """
+        Get a new buffer containing a subset of the geometries.
+
+
+        Parameters
+        ----------
+        indexes : array_like
+            Geometry indexes in the order they should appear.
+
+
+        Returns
+        -------
+        GeometryBuffer
+        """
+
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        parts, part_geoms = _ranges(
+            self.geom_offsets[indexes], self.geom_offsets[indexes + 1] - 1)
+        rings, _ = _ranges(self.part_offsets[parts], self.part_offsets[parts + 1] - 1)
+        coords, _ = _ranges(self.ring_offsets[rings], self.ring_offsets[rings + 1] - 1)
+        return self.__class__(
+            self.types[indexes],
+            _offsets(np.diff(self.geom_offsets)[indexes]),
+            _offsets(np.diff(self.part_offsets)[parts]),
+            _offsets(np.diff(self.ring_offsets)[rings]),
+            self.coords[coords])
+
+    def filter(self, bbox):
+
+        """
+        Get a new buffer containing the geometries whose bounds intersect a
+        bbox.
+
+
+        Parameters
+        ----------
+        bbox : tuple
+            x_min, y_min, x_max, y_max.
+
+
+        Returns
+        -------
+        GeometryBuffer
+        """
+
+        x_min, y_min, x_max, y_max = bbox
+        b = self.geometry_bounds
+        with np.errstate(invalid='ignore'):
+            selected = (b[:, 0] <= x_max) & (b[:, 2] >= x_min) \
+                & (b[:, 1] <= y_max) & (b[:, 3] >= y_min)
+        return self.take(np.nonzero(selected)[0])
+
+    def simplify(self, tolerance):
+
+        """
+        Get a new buffer with fewer vertices by dropping every vertex that
+        falls in the same `tolerance` sized grid cell as the vertex before
+        it.  The first and last vertex of every ring and line are kept, and
+        polygon rings keep all of their vertices if dropping any would leave
+        fewer than 4.  Simplifying to the output cell size before rendering
+        removes detail that cannot be seen.
+
+
+        Parameters
+        ----------
+        tolerance : float
+            Grid cell size in georeferenced units.
+
+
+        Raises
+        ------
+        ValueError
+            A parameter has an invalid value.
+
+
+        Returns
+        -------
+        GeometryBuffer
+        """
+
+        if tolerance <= 0:
+            raise ValueError("Invalid tolerance `%s' - must be > 0" % tolerance)
+        if not len(self.coords):
+            return self
+
+        cells = np.floor(self.coords / tolerance)
+        keep = np.ones(len(self.coords), dtype=bool)
+        keep[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+        ring_starts = self.ring_offsets[:-1]
+        ring_ends = self.ring_offsets[1:] - 1
+        nonempty = ring_ends >= ring_starts
+        keep[ring_starts[nonempty]] = True
+        keep[ring_ends[nonempty]] = True
+
+        # Polygon rings must stay closed rings
+        ring_lengths = np.diff(self.ring_offsets)
+        ring_ids = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+        kept = np.bincount(ring_ids, weights=keep, minlength=len(ring_lengths))
+        part_types = np.repeat(self.types, np.diff(self.geom_offsets))
+        ring_types = np.repeat(part_types, np.diff(self.part_offsets))
+        restore = np.isin(ring_types, _POLYGONS) & (kept < 4)
+        keep |= restore[ring_ids]
+
+        lengths = np.bincount(ring_ids, weights=keep, minlength=len(ring_lengths))
+        return self.__class__(
+            self.types, self.geom_offsets, self.part_offsets,
+            _offsets(lengths.astype(np.int64)), self.coords[keep])
+
+    def _polygon_geometries(self):
+
+        """
+        Polygons as GeoJSON for GDAL.  Built on the first call and kept, so
+        rendering the same buffer several times, like once per tile, only
+        pays for the conversion once, at the cost of holding the polygons in
+        memory as GeoJSON for as long as the buffer exists.
+        """
+
+        if self._polygons is None:
+            self._polygons = [
+                self.geometry(i) for i in np.nonzero(np.isin(self.types, _POLYGONS))[0]]
+        return self._polygons
+
+    def labels(self, out_shape, transform, all_touched=False):
+
+        """
+        Rasterize every geometry.  This is the protocol `render()` uses for
+        inputs that produce labels directly.  The output is identical to
+        rendering the same geometries as GeoJSON.  Polygons are converted to
+        GeoJSON on the first call and reused after that.
+
+
+        Parameters
+        ----------
+        out_shape : tuple
+            Output (rows, cols).
+
+        transform : affine.Affine
+            North-up transform for the output array.
+
+        all_touched : bool, optional
+            See `render()`.
+
+
+        Returns
+        -------
+        np.ndarray
+            `uint8` array containing `1` where a cell intersects a geometry.
+        """
+
+        out = np.zeros(out_shape, dtype=np.uint8)
+        part_types = np.repeat(self.types, np.diff(self.geom_offsets))
+        ring_types = np.repeat(part_types, np.diff(self.part_offsets))
+        ring_lengths = np.diff(self.ring_offsets)
+        coord_types = np.repeat(ring_types, ring_lengths)
+
+        points = np.isin(coord_types, _POINTS)
+        if points.any():
+            _burn_points(self.coords[points, 0], self.coords[points, 1], out, transform)
+
+        other = []
+        lines = np.nonzero(np.isin(ring_types, _LINES))[0]
+        if len(lines):
+            skipped = _burn_line_coords(
+                self.coords[np.isin(coord_types, _LINES)], ring_lengths[lines], out, transform,
+                all_touched=all_touched)
+            other += [{
+                'type': 'LineString',
+                'coordinates': self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]].tolist()
+            } for r in lines[skipped]]
+
+        other += self._polygon_geometries()
+        if other:
+            rasterize(
+                shapes=other,
+                out=out,
+                default_value=1,
+                transform=transform,
+                all_touched=all_touched)
+
+        return out
@@ -0,0 +1,470 @@
+"""
+Per-feature indexes for paging through large layers
+
+`--iterate` reads a layer from the start and can only move forward, so
+reaching feature 10,000 means reading the 9,999 before it, and filtering
+with a bbox visits every feature.  A `FeatureIndex` records the position,
+ID, and bounds of every feature in a layer so features intersecting a bbox
+are found without reading the layer and any feature can be read directly.
+
+    >>> import fiona
+    >>> from gj2ascii.index import FeatureIndex, sidecar
+    >>> path = 'sample-data/polygons.geojson'
+    >>> with fiona.open(path) as src:
+    ...     index = FeatureIndex.build(src, source=path)
+    >>> index.save(sidecar(path))
+    >>> offsets = index.select(bbox=(0, 0, 10, 10))
+    >>> for feature in index.read(offsets, path=path):
+    ...     print(feature['id'])
+
+Features are read with `fiona.Collection.__getitem__()`, which most drivers
+implement as a seek.  GeoJSON FeatureCollections are parsed in their entirety
+when they are opened, so the byte range of every feature in the file is also
+recorded and features are read and parsed individually without opening the
+file with `fiona`.
+"""
+
+
+from collections import OrderedDict
+import contextlib
+import itertools
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+from shapely.geometry import asShape
+from shapely.geometry import box
+
+from .geobuffer import GeometryBuffer
+from .pycompat import text_type
+from .pyramid import _source_signature
+
+
+__all__ = ['FeatureIndex', 'sidecar']
+
+
+# Strings and brackets, which is enough to find the top level `features` key
+_TOKENS = re.compile(br'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_COLON = re.compile(br'\s*:')
+_WHITESPACE = re.compile(br'[\s,]*')
+_BUILD_BATCH_SIZE = 10000
+
+
+def sidecar(path, layer=None):
+
+    """
+    Get the path to a datasource's feature index sidecar file.
+
+
+    Parameters
+    ----------
+    path : str
+        Datasource.
+
+    layer : str or None, optional
+        Layer within the datasource.
+
+
+    Returns
+    -------
+    str
+    """
+
+    if layer is None:
+        return path + '.index.npz'
+    return '%s.%s.index.npz' % (path, layer)
+
+
+def _geojson_positions(path):
+
+    """
+    Find the byte range of every feature in a GeoJSON FeatureCollection.
+    Returns `None` if the file is not a FeatureCollection.
+
+    The file is memory mapped and scanned for brackets, so only one feature
+    at a time is decoded rather than the entire file.
+    """
+
+    if not os.path.getsize(path):
+        return None
+    with open(path, 'rb') as f, \
+            contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+
+        # Find the array containing the features
+        depth = 0
+        key = None
+        start = None
+        for match in _TOKENS.finditer(data):
+            token = match.group(0)
+            if token in (b'{', b'['):
+                depth += 1
+                if depth == 2 and key == b'"features"' and token == b'[':
+                    start = match.end()
+                    break
+            elif token in (b'}', b']'):
+                depth -= 1
+            elif depth == 1 and _COLON.match(data, match.end()):
+                key = token
+                continue
+            key = None
+        if start is None:
+            return None
+
+        decoder = json.JSONDecoder()
+        starts = []
+        stops = []
+        pos = _WHITESPACE.match(data, start).end()
+        while data[pos:pos + 1] != b']':
+            if data[pos:pos + 1] != b'{':
+                return None
+
+            # Find the closing bracket and decode only this feature.  Decoding
+            # as latin-1 maps every byte to one character so string positions
+            # are byte positions.  Only the structure of the text matters.
+            depth = 0
+            end = None
+            for match in _TOKENS.finditer(data, pos):
+                token = match.group(0)
+                if token in (b'{', b'['):
+                    depth += 1
+                elif token in (b'}', b']'):
+                    depth -= 1
+                    if not depth:
+                        end = match.end()
+                        break
+            if end is None:
+                return None
+            text = data[pos:end].decode('latin-1')
+            try:
+                obj, length = decoder.raw_decode(text)
+            except ValueError:
+                return None
+            if length != len(text) or obj.get('type') != 'Feature':
+                return None
+            starts.append(pos)
+            stops.append(end)
+            pos = _WHITESPACE.match(data, end).end()
+    return np.array([starts, stops], dtype=np.int64).T.reshape(-1, 2)
+
+
+def _bounds(geometries):
+
+    """
+    Compute the bounds of a list of GeoJSON geometries as an `(N, 4)` array.
+    Missing and empty geometries have NaN bounds.
+    """
+
+    output = np.full((len(geometries), 4), np.nan)
+    simple = [i for i, g in enumerate(geometries)
+              if g is not None and g['type'] != 'GeometryCollection']
+    if simple:
+        output[simple] = GeometryBuffer.from_features(
+            [geometries[i] for i in simple]).geometry_bounds
+    for i, g in enumerate(geometries):
+        if g is not None and g['type'] == 'GeometryCollection':
+            output[i] = asShape(g).bounds or np.nan
+    return output
+
+
+def _coerce(value, field_type):
+
+    """
+    Convert a property value parsed from GeoJSON to the type `fiona` produces
+    for a field, like `2.0` rather than `2` for a `float` field.
+    """
+
+    if value is None or isinstance(value, bool):
+        return value
+    kind = field_type.split(':')[0]
+    try:
+        if kind == 'float':
+            return float(value)
+        elif kind == 'int':
+            return int(value)
+        elif kind == 'str' and isinstance(value, (int, float)):
+            return text_type(value)
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+class FeatureIndex(object):
+
+    """
+    The ID and bounds of every feature in a layer, and optionally the byte
+    range of every feature in a GeoJSON file.  Features are identified by
+    their offset, which is their position in the layer.
+
+
+    Parameters
+    ----------
+    fids : np.ndarray
+        Feature ID of each feature, as used by `fiona.Collection.__getitem__()`.
+
+    bounds : np.ndarray
+        `(N, 4)` array of x_min, y_min, x_max, y_max for each feature.
+        Features without a geometry have NaN bounds.
+
+    positions : np.ndarray or None, optional
+        `(N, 2)` array of the start and stop byte of each feature in a
+        GeoJSON file.
+
+    fields : list or None, optional
+        Names of the layer's fields.  Features read from byte positions
+        have exactly these properties.
+
+    field_types : list or None, optional
+        The `fiona` type of each field, like `float` or `str:80`.  Property
+        values read from byte positions are converted to these types to
+        match what `fiona` produces.
+
+    signature : tuple or None, optional
+        Modification time and size of the source datasource.
+    """
+
+    def __init__(self, fids, bounds, positions=None, fields=None, field_types=None,
+                 signature=None):
+        self.fids = np.asarray(fids, dtype=np.int64).reshape(-1)
+        self.bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        self.positions = None if positions is None \
+            else np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        self.fields = list(fields or [])
+        self.field_types = list(field_types or ['str'] * len(self.fields))
+        self.signature = signature
+        if len(self.bounds) != len(self.fids) \
+                or (self.positions is not None and len(self.positions) != len(self.fids)):
+            raise ValueError("Invalid index - must have one row for every feature")
+        if len(self.field_types) != len(self.fields):
+            raise ValueError("Invalid field_types - must have one type for every field")
+
+    def __repr__(self):
+        return "<%s features=%s positions=%s>" % (
+            self.__class__.__name__, len(self), self.positions is not None)
+
+    def __len__(self):
+        return len(self.fids)
+
+    @classmethod
+    def build(cls, src, source=None):
+
+        """
+        Index every feature in a layer with a single pass.
+
+
+        Parameters
+        ----------
+        src : fiona.Collection
+            Layer to index.
+
+        source : str or None, optional
+            Path to the datasource.  Used to detect a stale sidecar file with
+            `is_stale()`, and to find the byte range of every feature if it is
+            a GeoJSON file.
+
+
+        Returns
+        -------
+        FeatureIndex
+        """
+
+        fids = []
+        bounds = []
+        features = iter(src)
+        while True:
+            batch = list(itertools.islice(features, _BUILD_BATCH_SIZE))
+            if not batch:
+                break
+            fids += [int(f['id']) for f in batch]
+            bounds.append(_bounds([f['geometry'] for f in batch]))
+
+        positions = None
+        if source is not None and src.driver == 'GeoJSON' and os.path.isfile(source):
+            positions = _geojson_positions(source)
+            if positions is not None and len(positions) != len(fids):
+                positions = None
+
+        signature = None if source is None else _source_signature(source)
+        return cls(
+            fids, np.concatenate(bounds or [np.zeros((0, 4))]), positions=positions,
+            fields=list(src.schema['properties'].keys()),
+            field_types=list(src.schema['properties'].values()), signature=signature)
+
+    @classmethod
+    def load(cls, path):
+
+        """
+        Load an index written by `save()`.
+
+
+        Parameters
+        ----------
+        path : str
+            Sidecar file.
+
+
+        Returns
+        -------
+        FeatureIndex
+        """
+
+        with np.load(path) as data:
+            positions = data['positions'] if data['positions'].size else None
+            fields = json.loads(str(data['fields']))
+            # Indexes written before field types were recorded cannot convert
+            # property values so features are read with fiona instead
+            if 'field_types' in data.files:
+                field_types = json.loads(str(data['field_types']))
+            else:
+                field_types = None
+                positions = None
+            return cls(
+                data['fids'], data['bounds'], positions=positions, fields=fields,
+                field_types=field_types, signature=tuple(data['signature'].tolist()) or None)
+
+    def save(self, path):
+
+        """
+        Write the index to a compressed sidecar file.
+
+
+        Parameters
+        ----------
+        path : str
+            Output file.  See `sidecar()`.
+        """
+
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                fids=self.fids,
+                bounds=self.bounds,
+                positions=np.zeros((0, 2), dtype=np.int64) if self.positions is None
+                else self.positions,
+                fields=json.dumps(self.fields),
+                field_types=json.dumps(self.field_types),
+                signature=np.array(self.signature or (), dtype=np.float64))
+
+    def is_stale(self, path):
+
+        """
+        Determine if the source datasource has changed since the index was
+        built.
+
+
+        Parameters
+        ----------
+        path : str
+            Source datasource.
+
+
+        Returns
+        -------
+        bool
+        """
+
+        signature = _source_signature(path)
+        return signature is None or self.signature != signature
+
+    def select(self, bbox=None, start=0):
+
+        """
+        Get the offsets of the features whose bounds intersect a bbox.
+
+
+        Parameters
+        ----------
+        bbox : tuple or None, optional
+            x_min, y_min, x_max, y_max.  All features are selected if not
+            given.
+
+        start : int, optional
+            Skip features before this offset.
+
+
+        Returns
+        -------
+        np.ndarray
+        """
+
+        offsets = np.arange(max(start, 0), len(self), dtype=np.int64)
+        if bbox is None:
+            return offsets
+        x_min, y_min, x_max, y_max = bbox
+        b = self.bounds[offsets]
+        with np.errstate(invalid='ignore'):
+            selected = (b[:, 0] <= x_max) & (b[:, 2] >= x_min) \
+                & (b[:, 1] <= y_max) & (b[:, 3] >= y_min)
+        return offsets[selected]
+
+    def read(self, offsets, src=None, path=None, bbox=None):
+
+        """
+        Read features by offset.  Features are read from their byte range
+        in `path` when the index has byte positions, otherwise from `src`.
+
+
+        Parameters
+        ----------
+        offsets : array_like
+            Offsets of the features to read, like from `select()`.
+
+        src : fiona.Collection or None, optional
+            Open layer to read from.
+
+        path : str or None, optional
+            GeoJSON file the index was built from.
+
+        bbox : tuple or None, optional
+            Skip features whose geometry does not intersect this bbox, which
+            matches `fiona.Collection.filter()`.  Features selected by their
+            bounds alone can be outside of the bbox.
+
+
+        Raises
+        ------
+        ValueError
+            Neither `src` nor a `path` for an index with byte positions was
+            given.
+
+
+        Yields
+        ------
+        dict
+            GeoJSON feature.
+        """
+
+        if self.positions is not None and path is not None:
+            def _read(f, offset):
+                start, stop = self.positions[offset]
+                f.seek(start)
+                feature = json.loads(f.read(stop - start).decode('utf-8'))
+                properties = feature.get('properties') or {}
+                return {
+                    'type': 'Feature',
+                    'id': str(self.fids[offset]),
+                    'properties': OrderedDict(
+                        (k, _coerce(properties.get(k), t))
+                        for k, t in zip(self.fields, self.field_types)),
+                    'geometry': feature.get('geometry')}
+            f = open(path, 'rb')
+        elif src is not None:
+            def _read(_, offset):
+                return src[int(self.fids[offset])]
+            f = None
+        else:
+            raise ValueError("Reading features requires an open layer or a path to a GeoJSON file")
+
+        area = None if bbox is None else box(*bbox)
+        try:
+            for offset in offsets:
+                feature = _read(f, offset)
+                if area is not None and (
+                        feature['geometry'] is None
+                        or not asShape(feature['geometry']).intersects(area)):
+                    continue
+                yield feature
+        finally:
+            if f is not None:
+                f.close()
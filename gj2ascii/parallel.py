@@ -0,0 +1,429 @@
+"""
+Multiprocess rendering of a single large layer
+
+`render()` rasterizes an entire layer in a single process.  A sharded render
+splits the layer into ranges of features that are read and rasterized by a
+pool of worker processes, each opening the datasource on its own.  Workers
+write directly into a label array in shared memory so results are never
+pickled or copied back to the parent.
+
+    >>> import gj2ascii.parallel
+    >>> print(gj2ascii.parallel.render_sharded(
+    ...     'sample-data/polygons.geojson', width=40, processes=4))
+
+Workers only ever set cells to `1` so concurrent writes to the same cell
+cannot lose a geometry, which makes the merge a logical OR without locking.
+
+Multiple layers can be rendered in parallel with `render_layers()`.  Every
+layer is rendered into its own `SharedLabels()` array, which is passed to a
+worker by name rather than by value, and the parent stacks the arrays
+directly with `stack_labels()`.
+"""
+
+
+from __future__ import division
+
+import ctypes
+import math
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+import affine
+import fiona as fio
+import numpy as np
+
+from .core import DEFAULT_CHAR
+from .core import DEFAULT_FILL
+from .core import DEFAULT_WIDTH
+from .core import _geometry_extractor
+from .core import _grid
+from .core import _rasterize
+from .core import array2ascii
+from .core import render_labels
+from .core import stack_labels
+from .pycompat import shared_memory
+
+
+__all__ = ['SharedLabels', 'render_layers', 'render_sharded']
+
+
+# Number of shards per process.  More shards balance uneven features better.
+_SHARDS_PER_PROCESS = 4
+
+# Set in each worker by `_init_worker()` when `SharedLabels()` is not available
+_RAW_LABELS = None
+
+
+class SharedLabels(object):
+
+    """
+    A label array backed by `multiprocessing.shared_memory`.  Pickling only
+    sends the name, shape, and dtype, and unpickling attaches to the same
+    memory, so an instance can be passed to a worker process which writes
+    into `array` without anything being copied.
+
+    The creating process owns the memory and must free it with `unlink()`,
+    or use the instance as a context manager.  Other processes should call
+    `close()` when they are finished.  Views of `array` must not be used
+    after either is called.
+
+        >>> with SharedLabels((100, 200)) as shared:
+        ...     gj2ascii.render_labels(features, 400, out=shared.array)
+
+
+    Parameters
+    ----------
+    shape : tuple
+        Array (rows, cols).
+
+    dtype : str or np.dtype, optional
+        Array dtype.
+
+    name : str or None, optional
+        Attach to existing shared memory rather than allocating a new
+        zero-filled block.
+
+
+    Raises
+    ------
+    RuntimeError
+        Shared memory is not available in this version of Python.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, name=None):
+        if shared_memory is None:  # pragma no cover
+            raise RuntimeError("Shared memory requires Python 3.8 or newer")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._owner = name is None
+        if self._owner:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        if self._owner:
+            self.array.fill(0)
+
+    def __repr__(self):
+        return "<%s name=%s shape=%s dtype=%s>" % (
+            self.__class__.__name__, self.name, self.shape, self.dtype)
+
+    def __reduce__(self):
+        return self.__class__, (self.shape, self.dtype.str, self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.unlink()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def close(self):
+
+        """
+        Detach from the shared memory.
+        """
+
+        if self.array is None:
+            return
+        self.array = None
+        try:
+            self._shm.close()
+        except BufferError:  # pragma no cover
+            # A caller still holds a view.  The memory is released when it is
+            # garbage collected.
+            pass
+
+    def unlink(self):
+
+        """
+        Detach from and free the shared memory if this instance allocated it.
+        """
+
+        self.close()
+        if self._owner:
+            self._owner = False
+            self._shm.unlink()
+
+
+def _burn_range(path, layer, crs, start, stop, bbox, transform, all_touched, labels):
+
+    """
+    Rasterize a range of features into a label array.  Only cells
+    intersecting a geometry are written.
+    """
+
+    transform = affine.Affine(*transform)
+    with fio.open(path, layer=layer, crs=crs) as src:
+        geometries = list(_geometry_extractor(src.filter(start, stop, bbox=bbox)))
+    if geometries:
+        burned = _rasterize(geometries, labels.shape, transform, all_touched=all_touched)
+        labels[burned != 0] = 1
+
+
+def _burn_shard(args):
+
+    """
+    Rasterize a range of features into a `SharedLabels()` array.
+    """
+
+    shared = args[-1]
+    try:
+        _burn_range(*(args[:-1] + (shared.array,)))
+    finally:
+        shared.close()
+
+
+def _init_worker(buffer, shape):
+    global _RAW_LABELS
+    _RAW_LABELS = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+
+
+def _burn_raw_shard(args):
+
+    """
+    Rasterize a range of features into the `RawArray()` shared with every
+    worker by `_init_worker()`.  Used on Python versions without
+    `multiprocessing.shared_memory`.
+    """
+
+    _burn_range(*(args + (_RAW_LABELS,)))
+
+
+def _shards(count, num_shards):
+
+    """
+    Split `count` features into at most `num_shards` contiguous ranges.
+    """
+
+    size = int(math.ceil(count / max(num_shards, 1))) or 1
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def _map(processes, func, tasks, **kwargs):
+
+    """
+    Run every task in a pool of worker processes that is closed afterwards.
+    """
+
+    pool = multiprocessing.Pool(processes, **kwargs)
+    try:
+        pool.map(func, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def render_sharded(path, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, char=DEFAULT_CHAR,
+                   all_touched=False, bbox=None, layer=None, crs=None, processes=None,
+                   shards=None, max_cells=None, aspect=1.0):
+
+    """
+    Render a layer by rasterizing ranges of features in parallel.  The output
+    is identical to `render()`.  Formats with fast random access like
+    Shapefile and GeoPackage scale best because formats like GeoJSON read
+    from the start of the layer to reach each range.
+
+
+    Parameters
+    ----------
+    path : str
+        Datasource to render.  Every worker opens it so it cannot be stdin.
+
+    width : int, optional
+        See `render()`.
+
+    fill : str, optional
+        See `render()`.
+
+    char : str, optional
+        See `render()`.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    bbox : tuple or None, optional
+        See `render()`.  Defaults to the layer's bounds.  Workers skip
+        features outside of the bbox.
+
+    layer : str or int or None, optional
+        Layer to render.
+
+    crs : str or dict or None, optional
+        See `fiona.open()`.
+
+    processes : int or None, optional
+        Number of worker processes.  Defaults to the number of CPUs.  With
+        `1` features are rasterized in the calling process.
+
+    shards : int or None, optional
+        Number of feature ranges to split the layer into.  Defaults to a few
+        per process so workers finishing early can pick up more work.
+
+    max_cells : int or None, optional
+        See `render()`.
+
+    aspect : float, optional
+        See `render()`.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str
+    """
+
+    fill = str(fill)
+    char = str(char)
+    if len(fill) != 1:
+        raise ValueError("Invalid fill value `%s' - must be 1 character long" % fill)
+    if len(char) != 1:
+        raise ValueError("Invalid pixel value `%s' - must be 1 character long" % char)
+    if width <= 0:
+        raise ValueError("Invalid width `%s' - must be > 0" % width)
+    if path == '-':
+        raise ValueError("Invalid path `%s' - cannot read stdin from multiple processes" % path)
+    processes = processes or multiprocessing.cpu_count()
+    if processes < 1:
+        raise ValueError("Invalid processes `%s' - must be >= 1" % processes)
+
+    with fio.open(path, layer=layer, crs=crs) as src:
+        count = len(src)
+        bbox = bbox or src.bounds
+
+    _, transform, shape = _grid(
+        None, int(math.ceil(width / 2)), bbox, max_cells=max_cells, aspect=aspect)
+    # Some versions of affine cannot be pickled so send the coefficients
+    transform = transform.a, transform.b, transform.c, transform.d, transform.e, transform.f
+    tasks = [(path, layer, crs, start, stop, bbox, transform, all_touched)
+             for start, stop in _shards(count, shards or processes * _SHARDS_PER_PROCESS)]
+    palette = np.array([fill, char])
+
+    if processes == 1:
+        labels = np.zeros(shape, dtype=np.uint8)
+        for task in tasks:
+            _burn_range(*(task + (labels,)))
+        return array2ascii(palette[labels])
+
+    # Shared memory can be passed with every task.  Older versions of Python
+    # can only share a `RawArray()` when the workers are created.
+    if shared_memory is not None:
+        with SharedLabels(shape) as shared:
+            _map(processes, _burn_shard, [t + (shared,) for t in tasks])
+            return array2ascii(palette[shared.array])
+    buffer = RawArray(ctypes.c_uint8, shape[0] * shape[1])
+    _map(processes, _burn_raw_shard, tasks, initializer=_init_worker, initargs=(buffer, shape))
+    return array2ascii(palette[np.frombuffer(buffer, dtype=np.uint8).reshape(shape)])
+
+
+def _render_layer(args):
+
+    """
+    Render a single layer into a `SharedLabels()` array.
+    """
+
+    path, layer, crs, all_touched, width, bbox, max_cells, aspect, shared = args
+    try:
+        with fio.open(path, layer=layer, crs=crs) as src:
+            render_labels(
+                src, width, all_touched=all_touched, bbox=bbox, out=shared.array,
+                max_cells=max_cells, aspect=aspect)
+    finally:
+        shared.close()
+
+
+def render_layers(layers, width=DEFAULT_WIDTH, fill=DEFAULT_FILL, bbox=None, processes=None,
+                  max_cells=None, aspect=1.0):
+
+    """
+    Render several layers in parallel and stack them with the painters
+    algorithm.  Equivalent to `render_multiple()` but every layer is read and
+    rasterized by a separate process into shared memory.
+
+
+    Parameters
+    ----------
+    layers : list
+        One dictionary per layer with a `path` and `char` key and optional
+        `layer`, `crs`, and `all_touched` keys.
+
+    width : int, optional
+        See `render()`.
+
+    fill : str, optional
+        See `render()`.
+
+    bbox : tuple or None, optional
+        See `render()`.  Defaults to the union of every layer's bounds.
+
+    processes : int or None, optional
+        Number of worker processes.  Defaults to the number of CPUs or
+        layers, whichever is smaller.  With `1` layers are rendered in the
+        calling process.
+
+    max_cells : int or None, optional
+        See `render()`.
+
+    aspect : float, optional
+        See `render()`.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str
+    """
+
+    if width <= 0:
+        raise ValueError("Invalid width `%s' - must be > 0" % width)
+    if any(l['path'] == '-' for l in layers):
+        raise ValueError("Invalid path `-' - cannot read stdin from multiple processes")
+    processes = processes or min(multiprocessing.cpu_count(), len(layers)) or 1
+    if processes < 1:
+        raise ValueError("Invalid processes `%s' - must be >= 1" % processes)
+
+    if bbox is None:
+        coords = []
+        for l in layers:
+            with fio.open(l['path'], layer=l.get('layer'), crs=l.get('crs')) as src:
+                coords += list(src.bounds)
+        bbox = (min(coords[0::4]), min(coords[1::4]), max(coords[2::4]), max(coords[3::4]))
+
+    _, _, shape = _grid(None, int(math.ceil(width / 2)), bbox, max_cells=max_cells, aspect=aspect)
+    outputs = []
+    try:
+        for _ in layers:
+            outputs.append(SharedLabels(shape))
+        tasks = [(l['path'], l.get('layer'), l.get('crs'), l.get('all_touched', False), width,
+                  bbox, max_cells, aspect, shared) for l, shared in zip(layers, outputs)]
+        if processes == 1:
+            for path, layer, crs, all_touched, _, _, _, _, shared in tasks:
+                with fio.open(path, layer=layer, crs=crs) as src:
+                    render_labels(
+                        src, width, all_touched=all_touched, bbox=bbox, out=shared.array,
+                        max_cells=max_cells, aspect=aspect)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                pool.map(_render_layer, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        return stack_labels([o.array for o in outputs], [l['char'] for l in layers], fill=fill)
+    finally:
+        for shared in outputs:
+            shared.unlink()
@@ -0,0 +1,247 @@
+"""
+A pool of open datasource handles
+
+Opening a datasource with `fiona` probes every GDAL driver and reads layer
+metadata, which adds up when the same datasource is opened once to compute a
+bbox, once per rendered layer, and once to list its layers, or when a process
+renders the same data over and over.
+
+    >>> import gj2ascii
+    >>> pool = gj2ascii.DatasourcePool(maxsize=8)
+    >>> with pool.open('sample-data/polygons.geojson') as src:
+    ...     bbox = src.bounds
+    >>> with pool.open('sample-data/polygons.geojson') as src:
+    ...     rendered = gj2ascii.render(src, bbox=bbox)
+    >>> pool.stats()['hits']
+    1
+"""
+
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import threading
+
+import fiona as fio
+from fiona.errors import DriverError
+
+
+__all__ = ['DatasourcePool']
+
+
+DEFAULT_POOL_SIZE = 16
+
+
+def _signature(path):
+
+    """
+    Get a value that changes when a file on disk changes so stale handles are
+    not reused.  Paths that are not files, like `/vsizip/` paths or URLs, are
+    assumed to never change.
+    """
+
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    if os.path.isdir(path):
+        return tuple(_signature(os.path.join(path, p)) for p in sorted(os.listdir(path)))
+    return stat.st_mtime, stat.st_size
+
+
+class DatasourcePool(object):
+
+    """
+    A bounded, thread-safe pool of open `fiona` collections keyed by
+    `(path, layer, crs, ignore_fields)` that evicts the least recently used handle when full.
+
+    A handle is lent to one caller at a time.  If a thread asks for a handle
+    that is already in use a temporary one is opened and closed when the
+    caller is finished with it, so a single collection is never iterated
+    concurrently.  Reading from stdin (`-`) is never pooled.
+
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of idle handles to keep open.
+    """
+
+    def __init__(self, maxsize=DEFAULT_POOL_SIZE):
+        if maxsize < 1:
+            raise ValueError("Invalid maxsize `%s' - must be >= 1" % maxsize)
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()
+        self._in_use = set()
+        self._layers = {}
+        self._stats = {'opens': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _evict(self):
+        # Only called while holding the lock
+        idle = [k for k in self._handles if k not in self._in_use]
+        while len(self._handles) > self.maxsize and idle:
+            _, src = self._handles.pop(idle.pop(0))
+            src.close()
+            self._stats['evictions'] += 1
+
+    def _open(self, path, layer, crs, ignore_fields):
+        with self._lock:
+            self._stats['opens'] += 1
+        if ignore_fields:
+            try:
+                return fio.open(path, layer=layer, crs=crs, ignore_fields=ignore_fields)
+            except DriverError:
+                # Not all drivers can skip fields, like GeoJSON
+                pass
+        return fio.open(path, layer=layer, crs=crs)
+
+    @contextmanager
+    def open(self, path, layer=None, crs=None, ignore_fields=None):
+
+        """
+        Borrow an open collection.  The collection is returned to the pool
+        rather than closed when the context manager exits.
+
+
+        Parameters
+        ----------
+        path : str
+            Datasource to open.
+
+        layer : str or int or None, optional
+            Layer to open.
+
+        crs : str or dict or None, optional
+            See `fiona.open()`.
+
+        ignore_fields : list or None, optional
+            Fields the driver should not read.  Drivers that cannot skip fields
+            read them anyway, so callers should not rely on them being absent.
+
+
+        Yields
+        ------
+        fiona.Collection
+        """
+
+        if path == '-':
+            with fio.open(path, layer=layer, crs=crs) as src:
+                yield src
+            return
+
+        ignore_fields = tuple(ignore_fields) if ignore_fields else None
+        key = (path, layer, crs if crs is None else str(crs), ignore_fields)
+        signature = _signature(path)
+
+        with self._lock:
+            src = None
+            if key in self._handles and key not in self._in_use:
+                cached_signature, cached = self._handles[key]
+                if cached_signature == signature and not cached.closed:
+                    src = cached
+                    self._handles.pop(key)
+                    self._handles[key] = signature, src
+                    self._stats['hits'] += 1
+                else:
+                    self._handles.pop(key)
+                    cached.close()
+            borrowed = src is None and key in self._in_use
+            if src is None:
+                self._stats['misses'] += 1
+            if not borrowed:
+                self._in_use.add(key)
+
+        if src is None:
+            try:
+                src = self._open(path, layer, crs, ignore_fields)
+            except Exception:
+                if not borrowed:
+                    with self._lock:
+                        self._in_use.discard(key)
+                raise
+
+        # Another caller already has this handle so this one is temporary
+        if borrowed:
+            try:
+                yield src
+            finally:
+                src.close()
+            return
+
+        try:
+            yield src
+        finally:
+            with self._lock:
+                self._in_use.discard(key)
+                self._handles[key] = signature, src
+                self._evict()
+
+    def listlayers(self, path):
+
+        """
+        Cached version of `fiona.listlayers()`.
+
+
+        Parameters
+        ----------
+        path : str
+            Datasource to inspect.
+
+
+        Returns
+        -------
+        list
+        """
+
+        signature = _signature(path)
+        with self._lock:
+            if path in self._layers and self._layers[path][0] == signature:
+                self._stats['hits'] += 1
+                return list(self._layers[path][1])
+            self._stats['misses'] += 1
+        layers = fio.listlayers(path)
+        with self._lock:
+            self._layers[path] = signature, layers
+        return list(layers)
+
+    def stats(self):
+
+        """
+        Get the number of datasources opened, cache hits, cache misses, and
+        evicted handles along with the current size and hit rate.
+
+
+        Returns
+        -------
+        dict
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._handles)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / float(lookups) if lookups else 0.0
+        return stats
+
+    def close(self):
+
+        """
+        Close every idle handle and clear the cache.
+        """
+
+        with self._lock:
+            for key in list(self._handles):
+                if key not in self._in_use:
+                    _, src = self._handles.pop(key)
+                    src.close()
+            self._layers.clear()
@@ -0,0 +1,151 @@
+"""
+Render pages ahead of time in a background thread
+
+Paging through features interactively only reads and renders the next
+feature after the user asks for it, so every page waits on the datasource.
+A `Prefetcher` consumes any iterator, like the one produced by `paginate()`,
+in a background thread and keeps a bounded number of items ready.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii.prefetch import Prefetcher
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     with Prefetcher(gj2ascii.paginate(src), size=4) as pages:
+    ...         for page in pages:
+    ...             print(page)
+    ...             if input() == 'q':
+    ...                 break
+
+The background thread is the only one that advances the wrapped iterator, so
+the iterator and anything it reads from, like an open `fiona` collection,
+must not be used elsewhere until the prefetcher is closed.
+"""
+
+
+import threading
+
+from .pycompat import queue
+
+
+__all__ = ['Prefetcher']
+
+
+DEFAULT_PREFETCH_SIZE = 2
+
+# Seconds the background thread waits on a full queue before checking if it
+# has been cancelled
+_POLL_INTERVAL = 0.05
+
+_ITEM = 'item'
+_DONE = 'done'
+_ERROR = 'error'
+
+
+class Prefetcher(object):
+
+    """
+    Iterate over an iterator in a background thread, staying up to `size`
+    items ahead of the consumer.  Exceptions raised by the wrapped iterator
+    are raised by `next()` in the consuming thread.
+
+    `close()` stops the background thread once it finishes the item it is
+    producing and closes the wrapped iterator if it is a generator.  Use the
+    instance as a context manager to close it when the consumer stops early.
+
+
+    Parameters
+    ----------
+    iterable : iterable
+        Items to produce.
+
+    size : int, optional
+        Maximum number of items produced ahead of the consumer.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+    """
+
+    def __init__(self, iterable, size=DEFAULT_PREFETCH_SIZE):
+        if size < 1:
+            raise ValueError("Invalid size `%s' - must be >= 1" % size)
+        self.size = size
+        self._queue = queue.Queue(maxsize=size)
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, args=(iter(iterable),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return "<%s size=%s ready=%s>" % (
+            self.__class__.__name__, self.size, self._queue.qsize())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        kind, value = self._queue.get()
+        if kind == _ITEM:
+            return value
+        self._finished = True
+        if kind == _ERROR:
+            raise value
+        raise StopIteration
+
+    next = __next__
+
+    def _put(self, entry):
+
+        """
+        Add an entry to the queue, waiting for space until cancelled.  Returns
+        `False` if the entry was not added.
+        """
+
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(entry, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterator):
+
+        """
+        Background thread target.  Everything produced is passed to the
+        consumer through the queue, including the end of iteration.
+        """
+
+        try:
+            for item in iterator:
+                if not self._put((_ITEM, item)):
+                    return
+            self._put((_DONE, None))
+        except Exception as e:
+            self._put((_ERROR, e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def close(self):
+
+        """
+        Cancel prefetching and wait for the background thread to exit.
+        Calling `next()` afterwards raises `StopIteration`.
+        """
+
+        self._cancelled.set()
+        self._thread.join()
+        self._finished = True
@@ -4,14 +4,30 @@ Python 2/3 compatibility
 
 
 import itertools
+import os
 import sys
+import zipfile
+
+try:  # pragma no cover
+    from multiprocessing import shared_memory
+except ImportError:  # pragma no cover
+    shared_memory = None
 
 
 if sys.version_info[0] >= 3:  # pragma no cover
+    import queue
+    import socketserver
     string_types = str,
     text_type = str
     zip_longest = itertools.zip_longest
+    replace = os.replace
+    BadZipFile = zipfile.BadZipFile
 else:  # pragma no cover
+    import Queue as queue
+    import SocketServer as socketserver
     string_types = basestring,
     text_type = unicode
     zip_longest = itertools.izip_longest
+    # Atomically replaces the destination on POSIX
+    replace = os.rename
+    BadZipFile = zipfile.BadZipfile
@@ -0,0 +1,455 @@
+"""
+Level-of-detail pyramids for interactive zooming
+
+Rendering the same layer at several widths starts from the raw geometries
+every time.  A pyramid rasterizes a layer once at several power-of-two cell
+sizes and renders by resampling the nearest level, so the cost of a render no
+longer depends on the number of features.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii.pyramid import Pyramid, sidecar
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     pyramid = Pyramid.build(src, source='sample-data/polygons.geojson')
+    >>> pyramid.save(sidecar('sample-data/polygons.geojson'))
+    >>> print(gj2ascii.render(pyramid, 40))
+
+Pyramids can be passed to `render()` and `render_multiple()` in place of
+features.  A rendering matches `render()` exactly when the requested
+grid lines up with a level, like when rendering the full extent at a width of
+`2 * level_width`.
+"""
+
+
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+from .core import _geometry_extractor
+from .core import _grid
+from .core import _rasterize
+from .core import min_bbox
+from .pool import _signature
+from .pycompat import replace
+
+
+__all__ = ['Pyramid', 'sidecar']
+
+
+DEFAULT_PYRAMID_WIDTH = 2048
+DEFAULT_PYRAMID_LEVELS = 6
+_BUILD_BATCH_SIZE = 10000
+_EDGE_TOLERANCE = 1e-6
+
+
+def _cache_dir():
+
+    """
+    Per-user directory for sidecar files that cannot be written next to
+    their datasource.
+    """
+
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'gj2ascii')
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def sidecar(path, layer=None, crs=None):
+
+    """
+    Get the path to a datasource's pyramid sidecar file.  Sidecar files are
+    written next to the datasource, or in a per-user cache directory if the
+    datasource's directory is not writable, which is created if necessary.
+
+
+    Parameters
+    ----------
+    path : str
+        Datasource.
+
+    layer : str or None, optional
+        Layer within the datasource.
+
+    crs : str or dict or None, optional
+        CRS the datasource is opened with.  Layers opened with different
+        CRS definitions get their own sidecar file.
+
+
+    Returns
+    -------
+    str
+    """
+
+    name = path if layer is None else '%s.%s' % (path, layer)
+    if crs is not None:
+        name += '.crs-%s' % _digest(crs)
+    name += '.pyramid.npz'
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if os.access(directory, os.W_OK):
+        return name
+
+    # Keep the datasource's name for readability but key on its full path so
+    # datasources with the same name in different directories do not collide
+    cache = _cache_dir()
+    if not os.path.isdir(cache):
+        os.makedirs(cache)
+    return os.path.join(
+        cache, '%s-%s' % (_digest(os.path.abspath(path)), os.path.basename(name)))
+
+
+def _source_signature(path):
+
+    """
+    Flatten a datasource's signature into a tuple of floats that survives a
+    round trip through a sidecar file.
+    """
+
+    def _flatten(value):
+        if isinstance(value, tuple):
+            return itertools.chain(*(_flatten(v) for v in value))
+        return [float(value)] if value is not None else [-1.0]
+
+    signature = _signature(path)
+    return None if signature is None else tuple(_flatten(signature))
+
+
+def _any_within(cumulative, starts, stops, axis):
+
+    """
+    Reduce an array of prefix sums to whether any cell between `starts` and
+    `stops` along an axis is non-zero.  Empty ranges are `0`.
+    """
+
+    return np.take(cumulative, stops, axis=axis) - np.take(cumulative, starts, axis=axis)
+
+
+def _nearest_level(widths, x_extent, cell_size):
+
+    """
+    Get the index of the coarsest level that is at least as fine as the
+    requested cell size, or the finest level if none are.  Levels are ordered
+    from finest to coarsest.
+    """
+
+    for idx in range(len(widths) - 1, -1, -1):
+        if x_extent / widths[idx] <= cell_size * (1 + 1e-9):
+            return idx
+    return 0
+
+
+def _resample(level, origin, cell_size, out_shape, transform, all_touched=False):
+
+    """
+    Resample a label array to a grid.  Without `all_touched` the cell
+    containing each output cell's center is used, otherwise a cell is set if
+    any cell it overlaps is set.  Cells outside of the label array are `0`.
+
+
+    Parameters
+    ----------
+    level : np.ndarray
+        Label array to resample.
+
+    origin : tuple
+        (x, y) of the upper left corner of `level`.
+
+    cell_size : float
+        Size of a cell in `level`.
+
+    out_shape : tuple
+        Output (rows, cols).
+
+    transform : affine.Affine
+        North-up transform for the output array.
+
+    all_touched : bool, optional
+        Use any-overlap semantics.
+
+
+    Returns
+    -------
+    np.ndarray
+    """
+
+    height, width = out_shape
+    x_min, y_max = origin
+
+    # Output cell edges in fractional level cells
+    col_edges = (transform.c + np.arange(width + 1) * transform.a - x_min) / cell_size
+    row_edges = (y_max - (transform.f + np.arange(height + 1) * transform.e)) / cell_size
+
+    if not all_touched:
+        cols = np.floor((col_edges[:-1] + col_edges[1:]) / 2).astype(np.intp)
+        rows = np.floor((row_edges[:-1] + row_edges[1:]) / 2).astype(np.intp)
+        valid_cols = (cols >= 0) & (cols < level.shape[1])
+        valid_rows = (rows >= 0) & (rows < level.shape[0])
+        output = level[np.ix_(
+            np.clip(rows, 0, level.shape[0] - 1), np.clip(cols, 0, level.shape[1] - 1))]
+        output[~valid_rows] = 0
+        output[:, ~valid_cols] = 0
+        return output
+
+    # A cell is touched if any level cell it overlaps is set, which is
+    # computed with prefix sums so the cost only depends on the output size.
+    # Edges that land on a level cell boundary are not always exact
+    def _ranges(edges, size):
+        starts = np.clip(np.floor(edges[:-1] + _EDGE_TOLERANCE), 0, size).astype(np.intp)
+        stops = np.clip(np.ceil(edges[1:] - _EDGE_TOLERANCE), 0, size).astype(np.intp)
+        return starts, np.maximum(starts, stops)
+
+    row_starts, row_stops = _ranges(row_edges, level.shape[0])
+    col_starts, col_stops = _ranges(col_edges, level.shape[1])
+    cumulative = np.zeros((level.shape[0] + 1, level.shape[1]), dtype=np.int64)
+    np.cumsum(level, axis=0, out=cumulative[1:])
+    by_row = _any_within(cumulative, row_starts, row_stops, axis=0) > 0
+    cumulative = np.zeros((height, level.shape[1] + 1), dtype=np.int64)
+    np.cumsum(by_row, axis=1, out=cumulative[:, 1:])
+    return (_any_within(cumulative, col_starts, col_stops, axis=1) > 0).astype(np.uint8)
+
+
+class Pyramid(object):
+
+    """
+    A layer rasterized at several power-of-two cell sizes.  Levels are
+    ordered from finest to coarsest and all cover `bounds`.
+
+
+    Parameters
+    ----------
+    levels : list
+        One `uint8` label array per level, finest first, where each level
+        has half the width of the previous.
+
+    bounds : tuple
+        x_min, y_min, x_max, y_max covered by every level.
+
+    all_touched : bool, optional
+        Whether the levels were rasterized with `all_touched`.
+
+    signature : tuple or None, optional
+        Modification time and size of the source datasource.
+    """
+
+    def __init__(self, levels, bounds, all_touched=False, signature=None):
+        if not levels:
+            raise ValueError("Invalid levels `%s' - must have at least 1 level" % levels)
+        self.levels = [np.asarray(l, dtype=np.uint8) for l in levels]
+        self.bounds = tuple(float(b) for b in bounds)
+        self.all_touched = bool(all_touched)
+        self.signature = signature
+
+    def __repr__(self):
+        return "<%s levels=%s bounds=%s>" % (
+            self.__class__.__name__, [l.shape[1] for l in self.levels], self.bounds)
+
+    @classmethod
+    def build(cls, ftrz, bbox=None, width=DEFAULT_PYRAMID_WIDTH, levels=DEFAULT_PYRAMID_LEVELS,
+              all_touched=False, source=None):
+
+        """
+        Rasterize features into every level of a pyramid with a single pass
+        over the input.
+
+
+        Parameters
+        ----------
+        ftrz : dict or iterator
+            Anything accepted by `render()`.
+
+        bbox : tuple or None, optional
+            Area covered by the pyramid.  Computed from the input if not
+            given.
+
+        width : int, optional
+            Number of pixel columns in the finest level.
+
+        levels : int, optional
+            Number of levels.  Each level halves the width of the previous.
+
+        all_touched : bool, optional
+            See `render()`.
+
+        source : str or None, optional
+            Path to the datasource the features came from.  Used to detect a
+            stale sidecar file with `is_stale()`.
+
+
+        Raises
+        ------
+        ValueError
+            A parameter has an invalid value.
+
+
+        Returns
+        -------
+        Pyramid
+        """
+
+        if width <= 0:
+            raise ValueError("Invalid width `%s' - must be > 0" % width)
+        if levels < 1 or width >> (levels - 1) < 1:
+            raise ValueError(
+                "Invalid levels `%s' - must be >= 1 and leave at least 1 column in the "
+                "coarsest level" % levels)
+
+        if bbox is None:
+            bbox, ftrz = min_bbox(ftrz, return_iter=True)
+
+        grids = [_grid(None, width >> i, bbox)[1:] for i in range(levels)]
+        arrays = [np.zeros(shape, dtype=np.uint8) for _, shape in grids]
+
+        # Rasterize batches into every level so the input is only read once
+        geometries = _geometry_extractor(ftrz)
+        while True:
+            batch = list(itertools.islice(geometries, _BUILD_BATCH_SIZE))
+            if not batch:
+                break
+            for array, (transform, shape) in zip(arrays, grids):
+                np.maximum(
+                    array,
+                    _rasterize(batch, shape, transform, all_touched=all_touched),
+                    out=array)
+
+        signature = None if source is None else _source_signature(source)
+        return cls(arrays, bbox, all_touched=all_touched, signature=signature)
+
+    @classmethod
+    def load(cls, path):
+
+        """
+        Load a pyramid written by `save()`.
+
+
+        Parameters
+        ----------
+        path : str
+            Sidecar file.
+
+
+        Returns
+        -------
+        Pyramid
+        """
+
+        with np.load(path) as data:
+            levels = [data['level_%d' % i] for i in range(int(data['num_levels']))]
+            signature = tuple(data['signature'].tolist()) or None
+            return cls(levels, data['bounds'], all_touched=bool(data['all_touched']),
+                       signature=signature)
+
+    def save(self, path):
+
+        """
+        Write the pyramid to a compressed sidecar file.  The file is written
+        next to `path` and moved into place so an interrupted build never
+        leaves a truncated sidecar behind.
+
+
+        Parameters
+        ----------
+        path : str
+            Output file.  See `sidecar()`.
+        """
+
+        arrays = {'level_%d' % i: l for i, l in enumerate(self.levels)}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                num_levels=len(self.levels),
+                bounds=np.array(self.bounds),
+                all_touched=self.all_touched,
+                signature=np.array(self.signature or (), dtype=np.float64),
+                **arrays)
+        replace(tmp_path, path)
+
+    def is_stale(self, path):
+
+        """
+        Determine if the source datasource has changed since the pyramid was
+        built.
+
+
+        Parameters
+        ----------
+        path : str
+            Source datasource.
+
+
+        Returns
+        -------
+        bool
+        """
+
+        signature = _source_signature(path)
+        return signature is None or self.signature != signature
+
+    def level(self, cell_size):
+
+        """
+        Get the index of the coarsest level that is at least as fine as the
+        requested cell size, or the finest level if none are.
+
+
+        Parameters
+        ----------
+        cell_size : float
+            Requested cell size in georeferenced units.
+
+
+        Returns
+        -------
+        int
+        """
+
+        x_min, _, x_max, _ = self.bounds
+        return _nearest_level([l.shape[1] for l in self.levels], x_max - x_min, cell_size)
+
+    def labels(self, out_shape, transform, all_touched=False):
+
+        """
+        Resample the nearest level to a grid.  This is the protocol `render()`
+        uses for pre-rasterized inputs.
+
+
+        Parameters
+        ----------
+        out_shape : tuple
+            Output (rows, cols).
+
+        transform : affine.Affine
+            North-up transform for the output array.
+
+        all_touched : bool, optional
+            Must match the value the pyramid was built with.
+
+
+        Raises
+        ------
+        ValueError
+            The pyramid was built with a different `all_touched` value.
+
+
+        Returns
+        -------
+        np.ndarray
+            `uint8` array containing `1` where a cell intersects a geometry.
+        """
+
+        if bool(all_touched) != self.all_touched:
+            raise ValueError(
+                "Invalid all_touched `%s' - pyramid was built with all_touched=%s"
+                % (all_touched, self.all_touched))
+
+        x_min, _, x_max, y_max = self.bounds
+        level = self.levels[self.level(transform.a)]
+        return _resample(
+            level, (x_min, y_max), (x_max - x_min) / level.shape[1], out_shape, transform,
+            all_touched=self.all_touched)
@@ -0,0 +1,219 @@
+"""
+Reproject features while they are streamed
+
+Layers in different coordinate reference systems can only be stacked after
+they are reprojected to a common CRS.  Features are reprojected in batches so
+every coordinate in a batch is transformed with a single call, and the
+transformer for each pair of CRSs is created once and reused.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii.reproject import reproject, transform_bounds
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     bbox = transform_bounds(src.crs, 'EPSG:4326', src.bounds)
+    ...     print(gj2ascii.render(reproject(src, src.crs, 'EPSG:4326'), bbox=bbox))
+
+`pyproj` is used when it is installed, otherwise coordinates are transformed
+with `rasterio.warp.transform()`.
+"""
+
+
+import itertools
+import threading
+
+import numpy as np
+from rasterio.crs import CRS
+import rasterio.warp
+
+try:  # pragma no cover
+    import pyproj
+except ImportError:  # pragma no cover
+    pyproj = None
+
+
+__all__ = ['reproject', 'transform_bounds']
+
+
+DEFAULT_BATCH_SIZE = 1024
+
+_TRANSFORMERS = {}
+_TRANSFORMERS_LOCK = threading.Lock()
+
+
+def _crs(crs):
+
+    """
+    Normalize anything `fiona.open()` accepts as a CRS.
+    """
+
+    return crs if isinstance(crs, CRS) else CRS.from_user_input(crs)
+
+
+def _transformer(src_crs, dst_crs):
+
+    """
+    Get a cached function that transforms arrays of x and y coordinates from
+    one CRS to another.
+    """
+
+    src_crs = _crs(src_crs)
+    dst_crs = _crs(dst_crs)
+    key = src_crs.to_wkt(), dst_crs.to_wkt()
+    with _TRANSFORMERS_LOCK:
+        if key not in _TRANSFORMERS:
+            if pyproj is not None:  # pragma no cover
+                transformer = pyproj.Transformer.from_crs(
+                    pyproj.CRS.from_wkt(key[0]), pyproj.CRS.from_wkt(key[1]), always_xy=True)
+
+                def _transform(xs, ys):
+                    return transformer.transform(xs, ys)
+            else:
+                def _transform(xs, ys):
+                    return rasterio.warp.transform(src_crs, dst_crs, xs, ys)
+
+            _TRANSFORMERS[key] = _transform
+        return _TRANSFORMERS[key]
+
+
+def _parts(geom, parts):
+
+    """
+    Append every coordinate sequence in a GeoJSON geometry to `parts` as an
+    `(N, 2)` array and return a function that rebuilds the geometry from an
+    iterator producing the transformed sequences in the same order.
+    """
+
+    gtype = geom['type']
+    if gtype == 'GeometryCollection':
+        builders = [_parts(g, parts) for g in geom['geometries']]
+        return lambda seqs: {
+            'type': gtype, 'geometries': [b(seqs) for b in builders]}
+
+    coords = geom['coordinates']
+    if gtype == 'Point':
+        parts.append(np.asarray([coords[:2]], dtype=np.float64))
+        return lambda seqs: {'type': gtype, 'coordinates': tuple(next(seqs)[0])}
+    elif gtype in ('LineString', 'MultiPoint'):
+        depth = 0
+    elif gtype in ('Polygon', 'MultiLineString'):
+        depth = 1
+    elif gtype == 'MultiPolygon':
+        depth = 2
+    else:
+        raise ValueError("Invalid geometry type `%s'" % gtype)
+
+    def _flatten(c, d):
+        if d == 0:
+            arr = np.asarray(c, dtype=np.float64)
+            parts.append(arr.reshape(-1, arr.shape[-1] if arr.size else 2)[:, :2])
+            return None
+        return [_flatten(_c, d - 1) for _c in c]
+
+    def _rebuild(template, seqs, d):
+        if d == 0:
+            return [tuple(xy) for xy in next(seqs)]
+        return [_rebuild(t, seqs, d - 1) for t in template]
+
+    template = _flatten(coords, depth)
+    return lambda seqs: {'type': gtype, 'coordinates': _rebuild(template, seqs, depth)}
+
+
+def _reproject_batch(batch, transform):
+
+    """
+    Reproject the geometries of a batch of features or geometries with a
+    single call to the transformer.
+    """
+
+    parts = []
+    builders = []
+    for obj in batch:
+        geom = obj['geometry'] if obj.get('type') == 'Feature' else obj
+        builders.append(None if geom is None else _parts(geom, parts))
+    if not parts:
+        return batch
+
+    coords = np.concatenate(parts)
+    xs, ys = transform(coords[:, 0].tolist(), coords[:, 1].tolist())
+    coords = np.column_stack([xs, ys])
+    seqs = iter(np.split(coords, np.cumsum([len(p) for p in parts])[:-1]))
+
+    output = []
+    for obj, builder in zip(batch, builders):
+        if builder is None:
+            output.append(obj)
+        elif obj.get('type') == 'Feature':
+            obj = dict(obj)
+            obj['geometry'] = builder(seqs)
+            output.append(obj)
+        else:
+            output.append(builder(seqs))
+    return output
+
+
+def reproject(ftrz, src_crs, dst_crs, batch_size=DEFAULT_BATCH_SIZE):
+
+    """
+    Reproject a stream of GeoJSON features or geometries.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        A single feature or geometry or an iterable producing one per
+        iteration.  Objects supporting `__geo_interface__` are converted to
+        GeoJSON.
+
+    src_crs : str or dict or rasterio.crs.CRS
+        CRS of the input objects, like `fiona.Collection.crs`.
+
+    dst_crs : str or dict or rasterio.crs.CRS
+        Target CRS.
+
+    batch_size : int, optional
+        Number of objects to transform with each call to the transformer.
+
+
+    Yields
+    ------
+    dict
+        Features are copied with a new geometry.
+    """
+
+    transform = _transformer(src_crs, dst_crs)
+    if isinstance(ftrz, dict) or hasattr(ftrz, '__geo_interface__'):
+        ftrz = [ftrz]
+    ftrz = (getattr(o, '__geo_interface__', o) for o in ftrz)
+    while True:
+        batch = list(itertools.islice(ftrz, batch_size))
+        if not batch:
+            break
+        for obj in _reproject_batch(batch, transform):
+            yield obj
+
+
+def transform_bounds(src_crs, dst_crs, bounds):
+
+    """
+    Transform a bbox to another CRS.  The edges are densified so the result
+    contains the entire source area.
+
+
+    Parameters
+    ----------
+    src_crs : str or dict or rasterio.crs.CRS
+        CRS of the bbox.
+
+    dst_crs : str or dict or rasterio.crs.CRS
+        Target CRS.
+
+    bounds : tuple
+        x_min, y_min, x_max, y_max.
+
+
+    Returns
+    -------
+    tuple
+    """
+
+    return rasterio.warp.transform_bounds(_crs(src_crs), _crs(dst_crs), *bounds)
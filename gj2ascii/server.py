@@ -0,0 +1,325 @@
+"""
+Long-running render server for the commandline interface
+
+Starting the interpreter, importing GDAL/GEOS, and opening datasources is the
+bulk of the time spent by a single `gj2ascii` call.  A server keeps a warm
+process around and executes forwarded commandline arguments, caching the
+rendered output until one of the referenced files changes.
+
+Requests and responses are newline delimited JSON objects:
+
+    {"args": ["sample-data/polygons.geojson", "--width", "40"], "cwd": "/data"}
+    {"exit_code": 0, "output": "..."}
+
+Start a server listening on a Unix socket and forward a command to it:
+
+    $ gj2ascii --serve /tmp/gj2ascii.sock &
+    $ gj2ascii --server /tmp/gj2ascii.sock sample-data/polygons.geojson -w 40
+
+The server can also read requests from stdin and write responses to stdout
+with `--serve -`.
+"""
+
+
+from collections import OrderedDict
+import json
+import os
+import socket
+import sys
+
+from .pycompat import socketserver
+
+import click
+from click.testing import CliRunner
+
+
+__all__ = ['serve', 'request']
+
+
+DEFAULT_CACHE_SIZE = 128
+
+
+class RenderCache(object):
+
+    """
+    A bounded LRU cache of rendered command output.  Entries are keyed by the
+    working directory and the commandline arguments, and are invalidated when
+    the modification time or size of a referenced file changes.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _signature(args):
+
+        """
+        Get the modification time and size of every datasource referenced in
+        the arguments.  Arguments like `INFILE,LAYER` reference `INFILE`.
+        """
+
+        signature = []
+        for arg in args:
+            path = arg.split(',')[0]
+            if os.path.exists(path):
+                # Directories are multilayer datasources so their contents matter
+                if os.path.isdir(path):
+                    paths = [os.path.join(path, p) for p in sorted(os.listdir(path))]
+                else:
+                    paths = [path]
+                for p in paths:
+                    stat = os.stat(p)
+                    signature.append((p, stat.st_mtime, stat.st_size))
+        return tuple(signature)
+
+    def get(self, key, args):
+        if key not in self._entries:
+            return None
+        signature, response = self._entries.pop(key)
+        if signature != self._signature(args):
+            return None
+        self._entries[key] = signature, response
+        return response
+
+    def set(self, key, args, response):
+        self._entries.pop(key, None)
+        self._entries[key] = self._signature(args), response
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def _cacheable(args):
+
+    """
+    Commands reading from stdin or writing to a file have side effects or
+    inputs that cannot be tracked so their output is not cached.
+    """
+
+    for arg in args:
+        if arg == '-' or arg.startswith(('-o', '--outfile')):
+            return False
+    return True
+
+
+def _walk(command, args):
+
+    """
+    Pair every commandline argument with the option it is a value for, or
+    `None` for positional arguments and flags.  Options are matched against
+    `command.params` without parsing the values, so arguments like `-o -`
+    and `--bbox -1 -1 1 1` are not mistaken for positional arguments.
+
+
+    Parameters
+    ----------
+    command : click.Command
+        Command the arguments are for.
+
+    args : list
+        Commandline arguments.
+
+
+    Yields
+    ------
+    tuple
+        `(index, option, prefix)` where `option` is `None` for positional
+        arguments and `prefix` is the `--option=` part of arguments that
+        contain their value.  Options are not yielded.
+    """
+
+    nargs = {}
+    for param in command.params:
+        if isinstance(param, click.Option):
+            for opt in param.opts + param.secondary_opts:
+                nargs[opt] = (param, 0 if param.is_flag or param.count else param.nargs)
+
+    idx = 0
+    positional_only = False
+    while idx < len(args):
+        arg = args[idx]
+        if positional_only or arg == '-' or not arg.startswith('-'):
+            yield idx, None, ''
+        elif arg == '--':
+            positional_only = True
+        elif arg.startswith('--') and '=' in arg and arg.split('=', 1)[0] in nargs:
+            prefix = arg.split('=', 1)[0] + '='
+            yield idx, nargs[prefix[:-1]][0], prefix
+        elif arg in nargs:
+            param, count = nargs[arg]
+            for value_idx in range(idx + 1, min(idx + 1 + count, len(args))):
+                yield value_idx, param, ''
+            idx += count
+        idx += 1
+
+
+def _resolve(command, args, cwd):
+
+    """
+    Resolve relative paths in the arguments against the client's working
+    directory.  Positional arguments are only resolved if they exist so
+    inputs like `-` and virtual filesystem paths are left alone, and file
+    and path options are resolved unless they are `-`.
+    """
+
+    args = list(args)
+    for idx, param, prefix in _walk(command, args):
+        value = args[idx][len(prefix):]
+        if value == '-' or os.path.isabs(value):
+            continue
+        path = os.path.join(cwd, value)
+        if param is None:
+            if os.path.exists(path.split(',')[0]):
+                args[idx] = path
+        elif isinstance(param.type, (click.File, click.Path)):
+            args[idx] = prefix + path
+    return args
+
+
+def _handle(command, payload, cache):
+
+    """
+    Execute a single request and return the response.
+
+
+    Parameters
+    ----------
+    command : click.Command
+        Command to invoke with the forwarded arguments.
+
+    payload : dict
+        Decoded request.
+
+    cache : RenderCache or None
+        Cache rendered output.
+
+
+    Returns
+    -------
+    dict
+    """
+
+    args = [str(a) for a in payload.get('args', [])]
+    cwd = payload.get('cwd')
+    key = (cwd, tuple(args))
+    if cwd is not None:
+        args = _resolve(command, args, cwd)
+
+    cacheable = cache is not None and _cacheable(args)
+    if cacheable:
+        response = cache.get(key, args)
+        if response is not None:
+            return response
+
+    # Colors are preserved so the client can decide whether or not they
+    # should be stripped based on where it is writing.
+    result = CliRunner().invoke(command, args, input=payload.get('input'), color=True)
+    output = result.output
+    if result.exception is not None and not isinstance(result.exception, SystemExit):
+        output += "Error: %s\n" % result.exception
+    response = {'exit_code': result.exit_code, 'output': output}
+    if cacheable and result.exit_code == 0:
+        cache.set(key, args, response)
+
+    return response
+
+
+def _handle_line(command, line, cache):
+    try:
+        payload = json.loads(line)
+    except ValueError as e:
+        response = {'exit_code': 2, 'output': "Error: invalid request: %s\n" % e}
+    else:
+        response = _handle(command, payload, cache)
+    return json.dumps(response) + '\n'
+
+
+def serve(command, address, cache_size=DEFAULT_CACHE_SIZE):
+
+    """
+    Execute forwarded commands until interrupted.
+
+
+    Parameters
+    ----------
+    command : click.Command
+        Command to invoke for every request.
+
+    address : str
+        Path to a Unix socket to listen on or `-` to read requests from stdin
+        and write responses to stdout.
+
+    cache_size : int, optional
+        Maximum number of rendered outputs to keep in memory.  Use `0` to
+        disable caching.
+    """
+
+    cache = RenderCache(cache_size) if cache_size else None
+
+    if address == '-':
+        stdout = sys.stdout
+        for line in iter(sys.stdin.readline, ''):
+            if line.strip():
+                stdout.write(_handle_line(command, line, cache))
+                stdout.flush()
+        return
+
+    if not hasattr(socket, 'AF_UNIX'):  # pragma no cover
+        raise OSError("Unix sockets are not supported on this platform")
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in iter(self.rfile.readline, b''):
+                if line.strip():
+                    self.wfile.write(
+                        _handle_line(command, line.decode('utf-8'), cache).encode('utf-8'))
+
+    if os.path.exists(address):
+        os.remove(address)
+    server = socketserver.UnixStreamServer(address, Handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(address)
+
+
+def request(address, args, input=None):
+
+    """
+    Forward commandline arguments to a running server.
+
+
+    Parameters
+    ----------
+    address : str
+        Path to the server's Unix socket.
+
+    args : list
+        Commandline arguments for the server to execute.
+
+    input : str or None, optional
+        Text to pass to the command's stdin.
+
+
+    Returns
+    -------
+    dict
+        A response containing `exit_code` and `output` keys.
+    """
+
+    payload = {'args': list(args), 'cwd': os.getcwd(), 'input': input}
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+        f = sock.makefile('rb')
+        line = f.readline()
+        f.close()
+    finally:
+        sock.close()
+
+    if not line:
+        raise IOError("Server at `%s' closed the connection without responding" % address)
+
+    return json.loads(line.decode('utf-8'))
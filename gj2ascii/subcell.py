@@ -0,0 +1,210 @@
+"""
+Render at a higher resolution with Unicode braille or block characters
+
+`render()` draws each cell as a character and a space, so detail is limited
+by the terminal width.  Braille characters encode a 2 column by 4 row grid of
+dots and quadrant block characters encode a 2 by 2 grid of squares, so
+rasterizing at that many sub-cells per character and packing each group of
+sub-cells into a single character draws 8 or 4 cells per character instead
+of half of one.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> with fiona.open('sample-data/WV.geojson') as src:
+    ...     print(gj2ascii.render_subcell(src, 40))
+
+Output has one character per text column with no space between cells.
+Sub-cells are packed with `np.packbits()`, so encoding is vectorized over the
+entire label array.
+"""
+
+
+import numpy as np
+
+from .core import DEFAULT_BBOX_MARGIN
+from .core import DEFAULT_FILL
+from .core import DEFAULT_WIDTH
+from .core import _geometry_extractor
+from .core import _grid
+from .core import _join_rows
+from .core import _rasterize
+from .pycompat import text_type
+
+
+__all__ = ['GLYPHS', 'pack_labels', 'render_subcell']
+
+
+_BRAILLE_OFFSET = 0x2800
+
+# Bit of each (row, col) sub-cell in a character, in row-major order.  Braille
+# numbers the dots down the left column, then down the right column, and the
+# bottom row was added later as bits 7 and 8.
+_BRAILLE_BITS = [0, 3, 1, 4, 2, 5, 6, 7]
+_QUADRANT_BITS = [0, 1, 2, 3]
+
+# Indexed by the packed bits: upper left, upper right, lower left, lower right
+_QUADRANT_CHARS = (
+    u' ', u'\u2598', u'\u259d', u'\u2580', u'\u2596', u'\u258c', u'\u259e', u'\u259b',
+    u'\u2597', u'\u259a', u'\u2590', u'\u259c', u'\u2584', u'\u2599', u'\u259f', u'\u2588')
+
+# Sub-cell rows and columns per character and the order of their bits
+_GLYPHS = {
+    'braille': (4, 2, _BRAILLE_BITS),
+    'quadrant': (2, 2, _QUADRANT_BITS)
+}
+GLYPHS = tuple(sorted(_GLYPHS))
+
+
+def _charset(glyphs, fill):
+
+    """
+    Array mapping every packed value to its character.  The empty value is
+    drawn as `fill`.
+    """
+
+    if glyphs == 'braille':
+        chars = [u'%c' % (_BRAILLE_OFFSET + i) for i in range(256)]
+    else:
+        chars = list(_QUADRANT_CHARS)
+    chars[0] = text_type(fill)
+    return np.array(chars, dtype='<U1')
+
+
+def _validate(glyphs, fill):
+    if glyphs not in _GLYPHS:
+        raise ValueError(
+            "Invalid glyphs `%s' - must be one of: %s" % (glyphs, ', '.join(GLYPHS)))
+    if len(text_type(fill)) != 1:
+        raise ValueError("Invalid fill value `%s' - must be 1 character long" % fill)
+
+
+def pack_labels(labels, glyphs='braille', fill=DEFAULT_FILL):
+
+    """
+    Pack a label array into one character per group of sub-cells.  Labels
+    that do not fill a whole character are padded with empty sub-cells on the
+    right and bottom.
+
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        2D array where non-zero cells intersect a geometry, like the output
+        from `render_labels()`.
+
+    glyphs : str, optional
+        One of `GLYPHS`.  `braille` packs 2 columns by 4 rows of sub-cells
+        into each character and `quadrant` packs 2 by 2.
+
+    fill : str, optional
+        Single character for characters without any sub-cells set.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str
+    """
+
+    _validate(glyphs, fill)
+    labels = np.asarray(labels)
+    if labels.ndim != 2:
+        raise ValueError("Invalid labels shape `%s' - must be 2D" % (labels.shape,))
+    if 0 in labels.shape:
+        return u''
+
+    rows, cols, bits = _GLYPHS[glyphs]
+    height = -(-labels.shape[0] // rows)
+    width = -(-labels.shape[1] // cols)
+    cells = np.zeros((height * rows, width * cols), dtype=np.uint8)
+    cells[:labels.shape[0], :labels.shape[1]] = labels != 0
+
+    # (height, rows, width, cols) -> (height, width, rows * cols) and then
+    # from the highest bit to the lowest so each group of sub-cells packs
+    # into one byte.  Groups of fewer than 8 are packed into the high bits.
+    cells = cells.reshape(height, rows, width, cols).transpose(0, 2, 1, 3)
+    cells = cells.reshape(height, width, rows * cols)[:, :, np.argsort(bits)[::-1]]
+    packed = np.packbits(cells, axis=-1)[:, :, 0] >> (8 - len(bits))
+
+    return _join_rows(_charset(glyphs, fill)[packed])
+
+
+def render_subcell(ftrz, width=DEFAULT_WIDTH, glyphs='braille', fill=DEFAULT_FILL,
+                   all_touched=False, bbox=None, bbox_sample=None,
+                   bbox_margin=DEFAULT_BBOX_MARGIN, max_cells=None, aspect=1.0):
+
+    """
+    Render input objects with several sub-cells per character.  Output is
+    the same size as `render()` at the same width.  With the default
+    `aspect` braille sub-cells are square on screen like the cells drawn by
+    `render()` and quadrant sub-cells are twice as tall as they are wide.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()`.
+
+    width : int, optional
+        Render across N text columns.  Height is auto-computed.
+
+    glyphs : str, optional
+        See `pack_labels()`.
+
+    fill : str, optional
+        See `pack_labels()`.
+
+    all_touched : bool, optional
+        See `render()`.
+
+    bbox : tuple, optional
+        See `render()`.
+
+    bbox_sample : int or None, optional
+        See `render()`.
+
+    bbox_margin : float, optional
+        See `render()`.
+
+    max_cells : int or None, optional
+        See `render()`.  Counts sub-cells rather than characters.
+
+    aspect : float, optional
+        See `render()`.  Assumes characters are twice as tall as they are
+        wide like `render()`, and sub-cells are stretched accordingly.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    str
+    """
+
+    _validate(glyphs, fill)
+    if width <= 0:
+        raise ValueError("Invalid width `%s' - must be > 0" % width)
+    rows, cols, _ = _GLYPHS[glyphs]
+
+    # A character is 2 units tall and 1 wide when `aspect` is 1
+    ftrz, transform, shape = _grid(
+        ftrz, int(width) * cols, bbox, sample=bbox_sample, margin=bbox_margin,
+        max_cells=max_cells, aspect=aspect * 2 * cols / rows)
+
+    if hasattr(ftrz, 'labels'):
+        labels = ftrz.labels(shape, transform, all_touched=all_touched)
+    else:
+        labels = _rasterize(
+            _geometry_extractor(ftrz), out_shape=shape, transform=transform,
+            all_touched=all_touched)
+
+    return pack_labels(labels, glyphs=glyphs, fill=fill)
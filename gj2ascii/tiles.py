@@ -0,0 +1,324 @@
+"""
+On-disk tile stores of pre-rasterized layers
+
+Base layers like roads or administrative boundaries rarely change but are
+read and rasterized on every render.  A tile store rasterizes a layer once at
+several power-of-two cell sizes and writes each level as a directory of
+compressed tiles with a JSON index.  Rendering only reads the tiles that
+intersect the requested area from the level closest to the requested cell
+size and never touches the vector data.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> from gj2ascii.tiles import TileStore
+    >>> with fiona.open('sample-data/polygons.geojson') as src:
+    ...     store = TileStore.build(src, 'polygons.tiles')
+    >>> print(gj2ascii.render(TileStore('polygons.tiles'), 40))
+
+Layout:
+
+    polygons.tiles/
+        index.json
+        0/0_0.npz
+        0/0_1.npz
+        ...
+
+Levels are numbered from finest to coarsest and tiles are named by their row
+and column.  Tiles without any geometry are not written.
+"""
+
+
+from collections import OrderedDict
+import json
+import os
+
+import numpy as np
+
+from .pyramid import DEFAULT_PYRAMID_LEVELS
+from .pyramid import DEFAULT_PYRAMID_WIDTH
+from .pyramid import Pyramid
+from .pyramid import _nearest_level
+from .pyramid import _resample
+
+
+__all__ = ['TileStore', 'is_store']
+
+
+DEFAULT_TILE_SIZE = 256
+_FORMAT = 'gj2ascii-tiles'
+_INDEX = 'index.json'
+_TILE_CACHE_SIZE = 256
+
+
+def is_store(path):
+
+    """
+    Determine if a path is a tile store.
+
+
+    Parameters
+    ----------
+    path : str
+        Path to check.
+
+
+    Returns
+    -------
+    bool
+    """
+
+    index = os.path.join(path, _INDEX)
+    if not os.path.isfile(index):
+        return False
+    try:
+        with open(index) as f:
+            return json.load(f).get('format') == _FORMAT
+    except ValueError:
+        return False
+
+
+class TileStore(object):
+
+    """
+    A read-only tile store written by `TileStore.build()`.  Tiles are read on
+    demand and the most recently used tiles are kept in memory.
+
+
+    Parameters
+    ----------
+    path : str
+        Tile store directory.
+
+
+    Raises
+    ------
+    ValueError
+        The path is not a tile store.
+    """
+
+    def __init__(self, path):
+        if not is_store(path):
+            raise ValueError("Invalid tile store `%s' - missing or invalid %s" % (path, _INDEX))
+        with open(os.path.join(path, _INDEX)) as f:
+            index = json.load(f)
+        self.path = path
+        self.bounds = tuple(index['bounds'])
+        self.all_touched = index['all_touched']
+        self.tile_size = index['tile_size']
+        self.shapes = [tuple(s) for s in index['shapes']]
+        self._tiles = [set(tuple(t) for t in tiles) for tiles in index['tiles']]
+        self._cache = OrderedDict()
+
+    def __repr__(self):
+        return "<%s path=%s levels=%s>" % (
+            self.__class__.__name__, self.path, [s[1] for s in self.shapes])
+
+    @classmethod
+    def build(cls, ftrz, path, bbox=None, width=DEFAULT_PYRAMID_WIDTH,
+              levels=DEFAULT_PYRAMID_LEVELS, tile_size=DEFAULT_TILE_SIZE, all_touched=False):
+
+        """
+        Rasterize features and write them to a tile store.  Every level is
+        rasterized in memory with a single pass over the input before it is
+        written.
+
+
+        Parameters
+        ----------
+        ftrz : dict or iterator
+            Anything accepted by `render()`.
+
+        path : str
+            Output directory.  Created if it does not exist and existing
+            tiles are replaced.
+
+        bbox : tuple or None, optional
+            See `gj2ascii.pyramid.Pyramid.build()`.
+
+        width : int, optional
+            See `gj2ascii.pyramid.Pyramid.build()`.
+
+        levels : int, optional
+            See `gj2ascii.pyramid.Pyramid.build()`.
+
+        tile_size : int, optional
+            Number of rows and columns in each tile.
+
+        all_touched : bool, optional
+            See `render()`.
+
+
+        Raises
+        ------
+        ValueError
+            A parameter has an invalid value.
+
+
+        Returns
+        -------
+        TileStore
+        """
+
+        if tile_size <= 0:
+            raise ValueError("Invalid tile_size `%s' - must be > 0" % tile_size)
+
+        pyramid = Pyramid.build(
+            ftrz, bbox=bbox, width=width, levels=levels, all_touched=all_touched)
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # Remove the index first so a partially written store is never read
+        index_path = os.path.join(path, _INDEX)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        tiles = []
+        for idx, level in enumerate(pyramid.levels):
+            level_dir = os.path.join(path, str(idx))
+            if os.path.isdir(level_dir):
+                for name in os.listdir(level_dir):
+                    os.remove(os.path.join(level_dir, name))
+            else:
+                os.makedirs(level_dir)
+
+            written = []
+            for row in range(0, level.shape[0], tile_size):
+                for col in range(0, level.shape[1], tile_size):
+                    tile = level[row:row + tile_size, col:col + tile_size]
+                    if tile.any():
+                        key = row // tile_size, col // tile_size
+                        with open(os.path.join(level_dir, '%s_%s.npz' % key), 'wb') as f:
+                            np.savez_compressed(f, labels=tile)
+                        written.append(key)
+            tiles.append(written)
+
+        with open(index_path, 'w') as f:
+            json.dump({
+                'format': _FORMAT,
+                'bounds': list(pyramid.bounds),
+                'all_touched': pyramid.all_touched,
+                'tile_size': tile_size,
+                'shapes': [list(l.shape) for l in pyramid.levels],
+                'tiles': tiles
+            }, f)
+
+        return cls(path)
+
+    def _tile(self, level, row, col):
+
+        """
+        Read a single tile.  Tiles that were not written because they are
+        empty are `None`.
+        """
+
+        key = level, row, col
+        if key in self._cache:
+            tile = self._cache.pop(key)
+        elif (row, col) not in self._tiles[level]:
+            return None
+        else:
+            with np.load(os.path.join(self.path, str(level), '%s_%s.npz' % (row, col))) as data:
+                tile = data['labels']
+        self._cache[key] = tile
+        while len(self._cache) > _TILE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return tile
+
+    def read(self, level, window):
+
+        """
+        Read a window from a level by assembling the tiles that intersect it.
+
+
+        Parameters
+        ----------
+        level : int
+            Level to read.  `0` is the finest.
+
+        window : tuple
+            (row_start, row_stop, col_start, col_stop) in level cells.
+
+
+        Returns
+        -------
+        np.ndarray
+            `uint8` label array.
+        """
+
+        row_start, row_stop, col_start, col_stop = window
+        size = self.tile_size
+        output = np.zeros((row_stop - row_start, col_stop - col_start), dtype=np.uint8)
+        for t_row in range(row_start // size, (row_stop - 1) // size + 1):
+            for t_col in range(col_start // size, (col_stop - 1) // size + 1):
+                tile = self._tile(level, t_row, t_col)
+                if tile is None:
+                    continue
+                # Intersection between the tile and the window in level cells
+                r0 = max(row_start, t_row * size)
+                r1 = min(row_stop, t_row * size + tile.shape[0])
+                c0 = max(col_start, t_col * size)
+                c1 = min(col_stop, t_col * size + tile.shape[1])
+                output[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = \
+                    tile[r0 - t_row * size:r1 - t_row * size, c0 - t_col * size:c1 - t_col * size]
+        return output
+
+    def labels(self, out_shape, transform, all_touched=False):
+
+        """
+        Read the tiles covering a grid from the nearest level and resample
+        them.  This is the protocol `render()` uses for pre-rasterized inputs.
+        See `gj2ascii.pyramid.Pyramid.labels()`.
+
+
+        Parameters
+        ----------
+        out_shape : tuple
+            Output (rows, cols).
+
+        transform : affine.Affine
+            North-up transform for the output array.
+
+        all_touched : bool, optional
+            Must match the value the store was built with.
+
+
+        Raises
+        ------
+        ValueError
+            The store was built with a different `all_touched` value.
+
+
+        Returns
+        -------
+        np.ndarray
+            `uint8` array containing `1` where a cell intersects a geometry.
+        """
+
+        if bool(all_touched) != self.all_touched:
+            raise ValueError(
+                "Invalid all_touched `%s' - tile store was built with all_touched=%s"
+                % (all_touched, self.all_touched))
+
+        height, width = out_shape
+        x_min, _, x_max, y_max = self.bounds
+        level = _nearest_level([s[1] for s in self.shapes], x_max - x_min, transform.a)
+        n_rows, n_cols = self.shapes[level]
+        cell_size = (x_max - x_min) / n_cols
+
+        # Only read the part of the level covering the output grid
+        left = (transform.c - x_min) / cell_size
+        right = left + width * transform.a / cell_size
+        top = (y_max - transform.f) / cell_size
+        bottom = top - height * transform.e / cell_size
+        col_start = int(min(max(np.floor(left), 0), n_cols))
+        col_stop = int(min(max(np.ceil(right), col_start), n_cols))
+        row_start = int(min(max(np.floor(top), 0), n_rows))
+        row_stop = int(min(max(np.ceil(bottom), row_start), n_rows))
+        if row_start == row_stop or col_start == col_stop:
+            return np.zeros(out_shape, dtype=np.uint8)
+
+        window = self.read(level, (row_start, row_stop, col_start, col_stop))
+        origin = x_min + col_start * cell_size, y_max - row_start * cell_size
+        return _resample(
+            window, origin, cell_size, out_shape, transform, all_touched=self.all_touched)
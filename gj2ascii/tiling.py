@@ -0,0 +1,129 @@
+"""
+Page through a map as a grid of tiles
+
+`paginate()` produces one page per feature.  Browsing a large layer at a
+readable width instead needs pages of the map itself, so the area is split
+into a grid of tiles and each tile is rendered as its own page.  Geometries
+are loaded into a `GeometryBuffer` once and each tile only rasterizes the
+geometries whose bounds intersect it.
+
+    >>> import fiona
+    >>> import gj2ascii
+    >>> with fiona.open('sample-data/WV.geojson') as src:
+    ...     for page in gj2ascii.paginate_tiles(src, (3, 2), width=80):
+    ...         print(page)
+
+Tiles are produced in reading order, from the northwest corner across each
+row and then down.
+"""
+
+
+import os
+
+import numpy as np
+
+from .core import DEFAULT_WIDTH
+from .core import min_bbox
+from .core import render
+from .core import style
+from .geobuffer import GeometryBuffer
+
+
+__all__ = ['paginate_tiles', 'tile_bounds']
+
+
+def tile_bounds(bbox, tiles):
+
+    """
+    Split a bbox into a grid of equally sized tiles.
+
+
+    Parameters
+    ----------
+    bbox : tuple
+        x_min, y_min, x_max, y_max.
+
+    tiles : tuple
+        Number of (columns, rows) of tiles.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Returns
+    -------
+    list
+        One (x_min, y_min, x_max, y_max) tuple per tile in reading order.
+    """
+
+    cols, rows = tiles
+    if cols < 1 or rows < 1:
+        raise ValueError("Invalid tiles `%s' - must have at least 1 column and row" % (tiles,))
+    x_min, y_min, x_max, y_max = bbox
+    xs = np.linspace(x_min, x_max, cols + 1).tolist()
+    ys = np.linspace(y_max, y_min, rows + 1).tolist()
+    return [(xs[c], ys[r + 1], xs[c + 1], ys[r]) for r in range(rows) for c in range(cols)]
+
+
+def paginate_tiles(ftrz, tiles, width=DEFAULT_WIDTH, bbox=None, colormap=None, **kwargs):
+
+    """
+    Generator to render a grid of tiles covering a bbox, one tile per page.
+    Every tile is rendered at the same width and has the same number of rows.
+
+
+    Parameters
+    ----------
+    ftrz : dict or iterator
+        Anything accepted by `render()`.  Features are read into a
+        `GeometryBuffer` before the first tile is rendered unless they are
+        already in one or produce labels directly, like a `Pyramid`.
+
+    tiles : tuple
+        Number of (columns, rows) of tiles.
+
+    width : int, optional
+        Width of each tile.  See `render()`.
+
+    bbox : tuple or None, optional
+        Area to split into tiles.  Defaults to the bounds of the input.
+
+    colormap : dict or None, optional
+        If provided the output text will contain color codes or emoji.  See
+        `style()` for more information.
+
+    kwargs : **kwargs, optional
+        Additional keyword arguments for `render()`.  `density` and `by`
+        style rendering is not supported.
+
+
+    Raises
+    ------
+    ValueError
+        A parameter has an invalid value.
+
+
+    Yields
+    ------
+    str
+        One rendered tile.
+    """
+
+    if not hasattr(ftrz, 'labels'):
+        ftrz = GeometryBuffer.from_features(ftrz)
+    if bbox is None:
+        bbox = min_bbox(ftrz)
+    grid = tile_bounds(bbox, tiles)
+
+    for tile in grid:
+        if isinstance(ftrz, GeometryBuffer):
+            tile_ftrz = ftrz.filter(tile)
+        else:
+            tile_ftrz = ftrz
+        rendered = render(tile_ftrz, width=width, bbox=tile, **kwargs)
+        if colormap:
+            rendered = style(rendered, stylemap=colormap)
+        yield rendered + os.linesep
@@ -76,9 +76,9 @@ setup(
     include_package_data=True,
     install_requires=[
         'click>=3.0',
-        'fiona>=1.2',
-        'numpy>=1.8',
-        'rasterio>=0.18',
+        'fiona>=1.8',
+        'numpy>=1.13',
+        'rasterio>=1.0.14',
         'shapely'
     ],
     extras_require=extras_require,
@@ -2,6 +2,8 @@
 
 
 import os
+import shutil
+import tempfile
 
 from click.testing import CliRunner
 import pytest
@@ -213,6 +215,15 @@ def small_aoi_poly_line_file():
     return os.path.join('sample-data', 'small-aoi-polygon-line.geojson')
 
 
+@pytest.fixture(scope='function')
+def tmp_poly_file(poly_file):
+    tempdir = tempfile.mkdtemp()
+    path = os.path.join(tempdir, os.path.basename(poly_file))
+    shutil.copy(poly_file, path)
+    yield path
+    shutil.rmtree(tempdir)
+
+
 @pytest.fixture(scope='module')
 def compare_ascii():
     def _compare_ascii(text1, text2):
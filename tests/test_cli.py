@@ -5,11 +5,13 @@ Unittests for gj2ascii CLI
 
 from __future__ import division
 
+import json
 import os
 import tempfile
 import unittest
 
 import click
+from click.testing import CliRunner
 import emoji
 import fiona as fio
 import pytest
@@ -434,3 +436,213 @@ def test_print_colors(runner):
     assert result.exit_code is 0
     for color in gj2ascii.DEFAULT_COLOR_CHAR.keys():
         assert color in result.output
+
+
+def test_serve_stdin(runner, poly_file, compare_ascii):
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 20)
+    requests = os.linesep.join([
+        json.dumps({'args': [poly_file, '-w', '20']}),
+        json.dumps({'args': [poly_file, '-w', '20']}),
+    ])
+    result = runner.invoke(cli.main, ['--serve', '-'], input=requests)
+    assert result.exit_code == 0
+    responses = [json.loads(line) for line in result.output.splitlines()]
+    assert len(responses) == 2
+    for response in responses:
+        assert response['exit_code'] == 0
+        assert compare_ascii(response['output'], expected)
+
+
+def test_server_unreachable(runner, poly_file):
+    result = runner.invoke(cli.main, [
+        poly_file,
+        '--server', os.path.join(tempfile.gettempdir(), 'does-not-exist.sock')
+    ])
+    assert result.exit_code != 0
+    assert 'Could not reach server' in result.output
+
+
+def test_server_iterate_requires_no_prompt(runner, poly_file):
+    result = runner.invoke(cli.main, [
+        poly_file, '--iterate', '--server', 'gj2ascii.sock'])
+    assert result.exit_code != 0
+    assert '--no-prompt' in result.output
+
+
+def test_datasource_pool(runner, poly_file):
+    hits = cli._POOL.stats()['hits']
+    result = runner.invoke(cli.main, [poly_file, '--width', '20'])
+    assert result.exit_code == 0
+    # Opened once for the bbox and again for rendering
+    assert cli._POOL.stats()['hits'] > hits
+
+
+def test_density(runner, point_file, compare_ascii):
+    with fio.open(point_file) as src:
+        expected = gj2ascii.render(src, width=20, fill='.', density='log', ramp='abc')
+    result = runner.invoke(cli.main, [
+        point_file, '-w', '20', '-f', '.', '--density', 'log', '--ramp', 'abc'])
+    assert result.exit_code == 0
+    assert compare_ascii(result.output, expected)
+
+
+def test_density_color_ramp(runner, point_file):
+    result = runner.invoke(cli.main, [
+        point_file, '--density', 'linear', '--ramp', 'blue,red'], color=True)
+    assert result.exit_code == 0
+    assert gj2ascii.ANSI_COLORMAP['red'] in result.output
+
+    result = runner.invoke(cli.main, [point_file, '--density', 'linear', '--ramp', 'blue,bad'])
+    assert result.exit_code != 0
+    assert 'unrecognized color' in result.output
+
+
+def test_density_too_many_layers(runner, point_file, poly_file):
+    result = runner.invoke(cli.main, [point_file, poly_file, '--density', 'linear'])
+    assert result.exit_code != 0
+    assert 'single layer' in result.output
+
+
+def test_by(runner, compare_ascii):
+    infile = os.path.join('sample-data', 'WV.geojson')
+    with fio.open(infile) as src:
+        expected = gj2ascii.render(src, width=40, fill='.', by='CLASSFP')
+    result = runner.invoke(cli.main, [infile, '-w', '40', '-f', '.', '--by', 'CLASSFP'])
+    assert result.exit_code == 0
+    assert compare_ascii(result.output, expected)
+
+    result = runner.invoke(cli.main, [infile, '--by', 'CLASSFP'], color=True)
+    assert result.exit_code == 0
+    assert gj2ascii.ANSI_COLORMAP[gj2ascii.DEFAULT_CHAR_COLOR['0']] in result.output
+
+    result = runner.invoke(cli.main, [infile, '--by', 'CLASSFP', '--density', 'log'])
+    assert result.exit_code != 0
+    assert 'cannot be combined' in result.output
+
+
+@pytest.mark.parametrize('args,message', [
+    (['--iterate', '--no-prompt', '--density', 'log'], '`--iterate` cannot be combined'),
+    (['--iterate', '--no-prompt', '--by', 'CLASSFP'], '`--iterate` cannot be combined'),
+    (['--by', 'CLASSFP', '--ramp', 'abc'], 'only be used with `--density`'),
+    (['--ramp', 'abc'], 'only be used with `--density`')])
+def test_density_by_ignored_options(runner, args, message):
+    result = runner.invoke(cli.main, [os.path.join('sample-data', 'WV.geojson')] + args)
+    assert result.exit_code != 0
+    assert message in result.output
+
+
+def test_iterate_projected_properties(runner, multilayer_file):
+    result = runner.invoke(cli.main, [
+        multilayer_file + ',polygons',
+        '--iterate', '--no-prompt',
+        '--properties', 'FID'
+    ])
+    assert result.exit_code == 0
+    assert '| FID |' in result.output
+
+
+def test_write_pages():
+    pages = ['page%s' % i for i in range(10)]
+    with tempfile.TemporaryFile('w+') as f:
+        cli._write_pages(iter(pages), f, bufsize=12)
+        f.seek(0)
+        assert f.read() == ''.join(p + '\n' for p in pages)
+
+
+def test_drop_ansi_colors(runner, single_feature_wv_file):
+    colormap = {'+': 'red', '.': ':water_wave:'}
+    with tempfile.TemporaryFile('w+') as f:
+        assert cli._drop_ansi_colors(colormap, f) == {'.': ':water_wave:'}
+
+    # Colors are still produced when writing to something that wants them
+    result = runner.invoke(cli.main, [
+        single_feature_wv_file, '--iterate', '--no-prompt', '-c', '+=red'], color=True)
+    assert result.exit_code == 0
+    assert gj2ascii.ANSI_COLORMAP['red'] in result.output
+
+
+@pytest.mark.parametrize('styled,unstyled', [
+    (['--iterate', '--no-prompt', '-c', '+=red'], ['--iterate', '--no-prompt', '-c', '+']),
+    (['--tiles', '2x2', '--no-prompt', '-c', '+=red'], ['--tiles', '2x2', '--no-prompt'])])
+def test_drop_ansi_colors_output(runner, single_feature_wv_file, styled, unstyled):
+    # Pages dumped to a non-terminal skip colors entirely, so they match
+    # `--no-style` rather than stripped `style()` output with a trailing space
+    # after every cell.
+    styled = runner.invoke(cli.main, [single_feature_wv_file, '-f', '.'] + styled)
+    unstyled = runner.invoke(
+        cli.main, [single_feature_wv_file, '-f', '.', '--no-style'] + unstyled)
+    assert styled.exit_code == 0
+    assert styled.output == unstyled.output
+    assert ' ' + os.linesep not in styled.output
+
+
+@pytest.mark.parametrize('args', [
+    ['--density', 'log', '--ramp', 'red,blue'], ['-c', '+=red'], ['-c', '+=red', '--processes', '2']])
+def test_style_output(runner, single_feature_wv_file, args):
+    # Everything else is styled and click strips the colors for a non-terminal
+    args = [single_feature_wv_file, '-f', 'blue'] + args
+    colored = runner.invoke(cli.main, args, color=True)
+    plain = runner.invoke(cli.main, args)
+    assert plain.exit_code == 0
+    assert plain.output == click.unstyle(colored.output)
+    assert plain.output != colored.output
+
+
+def test_bbox_sample(runner, poly_file, compare_ascii):
+    exact = runner.invoke(cli.main, [poly_file, '--width', '40'])
+    sampled = runner.invoke(cli.main, [
+        poly_file, '--width', '40', '--bbox-sample', '1000', '--bbox-margin', '0'])
+    assert sampled.exit_code == 0
+    assert compare_ascii(exact.output, sampled.output)
+
+    # A single feature does not cover the layer, and the margin grows the area
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 40, bbox_sample=1, bbox_margin=0)
+    split = CliRunner(mix_stderr=False)
+    result = split.invoke(cli.main, [
+        poly_file, '--width', '40', '--bbox-sample', '1', '--bbox-margin', '0'])
+    assert result.exit_code == 0
+    assert 'Warning: Some features are outside' in result.stderr
+    assert compare_ascii(result.stdout, expected)
+    assert result.stdout != exact.output
+    margin = split.invoke(cli.main, [
+        poly_file, '--width', '40', '--bbox-sample', '1', '--bbox-margin', '1'])
+    assert margin.exit_code == 0
+    assert margin.stdout not in (result.stdout, exact.output)
+
+    # The density mode and sub-cell rendering are sampled too
+    for args in (['--density', 'linear'], ['--glyphs', 'braille']):
+        exact = split.invoke(cli.main, [poly_file, '--width', '40'] + args)
+        sampled = split.invoke(
+            cli.main, [poly_file, '--width', '40', '--bbox-sample', '1'] + args)
+        assert sampled.exit_code == 0
+        assert 'Warning: Some features are outside' in sampled.stderr
+        assert sampled.stdout != exact.stdout
+
+    for args in (['--iterate', '--no-prompt'], ['--tiles', '2x2', '--no-prompt']):
+        result = runner.invoke(cli.main, [poly_file, '--bbox-sample', '1'] + args)
+        assert result.exit_code != 0
+        assert '`--bbox-sample` cannot be combined' in result.output
+
+
+def test_max_cells_aspect(runner, poly_file, compare_ascii):
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 80, char='+', fill=' ', max_cells=200, aspect=1.2)
+    result = runner.invoke(cli.main, [
+        poly_file, '--width', '80', '--max-cells', '200', '--aspect', '1.2', '-c', '+'])
+    assert result.exit_code == 0
+    assert compare_ascii(result.output, expected)
+
+    for args in (['--max-cells', '0'], ['--aspect', '0']):
+        assert runner.invoke(cli.main, [poly_file] + args).exit_code != 0
+
+
+@pytest.mark.parametrize('args', [
+    [], ['--glyphs', 'braille'], ['--tiles', '2x2', '--no-prompt'], ['--density', 'log']])
+def test_max_cells_too_small(runner, poly_file, args):
+    result = runner.invoke(
+        cli.main, [poly_file, '--max-cells', '1', '--bbox', '0', '0', '1', '100'] + args)
+    assert result.exit_code != 0
+    assert 'Error: Invalid max_cells' in result.output
+    assert isinstance(result.exception, SystemExit)
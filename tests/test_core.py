@@ -6,7 +6,10 @@ Unittests for gj2ascii.core
 from collections import OrderedDict
 import itertools
 import os
+import shutil
+import tempfile
 import unittest
+import warnings
 
 import emoji
 import fiona as fio
@@ -244,6 +247,47 @@ def test_roundhouse(ascii, array):
     assert array == gj2ascii.ascii2array(gj2ascii.array2ascii(array))
 
 
+def test_ndarray_roundhouse(ascii, array):
+    arr = gj2ascii.ascii2array(ascii, as_ndarray=True)
+    assert isinstance(arr, np.ndarray)
+    assert np.array_equal(arr, np.array(array))
+    assert ascii == gj2ascii.array2ascii(arr)
+
+
+def test_ascii2array_ndarray_ragged():
+    arr = gj2ascii.ascii2array('+ +' + os.linesep + '+', as_ndarray=True)
+    assert arr.tolist() == [['+', '+'], ['+', ' ']]
+    assert gj2ascii.ascii2array('', as_ndarray=True).shape == (0, 0)
+
+
+def test_array2ascii_multichar_ndarray():
+    arr = np.array([['ab', 'c'], ['d', 'e']])
+    assert gj2ascii.array2ascii(arr) == os.linesep.join(['ab c', 'd e'])
+
+
+def test_stack_topmost(compare_ascii):
+    l1 = gj2ascii.array2ascii([['1', '1', ' '],
+                               ['1', ' ', ' ']])
+    l2 = gj2ascii.array2ascii([[' ', '2', ' '],
+                               ['2', '2', ' ']])
+    expected = gj2ascii.array2ascii([['1', '2', '.'],
+                                     ['2', '2', '.']])
+    assert compare_ascii(expected, gj2ascii.stack([l1, l2], fill='.'))
+
+
+def test_style_row_alignment():
+    red = gj2ascii.ANSI_COLORMAP['red'] + 'a ' + gj2ascii.core._ANSI_RESET
+    # Rows with trailing whitespace stripped and Windows newlines
+    assert gj2ascii.style('a \nb', {'a': 'red'}) == os.linesep.join([red, 'b '])
+    assert gj2ascii.style('b a\r\na b', {'a': 'red'}) == os.linesep.join(
+        ['b ' + red, red + 'b '])
+
+
+def test_stack_ragged_rows():
+    with pytest.raises(ValueError):
+        gj2ascii.stack(['1 1\n1 1', '2 2\n2'])
+
+
 def test_style():
 
     array = [['0', '0', '0', '1', '0'],
@@ -374,3 +418,420 @@ def test_style_multiple(poly_file, line_file, point_file):
         assert '\x1b[34m\x1b[44m' in actual  # blue
         assert '\x1b[31m\x1b[41m' in actual  # red
         assert emoji.unicode_codes.EMOJI_ALIAS_UNICODE[':water_wave:'] in actual
+
+
+def test_rasterize_points_matches_gdal(point_file):
+    transform = gj2ascii.core.affine.Affine.from_gdal(0, 0.5, 0, 10, 0, -0.5)
+    rng = np.random.RandomState(0)
+    coords = rng.uniform(-1, 11, size=(1000, 2)).tolist()
+    # Points on cell edges and on the bbox boundary
+    coords += [(0, 0), (10, 10), (0, 10), (10, 0), (5, 5), (0.5, 9.5), (-0.0, 5)]
+    points = [{'type': 'Point', 'coordinates': c} for c in coords]
+    expected = gj2ascii.core.rasterize(
+        points, out_shape=(20, 20), transform=transform, fill=0, default_value=1,
+        dtype='uint8')
+    actual = gj2ascii.core._rasterize(points, (20, 20), transform)
+    assert np.array_equal(expected, actual)
+
+    multipoint = {'type': 'MultiPoint', 'coordinates': coords}
+    actual = gj2ascii.core._rasterize([multipoint], (20, 20), transform)
+    assert np.array_equal(expected, actual)
+
+    with fio.open(point_file) as src:
+        x_min, y_min, x_max, y_max = src.bounds
+        cell_size = (x_max - x_min) / 20
+        transform = gj2ascii.core.affine.Affine.from_gdal(
+            x_min, cell_size, 0, y_max, 0, -cell_size)
+        shape = (int((y_max - y_min) / cell_size), 20)
+        expected = gj2ascii.core.rasterize(
+            (f['geometry'] for f in src), out_shape=shape, transform=transform,
+            default_value=1, dtype='uint8')
+        actual = gj2ascii.core._rasterize((f['geometry'] for f in src), shape, transform)
+        assert np.array_equal(expected, actual)
+
+
+def test_rasterize_points_mixed_geometries(poly_file, point_file):
+    with fio.open(poly_file) as poly, fio.open(point_file) as points:
+        bbox = poly.bounds
+        geometries = [f['geometry'] for f in points] + [f['geometry'] for f in poly]
+        # Point path is taken because the first geometry is a point
+        expected = gj2ascii.render(geometries[::-1], 40, bbox=bbox)
+        assert expected == gj2ascii.render(geometries, 40, bbox=bbox)
+
+
+@pytest.mark.parametrize('all_touched', [False, True])
+def test_rasterize_lines_matches_gdal(monkeypatch, line_file, all_touched):
+    # Always take the numpy path regardless of how long the segments are
+    monkeypatch.setattr(gj2ascii.core, '_LINE_MAX_STEPS', float('inf'))
+    monkeypatch.setattr(gj2ascii.core, '_TOUCHED_LINE_MAX_STEPS', float('inf'))
+
+    def check(geometries, shape, transform):
+        expected = gj2ascii.core.rasterize(
+            geometries, out_shape=shape, transform=transform, fill=0, default_value=1,
+            all_touched=all_touched, dtype='uint8')
+        actual = gj2ascii.core._rasterize(geometries, shape, transform, all_touched=all_touched)
+        assert np.array_equal(expected, actual)
+
+    transform = gj2ascii.core.affine.Affine.from_gdal(0, 0.5, 0, 10, 0, -0.5)
+    rng = np.random.RandomState(0)
+    lines = []
+    for _ in range(200):
+        coords = rng.uniform(-2, 12, size=(rng.randint(2, 6), 2))
+        if rng.rand() < 0.5:
+            # Vertices on cell edges
+            coords = np.round(coords * 2) / 2
+        lines.append({'type': 'LineString', 'coordinates': coords.tolist()})
+    # Vertical, horizontal, nearly vertical, and leaving the right edge
+    lines += [
+        {'type': 'LineString', 'coordinates': [(3.25, 1), (3.25, 9)]},
+        {'type': 'LineString', 'coordinates': [(1, 3.25), (9, 3.25)]},
+        {'type': 'LineString', 'coordinates': [(3.24, 1), (3.26, 9)]},
+        {'type': 'LineString', 'coordinates': [(10, 8.5), (11.5, 12)]},
+        {'type': 'MultiLineString', 'coordinates': [[(0, 0), (10, 10)], [(0, 10), (10, 0)]]}]
+    for line in lines:
+        check([line], (20, 20), transform)
+    check(lines, (20, 20), transform)
+
+    with fio.open(line_file) as src:
+        geometries = [f['geometry'] for f in src]
+        x_min, y_min, x_max, y_max = src.bounds
+    for width in (5, 20, 80):
+        cell_size = (x_max - x_min) / width
+        transform = gj2ascii.core.affine.Affine.from_gdal(
+            x_min, cell_size, 0, y_max, 0, -cell_size)
+        check(geometries, (int((y_max - y_min) / cell_size), width), transform)
+
+
+def test_rasterize_long_lines_use_gdal(line_file):
+    with fio.open(line_file) as src:
+        geometries = [f['geometry'] for f in src]
+        bbox = src.bounds
+    parts = [g['coordinates'] for g in geometries]
+    # Segments crossing many cells are left to GDAL but the output is the same
+    for width, skipped in ((5, 0), (400, len(parts))):
+        _, transform, shape = gj2ascii.core._grid(None, width, bbox)
+        out = np.zeros(shape, dtype=np.uint8)
+        assert len(gj2ascii.core._burn_lines(parts, out, transform)) == skipped
+        expected = gj2ascii.core.rasterize(
+            geometries, out_shape=shape, transform=transform, fill=0, default_value=1,
+            dtype='uint8')
+        assert np.array_equal(expected, gj2ascii.core._rasterize(geometries, shape, transform))
+
+
+def test_quantize():
+    counts = np.array([[0, 1, 2], [3, 4, 100]])
+    assert gj2ascii.core._quantize(counts, 4, 'linear').tolist() == [[0, 0, 0], [0, 0, 3]]
+    assert gj2ascii.core._quantize(counts, 4, 'log').tolist() == [[0, 0, 0], [1, 1, 3]]
+    assert gj2ascii.core._quantize(counts, 5, 'quantile').tolist() == [[0, 0, 1], [2, 3, 4]]
+    assert not gj2ascii.core._quantize(np.zeros((2, 2)), 4).any()
+    with pytest.raises(ValueError):
+        gj2ascii.core._quantize(counts, 4, 'bad')
+
+
+def test_render_density(point_file, poly_file):
+    bbox = (0, 0, 4, 2)
+    points = [{'type': 'Point', 'coordinates': (0.5, 1.5)}] * 3 + \
+        [{'type': 'Point', 'coordinates': (2.5, 0.5)}]
+    assert gj2ascii.render(points, 8, fill='.', bbox=bbox, density='linear', ramp='abc') == \
+        os.linesep.join(['c . . .', '. . a .'])
+
+    # Overlapping polygons are counted
+    square = {'type': 'Polygon', 'coordinates': [[(0, 0), (0, 2), (2, 2), (2, 0), (0, 0)]]}
+    rendered = gj2ascii.render(
+        [square, square, points[-1]], 8, fill='.', bbox=bbox, density='linear', ramp='12')
+    assert rendered == os.linesep.join(['2 2 . .', '2 2 1 .'])
+
+    with fio.open(point_file) as src:
+        rendered = gj2ascii.render(src, 20, fill=' ', density='log')
+        assert set(rendered.split()) <= set(gj2ascii.DEFAULT_CHAR_RAMP)
+    # Every density class needs its own character
+    assert len(set(gj2ascii.DEFAULT_CHAR_RAMP)) == len(gj2ascii.DEFAULT_CHAR_RAMP)
+
+    with pytest.raises(ValueError):
+        gj2ascii.render(points, density='bad')
+    with pytest.raises(ValueError):
+        gj2ascii.render(points, density='linear', ramp=['too long'])
+
+
+def test_render_by(single_feature_wv_file):
+    def _feature(name, x):
+        return {
+            'type': 'Feature',
+            'properties': {'NAME': name},
+            'geometry': {'type': 'Point', 'coordinates': (x, 0.5)}
+        }
+    features = [_feature('a', 0.5), _feature('b', 1.5), _feature('a', 2.5),
+                _feature('c', 3.5), _feature(None, 4.5)]
+    bbox = (0, 0, 5, 1)
+
+    charmap = {}
+    rendered = gj2ascii.render(features, 10, fill='.', bbox=bbox, by='NAME', charmap=charmap)
+    assert rendered == '0 1 0 2 3'
+    assert charmap == {'a': '0', 'b': '1', 'c': '2', None: '3'}
+
+    # User supplied characters are respected and others are assigned around them
+    charmap = {'b': '0'}
+    rendered = gj2ascii.render(
+        (f for f in features), 10, fill='.', bbox=bbox, by='NAME', charmap=charmap)
+    assert rendered == '1 0 1 2 3'
+
+    # Fill character is never assigned
+    rendered = gj2ascii.render(features, 10, fill='0', bbox=bbox, by='NAME')
+    assert rendered == '1 2 1 3 4'
+
+    # Overlapping features are drawn with the painters algorithm
+    with fio.open(single_feature_wv_file) as src:
+        feature = next(iter(src))
+        charmap = {}
+        rendered = gj2ascii.render([feature, feature], 20, by='NAME', charmap=charmap)
+        assert charmap == {'Barbour': '0'}
+        assert rendered == gj2ascii.render(feature, 20, char='0')
+
+
+def test_render_by_exceptions(geometry, feature):
+    with pytest.raises(TypeError):
+        gj2ascii.render([geometry], bbox=(0, 0, 1, 1), by='NAME')
+    with pytest.raises(KeyError):
+        gj2ascii.render([feature], bbox=(0, 0, 1, 1), by='NAME')
+    with pytest.raises(ValueError):
+        gj2ascii.render([feature], bbox=(0, 0, 1, 1), by='NAME', charmap={'a': 'too long'})
+    features = [{
+        'type': 'Feature',
+        'properties': {'ID': i},
+        'geometry': {'type': 'Point', 'coordinates': (0, 0)}
+    } for i in range(30)]
+    with pytest.raises(ValueError):
+        gj2ascii.render(features, bbox=(0, 0, 1, 1), by='ID')
+
+
+def test_dicts2table():
+    dicts = [
+        OrderedDict((('Field1', None), ('other', 1.2344566))),
+        OrderedDict((('Field1', 'a long string'), ('other', 1))),
+    ]
+    expected = os.linesep.join(gj2ascii.dict2table(d) for d in dicts)
+    assert gj2ascii.dicts2table(dicts) == expected
+    assert gj2ascii.dicts2table(iter(dicts)) == expected
+
+    # Explicit keys select and order columns
+    assert gj2ascii.dicts2table(dicts, keys=['other']) == os.linesep.join(
+        gj2ascii.dict2table({'other': d['other']}) for d in dicts)
+
+    with pytest.raises(ValueError):
+        gj2ascii.dicts2table([])
+    with pytest.raises(ValueError):
+        gj2ascii.dicts2table(dicts, keys=[])
+
+
+def test_paginate_single_property(single_feature_wv_file):
+    with fio.open(single_feature_wv_file) as src:
+        feature = next(iter(src))
+        page = next(gj2ascii.paginate([feature], properties=['NAME']))
+    assert page.startswith(gj2ascii.dict2table({'NAME': 'Barbour'}))
+
+
+def test_render_to_file(poly_file, line_file, point_file):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'render.txt')
+        for infile in (poly_file, line_file, point_file):
+            for all_touched in (True, False):
+                with fio.open(infile) as src:
+                    expected = gj2ascii.render(
+                        src, 80, fill='.', char='+', all_touched=all_touched)
+                    rows, stride = gj2ascii.render_to_file(
+                        src, path, 80, fill='.', char='+', all_touched=all_touched,
+                        block_rows=3)
+                with open(path, 'rb') as f:
+                    actual = f.read().decode('ascii')
+                assert actual == expected + os.linesep
+                assert rows == len(expected.splitlines())
+
+                # Rows are randomly addressable
+                with open(path, 'rb') as f:
+                    f.seek(2 * stride)
+                    row = f.read(stride).decode('ascii')
+                assert row == expected.splitlines()[2] + os.linesep
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_render_to_file_exceptions(geometry):
+    for kwargs in ({'fill': u'█'}, {'char': 'too long'}, {'width': 0}):
+        with pytest.raises(ValueError):
+            gj2ascii.render_to_file([geometry], 'unused.txt', **kwargs)
+
+
+def test_min_bbox_sample(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+    exact = gj2ascii.min_bbox(features)
+
+    def gen():
+        for f in features:
+            yield f
+
+    bbox, ftrz = gj2ascii.min_bbox(gen(), return_iter=True, sample=2)
+    assert bbox == gj2ascii.min_bbox(features[:2])
+    assert list(ftrz) == features
+
+    # A full sample is exact and the margin pads every side
+    bbox = gj2ascii.min_bbox(features, sample=len(features), margin=0.5)
+    dx = exact[2] - exact[0]
+    dy = exact[3] - exact[1]
+    assert bbox == pytest.approx(
+        (exact[0] - dx / 2, exact[1] - dy / 2, exact[2] + dx / 2, exact[3] + dy / 2))
+
+    with pytest.raises(ValueError):
+        gj2ascii.min_bbox(features, sample=0)
+
+
+def test_render_bbox_sample_warns(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+
+    with pytest.warns(UserWarning):
+        gj2ascii.render((f for f in features), 20, bbox_sample=1, bbox_margin=0)
+
+    # The whole input is sampled so nothing falls outside
+    with warnings.catch_warnings(record=True) as record:
+        warnings.simplefilter('always')
+        sampled = gj2ascii.render(
+            (f for f in features), 20, bbox_sample=len(features), bbox_margin=0)
+    assert not [w for w in record if issubclass(w.category, UserWarning)]
+    assert sampled == gj2ascii.render(features, 20)
+
+    # Sampled objects are only trusted when the bbox was estimated from them
+    points = [{'type': 'Point', 'coordinates': (x, x)} for x in (100, 0, 1)]
+    with pytest.warns(UserWarning):
+        gj2ascii.render((p for p in points), 20, bbox=(0, 0, 1, 1), bbox_sample=1)
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 65536])
+def test_warn_outside(monkeypatch, batch_size):
+    monkeypatch.setattr(gj2ascii.core, '_POINT_BATCH_SIZE', batch_size)
+    inside = [
+        {'type': 'Point', 'coordinates': (1, 1)},
+        {'type': 'MultiPoint', 'coordinates': [(1, 1), (2, 2, 5)]},
+        {'type': 'LineString', 'coordinates': [(0, 0), (10, 10)]},
+        {'type': 'Polygon', 'coordinates': [[(0, 0), (0, 5), (5, 5), (0, 0)],
+                                            [(1, 1), (1, 2), (2, 2), (1, 1)]]},
+        {'type': 'MultiPolygon', 'coordinates': [[[(0, 0), (0, 5), (5, 5), (0, 0)]]]},
+        {'type': 'Feature', 'properties': {}, 'geometry': {
+            'type': 'GeometryCollection', 'geometries': [
+                {'type': 'MultiLineString', 'coordinates': [[(3, 3), (4, 4)]]}]}}]
+    outside = {'type': 'Feature', 'properties': {}, 'geometry': {
+        'type': 'MultiPolygon', 'coordinates': [[[(0, 0), (0, 5), (11, 5), (0, 0)]]]}}
+    bbox = (0, 0, 10, 10)
+
+    with warnings.catch_warnings(record=True) as record:
+        warnings.simplefilter('always')
+        assert list(gj2ascii.core._warn_outside(inside, bbox)) == inside
+    assert not [w for w in record if issubclass(w.category, UserWarning)]
+
+    ftrz = inside + [outside] + inside
+    with pytest.warns(UserWarning):
+        assert list(gj2ascii.core._warn_outside(iter(ftrz), bbox)) == ftrz
+    # Skipped objects are not checked
+    assert list(gj2ascii.core._warn_outside([outside] + inside, bbox, skip=1)) == \
+        [outside] + inside
+
+
+def test_render_labels(poly_file, line_file):
+    with fio.open(poly_file) as src:
+        labels = gj2ascii.render_labels(src, 40, all_touched=True)
+        expected = gj2ascii.render(src, 40, fill='0', char='1', all_touched=True)
+        bbox = src.bounds
+    assert gj2ascii.array2ascii(labels.astype(str)) == expected
+
+    # Rendering into an existing array combines layers with a logical OR
+    with fio.open(line_file) as src:
+        lines = gj2ascii.render_labels(src, 40, bbox=bbox)
+        out = labels.copy()
+        assert gj2ascii.render_labels(src, 40, bbox=bbox, out=out) is out
+    assert np.array_equal(out, labels | lines)
+
+    with pytest.raises(ValueError):
+        gj2ascii.render_labels([], 40, bbox=bbox, out=np.zeros((1, 1), dtype=np.uint8))
+
+
+def test_stack_labels(poly_file, line_file):
+    with fio.open(poly_file) as poly, fio.open(line_file) as lines:
+        bbox = poly.bounds
+        expected = gj2ascii.stack([
+            gj2ascii.render(poly, 40, char='0', fill=' ', bbox=bbox),
+            gj2ascii.render(lines, 40, char='1', fill=' ', bbox=bbox)], fill='.')
+        layers = [gj2ascii.render_labels(poly, 40, bbox=bbox),
+                  gj2ascii.render_labels(lines, 40, bbox=bbox)]
+    assert expected == gj2ascii.stack_labels(layers, ['0', '1'], fill='.')
+    assert gj2ascii.stack_labels([], []) == ''
+
+    with pytest.raises(ValueError):
+        gj2ascii.stack_labels(layers, ['0'])
+    with pytest.raises(ValueError):
+        gj2ascii.stack_labels(layers, ['0', 'too-long'])
+    with pytest.raises(ValueError):
+        gj2ascii.stack_labels([layers[0], layers[1][1:]], ['0', '1'])
+
+
+def test_render_max_cells(single_feature_wv_file):
+    with fio.open(single_feature_wv_file) as src:
+        features = list(src)
+        x_min, y_min, x_max, y_max = src.bounds
+    # A tall strip
+    bbox = (x_min, y_min, x_min + (x_max - x_min) / 10, y_max)
+    unbounded = gj2ascii.ascii2array(gj2ascii.render(features, 80, bbox=bbox))
+    assert len(unbounded) * len(unbounded[0]) > 500
+
+    rendered = gj2ascii.render(features, 80, bbox=bbox, max_cells=500)
+    rows = gj2ascii.ascii2array(rendered)
+    assert len(rows) * len(rows[0]) <= 500
+
+    # The widest grid that fits is used
+    _, _, (height, width) = gj2ascii.core._grid(None, 40, bbox, max_cells=500)
+    assert (height, width) == (len(rows), len(rows[0]))
+    _, _, (height, width) = gj2ascii.core._grid(None, width + 1, bbox)
+    assert height * width > 500
+
+    labels = gj2ascii.render_labels(features, 80, bbox=bbox, max_cells=500)
+    assert labels.shape == (len(rows), len(rows[0]))
+
+    # The budget is not used unless it is exceeded
+    assert gj2ascii.render(features, 80, bbox=bbox, max_cells=10 ** 6) == \
+        gj2ascii.render(features, 80, bbox=bbox)
+
+
+def test_render_aspect(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+    expected = gj2ascii.render(features, 40)
+    assert gj2ascii.render(features, 40, aspect=1.0) == expected
+    rows = len(expected.splitlines())
+    assert len(gj2ascii.render(features, 40, aspect=2).splitlines()) == rows // 2
+    labels = gj2ascii.render_labels(features, 40, aspect=0.5)
+    assert labels.shape in ((rows * 2, 20), (rows * 2 + 1, 20))
+
+
+def test_render_grid_exceptions(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+        x_min, y_min, x_max, y_max = src.bounds
+    for kwargs in ({'max_cells': 0}, {'aspect': 0}, {'aspect': -1}):
+        with pytest.raises(ValueError):
+            gj2ascii.render(features, 40, **kwargs)
+    # Too tall to fit in the budget at a width of 1
+    with pytest.raises(gj2ascii.MaxCellsError):
+        gj2ascii.render(features, 40, bbox=(x_min, y_min, x_min + 1, y_max), max_cells=10)
+
+
+def test_render_to_file_max_cells(poly_file):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'render.txt')
+        with fio.open(poly_file) as src:
+            expected = gj2ascii.render(src, 200, max_cells=300, aspect=1.5)
+            gj2ascii.render_to_file(src, path, 200, max_cells=300, aspect=1.5)
+        with open(path, 'rb') as f:
+            assert f.read().decode('ascii') == expected + os.linesep
+    finally:
+        shutil.rmtree(tmpdir)
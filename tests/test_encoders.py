@@ -0,0 +1,135 @@
+"""
+Unittests for gj2ascii.encoders
+"""
+
+
+import io
+import os
+import re
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii import encoders
+
+
+@pytest.fixture
+def layers(poly_file, line_file):
+    with fio.open(poly_file) as src:
+        bbox = src.bounds
+        polygons = gj2ascii.render_labels(src, 40, bbox=bbox)
+    with fio.open(line_file) as src:
+        lines = gj2ascii.render_labels(src, 40, bbox=bbox)
+    return [polygons, lines]
+
+
+def _strip_html(html):
+    html = re.sub(r'<style>.*</style>' + os.linesep, '', html, flags=re.S)
+    html = re.sub(r'</?(pre|span)[^>]*>', '', html)
+    return html.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+
+
+def test_text(layers):
+    expected = gj2ascii.stack_labels(layers, ['+', '-'], fill='.')
+    assert encoders.encode(layers, ['+', '-'], fill='.') == expected
+    assert encoders.encode(layers, ['+', '-'], 'text', fill='.') == expected
+
+
+def test_compact(layers):
+    text = encoders.encode(layers, ['+', '-'], fill='.')
+    compact = encoders.encode(layers, ['+', '-'], 'compact', fill='.')
+    assert compact == os.linesep.join(row[::2] for row in text.split(os.linesep))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_html(layers, compact):
+    fmt = 'compact' if compact else 'text'
+    html = encoders.encode(layers, ['<', '-'], 'html', compact=compact)
+    assert html.startswith('<pre class="gj2ascii">')
+    assert html.endswith('</pre>')
+    assert '<style>' not in html
+    assert _strip_html(html) == encoders.encode(layers, ['<', '-'], fmt)
+
+    # One span per run of each layer and none for fill
+    top = np.where(layers[1] != 0, 2, layers[0])
+    runs = sum(
+        int(v != 0) for row in top.tolist() for i, v in enumerate(row)
+        if i == 0 or row[i - 1] != v)
+    assert html.count('<span') == runs
+    assert 'class="gj2ascii-0"' not in html
+
+
+def test_html_style(layers):
+    html = encoders.encode(
+        layers, ['+', '-'], 'html', fill='.', css_class='map',
+        stylemap={'+': 'red', '.': 'blue', '-': ':+1:'})
+    assert html.startswith('<style>')
+    assert '.map .map-1 { color: red; background-color: red; }' in html
+    assert '.map .map-0 { color: blue; background-color: blue; }' in html
+    assert 'map-2 {' not in html
+    assert 'class="map-0"' in html
+    assert u'\U0001f44d' in html
+    assert '-' not in _strip_html(html)
+
+
+def test_npy(layers):
+    raw = encoders.encode(layers, ['+', '-'], 'npy')
+    assert isinstance(raw, bytes)
+    labels = np.load(io.BytesIO(raw))
+    assert np.array_equal(labels, np.where(layers[1] != 0, 2, layers[0]))
+
+
+def test_empty():
+    assert encoders.encode([], [], 'text') == ''
+    assert encoders.encode([], [], 'compact') == ''
+    assert encoders.encode([], [], 'html') == '<pre class="gj2ascii"></pre>'
+    assert np.load(io.BytesIO(encoders.encode([], [], 'npy'))).shape == (0, 0)
+
+
+def test_custom_encoder(layers, monkeypatch):
+    monkeypatch.setitem(encoders.ENCODERS, 'count', lambda labels, palette: len(palette))
+    assert encoders.encode(layers, ['+', '-'], 'count') == 3
+
+
+def test_exceptions(layers):
+    with pytest.raises(ValueError):
+        encoders.encode(layers, ['+', '-'], 'svg')
+    with pytest.raises(ValueError):
+        encoders.encode(layers, ['+'], 'html')
+    with pytest.raises(ValueError):
+        encoders.encode(layers, ['+', '--'], 'compact')
+
+
+def test_cli(runner, poly_file, line_file, layers, tmpdir):
+    args = [poly_file, line_file, '--width', '40', '-c', '+=red', '-c', '-', '--fill', '.']
+    result = runner.invoke(cli.main, args + ['--format', 'compact'])
+    assert result.exit_code == 0
+    assert result.output == encoders.encode(layers, ['+', '-'], 'compact', fill='.') + '\n'
+
+    result = runner.invoke(cli.main, args + ['--format', 'html'])
+    assert result.exit_code == 0
+    assert result.output == encoders.encode(
+        layers, ['+', '-'], 'html', fill='.', stylemap={'+': 'red'}) + '\n'
+    result = runner.invoke(cli.main, args + ['--format', 'html', '--no-style'])
+    assert '<style>' not in result.output
+
+    path = str(tmpdir.join('labels.npy'))
+    result = runner.invoke(cli.main, args + ['--format', 'npy', '-o', path])
+    assert result.exit_code == 0
+    assert np.array_equal(np.load(path), np.where(layers[1] != 0, 2, layers[0]))
+
+
+@pytest.mark.parametrize('args', [
+    ['--format', 'svg'],
+    ['--format', 'npy'],
+    ['--format', 'html', '--iterate', '--no-prompt'],
+    ['--format', 'html', '--tiles', '2x2'],
+    ['--format', 'html', '--density', 'linear'],
+    ['--format', 'html', '--glyphs', 'braille'],
+    ['--format', 'html', '--processes', '2']])
+def test_cli_exceptions(runner, poly_file, args):
+    result = runner.invoke(cli.main, [poly_file] + args)
+    assert result.exit_code != 0
@@ -0,0 +1,237 @@
+"""
+Unittests for gj2ascii.geobuffer
+"""
+
+
+import json
+import os
+import struct
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.geobuffer import GeometryBuffer
+from gj2ascii.geobuffer import sidecar
+
+
+@pytest.mark.parametrize('all_touched', [False, True])
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_render_matches_features(request, name, all_touched):
+    with fio.open(request.getfixturevalue(name)) as src:
+        features = list(src)
+    geometries = GeometryBuffer.from_features(features)
+    assert len(geometries) == len(features)
+    assert geometries.bounds == pytest.approx(gj2ascii.min_bbox(features))
+    for width in (10, 40, 200):
+        expected = gj2ascii.render(features, width, all_touched=all_touched)
+        assert gj2ascii.render(geometries, width, all_touched=all_touched) == expected
+
+
+def test_labels_reuse_polygons(monkeypatch, poly_file):
+    with fio.open(poly_file) as src:
+        geometries = GeometryBuffer.from_features(src)
+    expected = gj2ascii.render(geometries, 40)
+    calls = []
+    geometry = GeometryBuffer.geometry
+    monkeypatch.setattr(
+        GeometryBuffer, 'geometry', lambda self, idx: calls.append(idx) or geometry(self, idx))
+    assert gj2ascii.render(geometries, 40) == expected
+    assert gj2ascii.render(geometries, 80)
+    assert not calls
+
+
+def test_round_trip(poly_file, line_file, point_file):
+    for path in (poly_file, line_file, point_file):
+        with fio.open(path) as src:
+            expected = [f['geometry'] for f in src]
+        actual = list(GeometryBuffer.from_features(expected))
+        for e, a in zip(expected, actual):
+            assert e['type'] == a['type']
+            assert np.array_equal(
+                np.array(e['coordinates'], dtype=object).tolist(),
+                np.array(a['coordinates'], dtype=object).tolist())
+
+
+def test_multipart():
+    geometries = [
+        {'type': 'MultiPoint', 'coordinates': [(0, 0, 5), (1, 1, 5)]},
+        {'type': 'MultiLineString', 'coordinates': [[(0, 0), (1, 1)], [(2, 2), (3, 3)]]},
+        {'type': 'MultiPolygon', 'coordinates': [
+            [[(0, 0), (0, 1), (1, 1), (0, 0)]],
+            [[(2, 2), (2, 3), (3, 3), (2, 2)]]]},
+        {'type': 'Point', 'coordinates': (5, 5)}]
+    buf = GeometryBuffer.from_features(geometries)
+    assert len(buf) == 4
+    assert buf.bounds == (0, 0, 5, 5)
+    assert buf.geometry(0) == {'type': 'MultiPoint', 'coordinates': [[0, 0], [1, 1]]}
+    assert buf.geometry(2)['coordinates'][1] == [[[2, 2], [2, 3], [3, 3], [2, 2]]]
+    assert buf.geometry(3) == {'type': 'Point', 'coordinates': [5, 5]}
+    expected = gj2ascii.render(geometries, 20, bbox=(0, 0, 5, 5))
+    assert gj2ascii.render(buf, 20, bbox=(0, 0, 5, 5)) == expected
+
+    with pytest.raises(ValueError):
+        GeometryBuffer.from_features({'type': 'Curve', 'coordinates': []})
+
+
+def test_filter(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+        x_min, y_min, x_max, y_max = src.bounds
+    buf = GeometryBuffer.from_features(features)
+    bbox = (x_min, y_min, (x_min + x_max) / 2, (y_min + y_max) / 2)
+    filtered = buf.filter(bbox)
+    expected = [f['geometry'] for f in features
+                if gj2ascii.min_bbox(f)[0] <= bbox[2] and gj2ascii.min_bbox(f)[1] <= bbox[3]]
+    assert len(filtered) == len(expected)
+    assert [g['coordinates'] for g in filtered] == [
+        np.array(g['coordinates']).tolist() for g in expected]
+    assert len(buf.filter((0, 0, 1, 1))) == 0
+    assert len(buf.take([0, 0])) == 2
+
+
+def test_simplify(poly_file, line_file):
+    with fio.open(poly_file) as src:
+        buf = GeometryBuffer.from_features(src)
+    x_min, _, x_max, _ = buf.bounds
+    simplified = buf.simplify((x_max - x_min) / 10)
+    assert len(simplified) == len(buf)
+    assert len(simplified.coords) < len(buf.coords)
+    # Rings stay closed and valid
+    for geom in simplified:
+        for ring in geom['coordinates']:
+            assert len(ring) >= 4
+            assert ring[0] == ring[-1]
+    assert gj2ascii.render(buf.simplify(1e-9), 40) == gj2ascii.render(buf, 40)
+
+    with fio.open(line_file) as src:
+        buf = GeometryBuffer.from_features(src)
+    simplified = buf.simplify(1e9)
+    assert [len(g['coordinates']) for g in simplified] == [2] * len(buf)
+
+    with pytest.raises(ValueError):
+        buf.simplify(0)
+
+
+def test_exceptions():
+    with pytest.raises(ValueError):
+        GeometryBuffer([1], [0, 1], [0, 1], [0, 2], [(0, 0)])
+    buf = GeometryBuffer.from_features([])
+    assert len(buf) == 0
+    with pytest.raises(ValueError):
+        buf.bounds
+    with pytest.raises(ValueError):
+        gj2ascii.render(GeometryBuffer.from_features(
+            {'type': 'Point', 'coordinates': (0, 0)}), 20, bbox=(0, 0, 1, 1), density='linear')
+
+
+def test_save_load(tmp_poly_file, line_file, tmpdir):
+    with fio.open(tmp_poly_file) as src:
+        geometries = GeometryBuffer.from_features(src)
+    path = sidecar(tmp_poly_file)
+    geometries.save(path, source=tmp_poly_file)
+    loaded = GeometryBuffer.load(path)
+    for name in ('types', 'geom_offsets', 'part_offsets', 'ring_offsets', 'coords'):
+        assert np.array_equal(getattr(loaded, name), getattr(geometries, name))
+    assert np.array_equal(loaded.geometry_bounds, geometries.geometry_bounds, equal_nan=True)
+    assert gj2ascii.render(loaded, 40) == gj2ascii.render(geometries, 40)
+    assert not loaded.coords.flags.writeable
+    assert not loaded.is_stale(tmp_poly_file)
+
+    with open(tmp_poly_file, 'a') as f:
+        f.write(' ')
+    assert loaded.is_stale(tmp_poly_file)
+
+    # Empty buffers and buffers without a source
+    path = str(tmpdir.join('empty.geometries'))
+    GeometryBuffer.from_features([]).save(path)
+    loaded = GeometryBuffer.load(path)
+    assert len(loaded) == 0
+    assert loaded.signature is None
+    assert loaded.is_stale(line_file)
+
+
+def test_save_load_long_signature(tmpdir):
+    # Directory datasources have a signature entry for every file, which
+    # pushes the array offsets further than the header's first estimate
+    geometries = GeometryBuffer.from_features([{'type': 'Point', 'coordinates': (1, 2)}])
+    for count in (10, 50, 500):
+        geometries.signature = tuple(1700000000.123456 + i for i in range(count))
+        path = str(tmpdir.join('long%s.geometries' % count))
+        geometries.save(path)
+        loaded = GeometryBuffer.load(path)
+        assert loaded.signature == geometries.signature
+        for name in ('types', 'geom_offsets', 'part_offsets', 'ring_offsets', 'coords'):
+            assert np.array_equal(getattr(loaded, name), getattr(geometries, name))
+
+
+def test_load_invalid(poly_file, tmpdir):
+    path = str(tmpdir.join('invalid.geometries'))
+    with open(path, 'wb') as f:
+        f.write(b'not a sidecar')
+    with pytest.raises(ValueError):
+        GeometryBuffer.load(path)
+    with pytest.raises(ValueError):
+        GeometryBuffer.load(poly_file)
+
+
+def test_load_corrupt(tmp_poly_file, tmpdir):
+    with fio.open(tmp_poly_file) as src:
+        geometries = GeometryBuffer.from_features(src)
+    path = str(tmpdir.join('valid.geometries'))
+    geometries.save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    size = 16 + struct.unpack('<Q', data[8:16])[0]
+    header = json.loads(data[16:size].decode('utf-8'))
+    header['arrays']['coords'] = 'bad'
+
+    for corrupt in (
+            data[:12],                          # Truncated header size
+            data[:size // 2],                   # Truncated header
+            data[:16] + b'\xff' * (size - 16),  # Undecodable header
+            data[:8] + struct.pack('<Q', 2) + b'[]',
+            data[:8] + struct.pack('<Q', 2) + b'{}',
+            data[:-8],                          # Truncated arrays
+            data[:8] + struct.pack('<Q', len(json.dumps(header)))
+            + json.dumps(header).encode('utf-8')):
+        path = str(tmpdir.join('corrupt.geometries'))
+        with open(path, 'wb') as f:
+            f.write(corrupt)
+        with pytest.raises(ValueError):
+            GeometryBuffer.load(path)
+
+
+def test_sidecar():
+    assert sidecar('data.shp') == 'data.shp.geometries'
+    assert sidecar('data', 'roads') == 'data.roads.geometries'
+
+
+def test_cli(runner, tmp_poly_file):
+    expected = runner.invoke(cli.main, [tmp_poly_file, '--width', '40'])
+    args = [tmp_poly_file, '--width', '40', '--geometry-cache']
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert result.output == expected.output
+    path = sidecar(tmp_poly_file, 'polygons')
+    assert os.path.exists(path)
+
+    # Cached geometries are used when the datasource has not changed
+    mtime = os.path.getmtime(path)
+    cached = runner.invoke(cli.main, args)
+    assert cached.output == expected.output
+    assert os.path.getmtime(path) == mtime
+
+    # A corrupt or truncated cache is rebuilt
+    with open(path, 'rb') as f:
+        data = f.read()
+    for corrupt in (b'corrupt', data[:12], data[:20]):
+        with open(path, 'wb') as f:
+            f.write(corrupt)
+        assert runner.invoke(cli.main, args).output == expected.output
+        assert GeometryBuffer.load(path).signature is not None
+
+    for extra in (['--iterate'], ['--pyramid'], ['--dst-crs', 'EPSG:4326']):
+        assert runner.invoke(cli.main, args + extra).exit_code != 0
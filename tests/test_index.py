@@ -0,0 +1,229 @@
+"""
+Unittests for gj2ascii.index
+"""
+
+
+import json
+import os
+import shutil
+
+import fiona as fio
+import numpy as np
+import pytest
+from shapely.geometry import asShape
+
+from gj2ascii import cli
+from gj2ascii.index import FeatureIndex
+from gj2ascii.index import _geojson_positions
+from gj2ascii.index import sidecar
+
+
+@pytest.fixture
+def mixed_types_file(tmpdir):
+    """
+    A float field with an integer value, a string field with a number, and
+    a boolean field, which fiona converts based on the layer's schema.
+    """
+    path = str(tmpdir.join('mixed.geojson'))
+    values = [
+        {'f': 2.5, 'i': 1, 's': 'a', 'm': 'x', 'b': True},
+        {'f': 2, 'i': 2, 's': None, 'm': 3, 'b': False}]
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': p,
+             'geometry': {'type': 'Point', 'coordinates': [i, i]}}
+            for i, p in enumerate(values)]}, f)
+    return path
+
+
+def _half_bbox(src):
+    x_min, y_min, x_max, y_max = src.bounds
+    return x_min, y_min, (x_min + x_max) / 2, (y_min + y_max) / 2
+
+
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_build_geojson(request, name):
+    path = request.getfixturevalue(name)
+    with fio.open(path) as src:
+        index = FeatureIndex.build(src, source=path)
+        features = list(src)
+    assert len(index) == len(features)
+    assert index.positions is not None
+    assert index.fields == list(features[0]['properties'].keys())
+    assert np.allclose(index.bounds, [asShape(f['geometry']).bounds for f in features])
+
+    # Features read from their byte range match features read by fiona
+    for expected, actual in zip(features, index.read(range(len(index)), path=path)):
+        assert actual['id'] == expected['id']
+        assert actual['properties'] == expected['properties']
+        assert asShape(actual['geometry']).equals(asShape(expected['geometry']))
+
+
+def test_read_matches_schema(mixed_types_file):
+    with fio.open(mixed_types_file) as src:
+        index = FeatureIndex.build(src, source=mixed_types_file)
+        expected = [dict(f['properties']) for f in src]
+    assert index.positions is not None
+    actual = [dict(f['properties']) for f in index.read(range(2), path=mixed_types_file)]
+    assert actual == expected
+    assert [[type(v) for v in p.values()] for p in actual] == \
+        [[type(v) for v in p.values()] for p in expected]
+
+    # Indexes saved without field types read features with fiona
+    path = sidecar(mixed_types_file)
+    index.save(path)
+    assert FeatureIndex.load(path).field_types == index.field_types
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files if k != 'field_types'}
+    np.savez_compressed(path, **arrays)
+    assert FeatureIndex.load(path).positions is None
+
+
+def test_build_shapefile(multilayer_file):
+    with fio.open(multilayer_file, layer='polygons') as src:
+        index = FeatureIndex.build(src, source=multilayer_file)
+        assert index.positions is None
+        expected = [src[i] for i in (4, 1)]
+        actual = list(index.read([4, 1], src=src))
+    assert [f['id'] for f in actual] == [f['id'] for f in expected]
+    with pytest.raises(ValueError):
+        list(index.read([0], path=multilayer_file))
+
+
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_select_matches_filter(request, name):
+    path = request.getfixturevalue(name)
+    with fio.open(path) as src:
+        index = FeatureIndex.build(src, source=path)
+        bbox = _half_bbox(src)
+        expected = [f['id'] for f in src.filter(bbox=bbox)]
+        assert [f['id'] for f in index.read(index.select(bbox), src=src, bbox=bbox)] == expected
+    assert [f['id'] for f in index.read(index.select(bbox), path=path, bbox=bbox)] == expected
+    assert list(index.select()) == list(range(len(index)))
+    assert list(index.select(start=2)) == list(range(2, len(index)))
+    assert all(o >= 3 for o in index.select(bbox, start=3))
+
+
+def test_not_a_feature_collection(tmpdir):
+    path = str(tmpdir.join('feature.geojson'))
+    with open(path, 'w') as f:
+        json.dump({
+            'type': 'Feature',
+            'properties': {'name': 'point'},
+            'geometry': {'type': 'Point', 'coordinates': [1, 2]}}, f)
+    with fio.open(path) as src:
+        index = FeatureIndex.build(src, source=path)
+    assert len(index) == 1
+    assert index.positions is None
+    assert tuple(index.bounds[0]) == (1, 2, 1, 2)
+
+
+def test_geojson_positions(tmpdir):
+    # Brackets in strings, non-ASCII text, and whitespace between features
+    path = str(tmpdir.join('tricky.geojson'))
+    features = [
+        {'type': 'Feature', 'properties': {'name': u'[{caf\xe9}] "q"'},
+         'geometry': {'type': 'Point', 'coordinates': [i, i]}}
+        for i in range(3)]
+    text = json.dumps({'type': 'FeatureCollection', 'features': features},
+                      ensure_ascii=False, indent=2)
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+    positions = _geojson_positions(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert [json.loads(data[start:stop].decode('utf-8')) for start, stop in positions] \
+        == features
+
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8')[:-20])
+    assert _geojson_positions(path) is None
+    open(path, 'w').close()
+    assert _geojson_positions(path) is None
+
+
+def test_save_load(tmp_poly_file):
+    with fio.open(tmp_poly_file) as src:
+        index = FeatureIndex.build(src, source=tmp_poly_file)
+    path = sidecar(tmp_poly_file)
+    index.save(path)
+    loaded = FeatureIndex.load(path)
+    assert np.array_equal(loaded.fids, index.fids)
+    assert np.array_equal(loaded.bounds, index.bounds)
+    assert np.array_equal(loaded.positions, index.positions)
+    assert loaded.fields == index.fields
+    assert not loaded.is_stale(tmp_poly_file)
+
+    with open(tmp_poly_file, 'a') as f:
+        f.write(' ')
+    assert loaded.is_stale(tmp_poly_file)
+
+    FeatureIndex(index.fids, index.bounds).save(path)
+    assert FeatureIndex.load(path).positions is None
+
+
+def test_sidecar():
+    assert sidecar('data.shp') == 'data.shp.index.npz'
+    assert sidecar('data', 'roads') == 'data.roads.index.npz'
+
+
+def test_exceptions():
+    with pytest.raises(ValueError):
+        FeatureIndex([0, 1], [(0, 0, 1, 1)])
+    with pytest.raises(ValueError):
+        FeatureIndex([0], [(0, 0, 1, 1)], positions=[(0, 1), (1, 2)])
+    with pytest.raises(ValueError):
+        FeatureIndex([0], [(0, 0, 1, 1)], fields=['a'], field_types=['str', 'int'])
+
+
+def test_cli(runner, tmp_poly_file):
+    with fio.open(tmp_poly_file) as src:
+        bbox = [str(b) for b in _half_bbox(src)]
+    args = [tmp_poly_file, '--iterate', '--no-prompt', '--width', '20', '--bbox'] + bbox
+    expected = runner.invoke(cli.main, args)
+    assert expected.exit_code == 0
+    result = runner.invoke(cli.main, args + ['--feature-index'])
+    assert result.exit_code == 0
+    assert result.output == expected.output
+    assert os.path.exists(sidecar(tmp_poly_file, 'polygons'))
+    cached = runner.invoke(cli.main, args + ['--feature-index'])
+    assert cached.output == expected.output
+
+
+def test_cli_jump(runner, point_file, tmpdir):
+    path = str(tmpdir.join('points.geojson'))
+    shutil.copy(point_file, path)
+    bbox = ['250000', '4350000', '300000', '4400000']
+    args = [path, '--iterate', '--width', '10', '--properties', 'ID', '--bbox'] + bbox
+    result = runner.invoke(cli.main, args + ['--feature-index'], input='\n50\n\nq\n')
+    assert result.exit_code != 0
+    with fio.open(path) as src:
+        index = FeatureIndex.build(src)
+    ids = [index.fids[o] for o in index.select(tuple(float(b) for b in bbox))]
+    jumped = [i for i in ids if i >= 50]
+    expected = [ids[0], ids[1], jumped[0], jumped[1]]
+    assert [int(l.split('|')[2]) for l in result.output.splitlines() if '| ID' in l] == expected
+    assert "feature number" in result.output
+
+    # Without an index a number exits
+    result = runner.invoke(cli.main, args, input='50\n')
+    assert result.exit_code != 0
+    assert result.output.count('| ID') == 1
+
+
+def test_cli_exceptions(runner, poly_file):
+    result = runner.invoke(cli.main, [poly_file, '--feature-index'])
+    assert result.exit_code != 0
+    assert '--iterate' in result.output
+    result = runner.invoke(cli.main, ['-', '--iterate', '--no-prompt', '--feature-index'])
+    assert result.exit_code != 0
+
+
+def test_cli_properties(runner, mixed_types_file):
+    args = [mixed_types_file, '--iterate', '--no-prompt', '--properties', '%all',
+            '--bbox', '-1', '-1', '2', '2']
+    expected = runner.invoke(cli.main, args)
+    result = runner.invoke(cli.main, args + ['--feature-index'])
+    assert result.exit_code == 0
+    assert '2.0' in result.output
+    assert result.output == expected.output
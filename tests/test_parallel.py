@@ -0,0 +1,111 @@
+"""
+Unittests for gj2ascii.parallel
+"""
+
+
+import pickle
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii import parallel
+
+
+@pytest.mark.parametrize('processes,shards', [(1, None), (1, 100), (2, 3)])
+@pytest.mark.parametrize('all_touched', [True, False])
+def test_matches_render(poly_file, processes, shards, all_touched):
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 40, fill='.', all_touched=all_touched)
+    actual = parallel.render_sharded(
+        poly_file, 40, fill='.', all_touched=all_touched, processes=processes, shards=shards)
+    assert expected == actual
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_without_shared_memory(monkeypatch, runner, poly_file, line_file, processes):
+    # Older versions of Python fall back to a `RawArray()` shared with the
+    # workers when they are created
+    monkeypatch.setattr(parallel, 'shared_memory', None)
+    monkeypatch.setattr(cli, 'shared_memory', None)
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 40, fill='.')
+    assert expected == parallel.render_sharded(poly_file, 40, fill='.', processes=processes)
+
+    args = [poly_file, line_file, '--width', '40']
+    result = runner.invoke(cli.main, args + ['--processes', str(processes)])
+    assert result.exit_code == 0
+    assert result.output == runner.invoke(cli.main, args).output
+
+
+def test_bbox(line_file, small_aoi_poly_line_file):
+    with fio.open(small_aoi_poly_line_file) as src:
+        bbox = src.bounds
+    with fio.open(line_file) as src:
+        expected = gj2ascii.render(src, 20, bbox=bbox)
+    assert expected == parallel.render_sharded(line_file, 20, bbox=bbox, processes=2)
+
+
+def test_shards():
+    assert parallel._shards(10, 3) == [(0, 4), (4, 8), (8, 10)]
+    assert parallel._shards(2, 8) == [(0, 1), (1, 2)]
+    assert parallel._shards(0, 4) == []
+
+
+def test_exceptions(poly_file):
+    with pytest.raises(ValueError):
+        parallel.render_sharded('-')
+    with pytest.raises(ValueError):
+        parallel.render_sharded(poly_file, processes=-1)
+    with pytest.raises(ValueError):
+        parallel.render_sharded(poly_file, fill='too-long')
+
+
+@pytest.mark.parametrize('layers', [['poly'], ['poly', 'line']])
+def test_cli(runner, poly_file, line_file, layers):
+    paths = {'poly': poly_file, 'line': line_file}
+    args = [paths[l] for l in layers] + ['--width', '40']
+    expected = runner.invoke(cli.main, args)
+    actual = runner.invoke(cli.main, args + ['--processes', '2'])
+    assert actual.exit_code == 0
+    assert expected.output == actual.output
+
+
+def test_shared_labels_pickle():
+    with parallel.SharedLabels((3, 4)) as shared:
+        assert not shared.array.any()
+        attached = pickle.loads(pickle.dumps(shared))
+        assert attached.name == shared.name
+        attached.array[1, 2] = 1
+        attached.close()
+        assert shared.array[1, 2] == 1
+    assert shared.array is None
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_render_layers(poly_file, line_file, processes):
+    layers = [{'path': poly_file, 'char': '0'},
+              {'path': line_file, 'char': '1', 'all_touched': True}]
+    with fio.open(poly_file) as poly, fio.open(line_file) as lines:
+        coords = list(poly.bounds) + list(lines.bounds)
+        bbox = (min(coords[0::4]), min(coords[1::4]), max(coords[2::4]), max(coords[3::4]))
+        expected = gj2ascii.stack([
+            gj2ascii.render(poly, 40, char='0', fill=' ', bbox=bbox),
+            gj2ascii.render(lines, 40, char='1', fill=' ', all_touched=True, bbox=bbox)],
+            fill='.')
+    assert expected == parallel.render_layers(layers, 40, fill='.', processes=processes)
+
+
+def test_max_cells_aspect(poly_file, line_file):
+    kwargs = {'max_cells': 200, 'aspect': 1.3}
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 80, **kwargs)
+    assert parallel.render_sharded(poly_file, 80, processes=1, **kwargs) == expected
+    with fio.open(poly_file) as poly, fio.open(line_file) as lines:
+        expected = gj2ascii.render_multiple([(poly, '+'), (lines, '-')], 80, **kwargs)
+    actual = parallel.render_layers([
+        {'path': poly_file, 'char': '+'}, {'path': line_file, 'char': '-'}],
+        80, processes=1, **kwargs)
+    assert actual == expected
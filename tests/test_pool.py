@@ -0,0 +1,124 @@
+"""
+Unittests for gj2ascii.pool
+"""
+
+
+import os
+import shutil
+import tempfile
+import threading
+
+import fiona as fio
+import pytest
+
+import gj2ascii
+from gj2ascii.pool import DatasourcePool
+
+
+def test_reuse(poly_file):
+    pool = DatasourcePool()
+    with pool.open(poly_file) as src1:
+        bounds = src1.bounds
+    with pool.open(poly_file) as src2:
+        assert src2 is src1
+        assert src2.bounds == bounds
+        assert not src2.closed
+    stats = pool.stats()
+    assert stats['opens'] == 1
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+    assert len(pool) == 1
+    pool.close()
+    assert src1.closed
+    assert len(pool) == 0
+
+
+def test_keyed_by_layer(multilayer_file):
+    with DatasourcePool() as pool:
+        with pool.open(multilayer_file, layer='polygons') as poly, \
+                pool.open(multilayer_file, layer='lines') as lines:
+            assert poly is not lines
+            assert poly.name == 'polygons'
+            assert lines.name == 'lines'
+        assert pool.stats()['opens'] == 2
+
+
+def test_eviction(poly_file, line_file, point_file):
+    pool = DatasourcePool(maxsize=2)
+    for path in (poly_file, line_file, point_file):
+        with pool.open(path) as src:
+            handle = src if path == poly_file else handle
+    assert handle.closed
+    assert len(pool) == 2
+    assert pool.stats()['evictions'] == 1
+    with pytest.raises(ValueError):
+        DatasourcePool(maxsize=0)
+
+
+def test_in_use_handle_not_shared(poly_file):
+    pool = DatasourcePool()
+    with pool.open(poly_file) as src1:
+        with pool.open(poly_file) as src2:
+            assert src1 is not src2
+        assert src2.closed
+        assert not src1.closed
+    assert len(pool) == 1
+
+
+def test_stale_handle(poly_file):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'polygons.geojson')
+        shutil.copy(poly_file, path)
+        pool = DatasourcePool()
+        with pool.open(path) as src1:
+            pass
+        with open(path, 'a') as f:
+            f.write(os.linesep)
+        with pool.open(path) as src2:
+            assert src2 is not src1
+        assert src1.closed
+        assert pool.stats()['opens'] == 2
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_listlayers(multilayer_file):
+    pool = DatasourcePool()
+    assert sorted(pool.listlayers(multilayer_file)) == sorted(fio.listlayers(multilayer_file))
+    pool.listlayers(multilayer_file)
+    assert pool.stats()['hits'] == 1
+
+
+def test_threads(poly_file):
+    pool = DatasourcePool(maxsize=2)
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 20)
+    results = []
+
+    def _render():
+        for _ in range(5):
+            with pool.open(poly_file) as src:
+                results.append(gj2ascii.render(src, 20))
+
+    threads = [threading.Thread(target=_render) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [expected] * 20
+    assert len(pool) == 1
+
+
+def test_ignore_fields(multilayer_file, single_feature_wv_file):
+    with DatasourcePool() as pool:
+        with pool.open(multilayer_file, layer='polygons', ignore_fields=['FID']) as src:
+            assert 'FID' not in next(iter(src))['properties']
+        with pool.open(multilayer_file, layer='polygons') as src:
+            assert 'FID' in next(iter(src))['properties']
+        assert pool.stats()['opens'] == 2
+
+        # The GeoJSON driver can't skip fields so they are all read
+        with pool.open(single_feature_wv_file, ignore_fields=['NAME']) as src:
+            assert 'NAME' in next(iter(src))['properties']
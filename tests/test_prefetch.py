@@ -0,0 +1,106 @@
+"""
+Unittests for gj2ascii.prefetch
+"""
+
+
+import threading
+import time
+
+from click.testing import CliRunner
+import pytest
+
+from gj2ascii import cli
+from gj2ascii.prefetch import Prefetcher
+
+
+def _wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_order():
+    with Prefetcher(range(100), size=3) as items:
+        assert list(items) == list(range(100))
+    assert list(Prefetcher([])) == []
+
+
+def test_look_ahead():
+    produced = []
+
+    def _gen():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    with Prefetcher(_gen(), size=3) as items:
+        # The queue fills and the producer blocks with one more item in hand
+        assert _wait_for(lambda: len(produced) == 4)
+        time.sleep(0.1)
+        assert len(produced) == 4
+        assert next(items) == 0
+        assert _wait_for(lambda: len(produced) == 5)
+
+
+def test_close():
+    closed = threading.Event()
+
+    def _gen():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    items = Prefetcher(_gen(), size=2)
+    assert next(items) == 0
+    items.close()
+    assert closed.is_set()
+    assert not items._thread.is_alive()
+    with pytest.raises(StopIteration):
+        next(items)
+
+
+def test_exceptions():
+
+    def _gen():
+        yield 1
+        raise RuntimeError("broken")
+
+    items = Prefetcher(_gen())
+    assert next(items) == 1
+    with pytest.raises(RuntimeError):
+        next(items)
+    with pytest.raises(StopIteration):
+        next(items)
+    items.close()
+
+    with pytest.raises(ValueError):
+        Prefetcher([], size=0)
+
+
+@pytest.mark.parametrize('prefetch', ['0', '1', '3'])
+def test_cli(monkeypatch, poly_file, prefetch):
+    prefetchers = []
+
+    class _Prefetcher(Prefetcher):
+        def __init__(self, *args, **kwargs):
+            super(_Prefetcher, self).__init__(*args, **kwargs)
+            prefetchers.append(self)
+
+    monkeypatch.setattr(cli, 'Prefetcher', _Prefetcher)
+    runner = CliRunner(mix_stderr=False)
+    args = [poly_file, '--iterate', '--width', '20']
+    pages = runner.invoke(cli.main, args + ['--no-prompt']).stdout.split('\n\n')
+    result = runner.invoke(cli.main, args + ['--prefetch', prefetch], input='\n\nq\n')
+    assert result.exit_code != 0
+
+    # Answers to the prompt are echoed to stdout
+    def _lines(text):
+        return [l for l in text.splitlines() if l.strip() and l != 'q']
+
+    assert _lines(result.stdout) == _lines('\n'.join(pages[:3]))
+    assert 'Press enter' in result.stderr
+    assert len(prefetchers) == (prefetch != '0')
+    assert not any(p._thread.is_alive() for p in prefetchers)
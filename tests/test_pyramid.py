@@ -0,0 +1,154 @@
+"""
+Unittests for gj2ascii.pyramid
+"""
+
+
+import os
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.pyramid import Pyramid
+from gj2ascii.pyramid import sidecar
+
+
+@pytest.mark.parametrize('all_touched', [True, False])
+def test_matches_render_on_level_grid(poly_file, all_touched):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=64, levels=4, all_touched=all_touched)
+        for level in pyramid.levels:
+            expected = gj2ascii.render(
+                src, width=2 * level.shape[1], fill='.', all_touched=all_touched)
+            actual = gj2ascii.render(
+                pyramid, width=2 * level.shape[1], fill='.', all_touched=all_touched)
+            assert expected == actual
+
+
+def test_level_selection(poly_file):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=64, levels=3)
+    x_min, _, x_max, _ = pyramid.bounds
+    cell = (x_max - x_min) / 64
+    assert pyramid.level(cell) == 0
+    assert pyramid.level(cell * 3) == 1
+    assert pyramid.level(cell * 100) == 2
+    assert pyramid.level(cell / 10) == 0
+
+
+def test_resample_zoomed(poly_file, compare_ascii):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=256, levels=3)
+        x_min, y_min, x_max, y_max = src.bounds
+        bbox = (x_min, y_min, (x_min + x_max) / 2, (y_min + y_max) / 2)
+        expected = gj2ascii.ascii2array(gj2ascii.render(src, 40, bbox=bbox), as_ndarray=True)
+    actual = gj2ascii.ascii2array(gj2ascii.render(pyramid, 40, bbox=bbox), as_ndarray=True)
+    assert expected.shape == actual.shape
+    # Resampled renderings are close to but not necessarily identical to the original
+    assert (expected != actual).mean() < 0.05
+
+
+def test_outside_bounds_is_empty(poly_file):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=64, levels=2)
+    x_min, y_min, x_max, y_max = pyramid.bounds
+    dx = x_max - x_min
+    bbox = (x_max + dx, y_min, x_max + 2 * dx, y_max)
+    for all_touched in (True, False):
+        pyramid.all_touched = all_touched
+        assert set(gj2ascii.render(pyramid, 20, bbox=bbox, all_touched=all_touched)) <= \
+            set(' ' + os.linesep)
+
+
+def test_save_load(tmp_poly_file):
+    with fio.open(tmp_poly_file) as src:
+        pyramid = Pyramid.build(src, width=32, levels=3, source=tmp_poly_file)
+    path = sidecar(tmp_poly_file)
+    pyramid.save(path)
+    loaded = Pyramid.load(path)
+    assert loaded.bounds == pyramid.bounds
+    assert loaded.all_touched == pyramid.all_touched
+    assert all(np.array_equal(a, b) for a, b in zip(loaded.levels, pyramid.levels))
+    assert not loaded.is_stale(tmp_poly_file)
+
+    with open(tmp_poly_file, 'a') as f:
+        f.write(' ')
+    assert loaded.is_stale(tmp_poly_file)
+
+
+def test_sidecar():
+    assert sidecar('data.shp') == 'data.shp.pyramid.npz'
+    assert sidecar('data', 'roads') == 'data.roads.pyramid.npz'
+
+    # Every CRS gets its own file
+    crs = sidecar('data.shp', crs='EPSG:4326')
+    assert crs.startswith('data.shp.crs-') and crs.endswith('.pyramid.npz')
+    assert crs == sidecar('data.shp', crs='EPSG:4326')
+    assert crs != sidecar('data.shp', crs='EPSG:3857')
+    assert sidecar('data.shp', crs={'init': 'epsg:4326', 'no_defs': True}) == \
+        sidecar('data.shp', crs={'no_defs': True, 'init': 'epsg:4326'})
+
+
+def test_sidecar_read_only(monkeypatch, tmpdir):
+    # Sidecars for datasources in directories that are not writable go to
+    # a per-user cache directory
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    monkeypatch.setattr(os, 'access', lambda path, mode: False)
+    path = sidecar(os.path.join('a', 'data.shp'), 'roads')
+    assert os.path.dirname(path) == str(tmpdir.join('gj2ascii'))
+    assert os.path.isdir(os.path.dirname(path))
+    assert path.endswith('-data.shp.roads.pyramid.npz')
+    assert path != sidecar(os.path.join('b', 'data.shp'), 'roads')
+
+
+def test_exceptions(poly_file):
+    with fio.open(poly_file) as src:
+        with pytest.raises(ValueError):
+            Pyramid.build(src, width=4, levels=4)
+        with pytest.raises(ValueError):
+            Pyramid.build(src, width=0)
+        pyramid = Pyramid.build(src, width=16, levels=1)
+    with pytest.raises(ValueError):
+        gj2ascii.render(pyramid, 20, all_touched=True)
+    with pytest.raises(ValueError):
+        gj2ascii.render(pyramid, 20, density='linear')
+    with pytest.raises(ValueError):
+        Pyramid([], (0, 0, 1, 1))
+
+
+def test_cli(runner, tmp_poly_file, compare_ascii):
+    args = [tmp_poly_file, '--width', '40', '--pyramid']
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert os.path.exists(sidecar(tmp_poly_file, 'polygons'))
+    cached = runner.invoke(cli.main, args)
+    assert cached.output == result.output
+
+    result = runner.invoke(cli.main, args + ['--crs', 'EPSG:3857'])
+    assert result.exit_code == 0
+    assert os.path.exists(sidecar(tmp_poly_file, 'polygons', crs='EPSG:3857'))
+    assert runner.invoke(cli.main, args + ['--iterate']).exit_code != 0
+
+
+def test_save_atomic(tmpdir):
+    path = str(tmpdir.join('pyramid.npz'))
+    pyramid = Pyramid([np.zeros((4, 4), dtype=np.uint32)], (0, 0, 4, 4))
+    pyramid.save(path)
+    assert not os.path.exists(path + '.tmp')
+    assert Pyramid.load(path).bounds == (0, 0, 4, 4)
+
+
+def test_cli_unreadable_sidecar(runner, tmp_poly_file):
+    args = [tmp_poly_file, '--width', '40', '--pyramid']
+    expected = runner.invoke(cli.main, args)
+    path = sidecar(tmp_poly_file, 'polygons')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert result.output == expected.output
+    assert Pyramid.load(path).levels
@@ -0,0 +1,102 @@
+"""
+Unittests for gj2ascii.reproject
+"""
+
+
+import os
+import shutil
+import tempfile
+
+import fiona as fio
+from fiona.transform import transform_geom
+import numpy as np
+import pytest
+from shapely.geometry import asShape
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.reproject import _transformer
+from gj2ascii.reproject import reproject
+from gj2ascii.reproject import transform_bounds
+
+
+@pytest.fixture(scope='function')
+def tempdir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def _coords(geom):
+    return np.array(asShape(geom).envelope.exterior.coords if geom['type'] != 'Point'
+                    else [geom['coordinates']])
+
+
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_matches_fiona(request, name):
+    with fio.open(request.getfixturevalue(name)) as src:
+        features = list(src)
+        crs = src.crs
+    actual = list(reproject(features, crs, 'EPSG:4326', batch_size=3))
+    assert len(actual) == len(features)
+    for feature, reprojected in zip(features, actual):
+        expected = transform_geom(crs, 'EPSG:4326', feature['geometry'])
+        assert reprojected['properties'] == feature['properties']
+        assert reprojected['geometry']['type'] == expected['type']
+        assert np.allclose(_coords(reprojected['geometry']), _coords(expected))
+
+
+def test_geometries():
+    collection = {
+        'type': 'GeometryCollection',
+        'geometries': [
+            {'type': 'Point', 'coordinates': (500000, 0, 10)},
+            {'type': 'LineString', 'coordinates': [(500000, 0), (500000, 1000)]}]}
+    output = list(reproject(collection, 'EPSG:32618', 'EPSG:4326'))
+    assert len(output) == 1
+    point, line = output[0]['geometries']
+    assert point['coordinates'] == pytest.approx((-75, 0))
+    assert len(line['coordinates']) == 2
+
+    feature = {'type': 'Feature', 'properties': {}, 'geometry': None}
+    assert list(reproject([feature], 'EPSG:32618', 'EPSG:4326')) == [feature]
+
+
+def test_transformer_cache():
+    assert _transformer('EPSG:32618', 'EPSG:4326') is _transformer('EPSG:32618', 'EPSG:4326')
+
+
+def test_transform_bounds(poly_file):
+    with fio.open(poly_file) as src:
+        bbox = transform_bounds(src.crs, 'EPSG:4326', src.bounds)
+        reprojected = list(reproject(src, src.crs, 'EPSG:4326'))
+    x_min, y_min, x_max, y_max = gj2ascii.min_bbox(reprojected)
+    assert bbox[0] <= x_min and bbox[1] <= y_min and bbox[2] >= x_max and bbox[3] >= y_max
+
+
+def test_cli_mixed_crs(runner, poly_file, line_file, tempdir):
+    # Write a copy of the lines in another CRS
+    path = os.path.join(tempdir, 'lines-4326.geojson')
+    with fio.open(line_file) as src:
+        meta = src.meta
+        meta.update(crs='EPSG:4326')
+        meta.pop('crs_wkt', None)
+        features = list(reproject(src, src.crs, 'EPSG:4326'))
+        with fio.open(path, 'w', **meta) as dst:
+            dst.writerecords(features)
+    with fio.open(poly_file) as src:
+        bbox = [str(b) for b in src.bounds]
+
+    expected = runner.invoke(cli.main, [poly_file, line_file, '-w', '40', '--bbox'] + bbox)
+    actual = runner.invoke(cli.main, [
+        poly_file, path, '-w', '40', '--dst-crs', 'EPSG:26918', '--bbox'] + bbox)
+    assert actual.exit_code == 0
+    assert expected.output == actual.output
+
+    result = runner.invoke(cli.main, [
+        path, '--iterate', '--no-prompt', '--dst-crs', 'EPSG:26918', '-w', '20'])
+    assert result.exit_code == 0
+    assert '+' in result.output
+
+    result = runner.invoke(cli.main, [path, '--dst-crs', 'EPSG:26918', '--processes', '2'])
+    assert result.exit_code != 0
@@ -0,0 +1,139 @@
+"""
+Unittests for gj2ascii.server
+"""
+
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import fiona as fio
+import pytest
+from click.testing import CliRunner
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii import server
+
+
+def test_handle(poly_file, compare_ascii):
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render(src, 20)
+    cache = server.RenderCache()
+    payload = {'args': [poly_file, '--width', '20'], 'cwd': os.getcwd()}
+    response = server._handle(cli.main, payload, cache)
+    assert response['exit_code'] == 0
+    assert compare_ascii(response['output'], expected)
+
+    # Second request is served from the cache
+    assert server._handle(cli.main, payload, cache) is response
+
+
+def test_handle_error(poly_file):
+    response = server._handle(cli.main, {'args': [poly_file, '-c', 'toolong']}, None)
+    assert response['exit_code'] != 0
+    assert 'must be a single character' in response['output']
+
+    line = server._handle_line(cli.main, 'not json', None)
+    assert json.loads(line)['exit_code'] != 0
+
+
+def test_render_cache_invalidation(poly_file):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'polygons.geojson')
+        shutil.copy(poly_file, path)
+        cache = server.RenderCache(maxsize=1)
+        cache.set('key', [path], {'output': 'cached'})
+        assert cache.get('key', [path]) == {'output': 'cached'}
+
+        with open(path, 'a') as f:
+            f.write(' ')
+        assert cache.get('key', [path]) is None
+
+        # Oldest entries are evicted
+        cache.set('key1', [path], {})
+        cache.set('key2', [path], {})
+        assert cache.get('key1', [path]) is None
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_cacheable():
+    assert server._cacheable(['sample-data/polygons.geojson', '-w', '20'])
+    assert not server._cacheable(['-', '-w', '20'])
+    assert not server._cacheable(['in.geojson', '--outfile', 'out.txt'])
+
+
+def test_unix_socket(poly_file, compare_ascii):
+    tmpdir = tempfile.mkdtemp()
+    address = os.path.join(tmpdir, 'gj2ascii.sock')
+    thread = threading.Thread(target=server.serve, args=(cli.main, address))
+    thread.daemon = True
+    thread.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(address):
+                break
+            time.sleep(0.05)
+        response = server.request(address, [poly_file, '-w', '20'])
+        with fio.open(poly_file) as src:
+            expected = gj2ascii.render(src, 20)
+        assert response['exit_code'] == 0
+        assert compare_ascii(response['output'], expected)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_handle_exception():
+    response = server._handle(cli.main, {'args': ['does-not-exist.geojson']}, None)
+    assert response['exit_code'] != 0
+    assert response['output'].startswith('Error:')
+
+
+def test_handle_relative_paths(poly_file, compare_ascii):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        shutil.copy(poly_file, os.path.join(tmpdir, 'polygons.geojson'))
+        cwd = os.getcwd()
+        payload = {
+            'args': ['polygons.geojson', '-w', '20', '--outfile=out.txt'], 'cwd': tmpdir}
+        response = server._handle(cli.main, payload, None)
+        assert response['exit_code'] == 0
+        assert os.getcwd() == cwd
+        with fio.open(poly_file) as src:
+            expected = gj2ascii.render(src, 20)
+        with open(os.path.join(tmpdir, 'out.txt')) as f:
+            assert compare_ascii(f.read().strip(), expected)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_walk():
+    args = [
+        'in.geojson', '-o', '-', '--bbox', '-1', '-1', '1', '1', '--no-style', '-', '--width=20']
+    walked = [(args[idx], opt and opt.name) for idx, opt, _ in server._walk(cli.main, args)]
+    assert walked == [
+        ('in.geojson', None), ('-', 'outfile'), ('-1', 'bbox'), ('-1', 'bbox'), ('1', 'bbox'),
+        ('1', 'bbox'), ('-', None), ('--width=20', 'width')]
+
+
+def test_server_stdin_outfile(monkeypatch, poly_file):
+    # Only `-` as an input reads stdin, so `-o -` must not block on it
+    forwarded = []
+
+    def request(address, args, input=None):
+        forwarded.append(input)
+        return {'exit_code': 0, 'output': ''}
+
+    monkeypatch.setattr(server, 'request', request)
+    runner = CliRunner()
+    result = runner.invoke(
+        cli.main, ['--server', 'addr', poly_file, '-o', '-'], input='not read')
+    assert result.exit_code == 0
+    result = runner.invoke(cli.main, ['--server', 'addr', '-'], input='read')
+    assert result.exit_code == 0
+    assert forwarded == [None, 'read']
@@ -0,0 +1,144 @@
+"""
+Unittests for gj2ascii.subcell
+"""
+
+
+import os
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.pyramid import Pyramid
+from gj2ascii.subcell import GLYPHS
+from gj2ascii.subcell import pack_labels
+
+
+def _unpack(text, glyphs):
+    """
+    Slow reference decoder mapping every character back to its sub-cells.
+    """
+    if glyphs == 'braille':
+        rows, cols = 4, 2
+        # Dot numbers 1-8 by (row, col)
+        bits = {(0, 0): 0, (1, 0): 1, (2, 0): 2, (0, 1): 3, (1, 1): 4, (2, 1): 5,
+                (3, 0): 6, (3, 1): 7}
+    else:
+        rows, cols = 2, 2
+        bits = {(0, 0): 0, (0, 1): 1, (1, 0): 2, (1, 1): 3}
+    quadrants = u' ▘▝▀▖▌▞▛' \
+                u'▗▚▐▜▄▙▟█'
+    lines = text.split(os.linesep)
+    out = np.zeros((len(lines) * rows, len(lines[0]) * cols), dtype=np.uint8)
+    for y, line in enumerate(lines):
+        for x, char in enumerate(line):
+            if char == ' ':
+                continue
+            code = ord(char) - 0x2800 if glyphs == 'braille' else quadrants.index(char)
+            for (r, c), bit in bits.items():
+                out[y * rows + r, x * cols + c] = (code >> bit) & 1
+    return out
+
+
+@pytest.mark.parametrize('glyphs', GLYPHS)
+def test_pack_roundtrip(glyphs):
+    labels = np.random.RandomState(0).randint(0, 2, (16, 12)).astype(np.uint8)
+    assert np.array_equal(_unpack(pack_labels(labels, glyphs), glyphs), labels)
+
+
+def test_pack_chars():
+    assert pack_labels(np.ones((4, 2))) == u'⣿'
+    assert pack_labels(np.zeros((4, 2)), fill='.') == u'.'
+    assert pack_labels([[1, 0], [0, 0], [0, 0], [0, 0]]) == u'⠁'
+    assert pack_labels([[0, 0], [0, 0], [0, 0], [0, 1]]) == u'⢀'
+    assert pack_labels([[1, 0], [0, 1]], 'quadrant') == u'▚'
+    assert pack_labels(np.empty((0, 0))) == u''
+
+
+def test_pack_padding():
+    # 5x3 labels need 2x2 braille characters with the extra sub-cells empty
+    text = pack_labels(np.ones((5, 3), dtype=np.uint8))
+    assert text.split(os.linesep) == [u'⣿⡇', u'⠉⠁']
+
+
+def test_pack_exceptions():
+    with pytest.raises(ValueError):
+        pack_labels(np.ones((4, 2)), glyphs='sextant')
+    with pytest.raises(ValueError):
+        pack_labels(np.ones((4, 2)), fill='..')
+    with pytest.raises(ValueError):
+        pack_labels(np.ones(8))
+
+
+@pytest.mark.parametrize('glyphs', GLYPHS)
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_matches_labels(request, name, glyphs):
+    with fio.open(request.getfixturevalue(name)) as src:
+        features = list(src)
+    text = gj2ascii.render_subcell(features, 20, glyphs=glyphs)
+    lines = text.split(os.linesep)
+    assert all(len(l) == 20 for l in lines)
+
+    # Sub-cells are the labels of a rendering with the same grid
+    rows, cols = (4, 2) if glyphs == 'braille' else (2, 2)
+    ftrz, transform, shape = gj2ascii.core._grid(
+        features, 20 * cols, aspect=2.0 * cols / rows)
+    labels = gj2ascii.core._rasterize(
+        gj2ascii.core._geometry_extractor(features), shape, transform)
+    assert np.array_equal(_unpack(text, glyphs)[:shape[0]], labels)
+
+
+def test_same_size_as_render(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+    rows = len(gj2ascii.render(features, 20).splitlines())
+    for glyphs in GLYPHS:
+        assert len(gj2ascii.render_subcell(features, 20, glyphs=glyphs).splitlines()) \
+            in (rows, rows + 1)
+
+
+def test_labels_input(poly_file):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=64, levels=2)
+    ftrz, transform, shape = gj2ascii.core._grid(pyramid, 40)
+    assert gj2ascii.render_subcell(pyramid, 20) == pack_labels(pyramid.labels(shape, transform))
+
+
+def test_render_exceptions(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+    for kwargs in ({'width': 0}, {'glyphs': 'sextant'}, {'fill': ''}, {'aspect': 0}):
+        with pytest.raises(ValueError):
+            gj2ascii.render_subcell(features, **dict({'width': 20}, **kwargs))
+
+
+def test_max_cells(poly_file):
+    with fio.open(poly_file) as src:
+        text = gj2ascii.render_subcell(src, 40, max_cells=400)
+    lines = text.split(os.linesep)
+    assert len(lines) * 4 * len(lines[0]) * 2 <= 400 + len(lines[0]) * 8
+
+
+def test_cli(runner, poly_file):
+    with fio.open(poly_file) as src:
+        expected = gj2ascii.render_subcell(src, 30, glyphs='quadrant', fill='.')
+    result = runner.invoke(cli.main, [
+        poly_file, '--glyphs', 'quadrant', '--width', '30', '--fill', '.'])
+    assert result.exit_code == 0
+    assert result.output == expected + '\n'
+
+
+@pytest.mark.parametrize('args', [
+    ['--glyphs', 'sextant'],
+    ['--glyphs', 'braille', '--iterate'],
+    ['--glyphs', 'braille', '--tiles', '2x2'],
+    ['--glyphs', 'braille', '--density', 'linear'],
+    ['--glyphs', 'braille', '--processes', '2'],
+    ['--glyphs', 'braille', '-c', '+']])
+def test_cli_exceptions(runner, poly_file, args):
+    result = runner.invoke(cli.main, [poly_file, '--no-prompt'] + args)
+    assert result.exit_code != 0
+    result = runner.invoke(cli.main, [poly_file, poly_file, '--glyphs', 'braille'])
+    assert result.exit_code != 0
@@ -0,0 +1,103 @@
+"""
+Unittests for gj2ascii.tiles
+"""
+
+
+import json
+import os
+import shutil
+import tempfile
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.tiles import TileStore
+from gj2ascii.tiles import is_store
+
+
+@pytest.fixture(scope='function')
+def tempdir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.mark.parametrize('all_touched', [True, False])
+def test_matches_pyramid(poly_file, tempdir, all_touched):
+    path = os.path.join(tempdir, 'store')
+    with fio.open(poly_file) as src:
+        pyramid = gj2ascii.Pyramid.build(src, width=128, levels=3, all_touched=all_touched)
+        store = TileStore.build(
+            src, path, width=128, levels=3, tile_size=16, all_touched=all_touched)
+        x_min, y_min, x_max, y_max = src.bounds
+        full = gj2ascii.render(src, 128, all_touched=all_touched)
+
+    assert is_store(path)
+    assert store.bounds == pyramid.bounds
+    assert gj2ascii.render(store, 128, all_touched=all_touched) == full
+    for width in (20, 40, 80, 200):
+        for bbox in (None, (x_min, y_min, (x_min + x_max) / 2, y_max)):
+            assert gj2ascii.render(store, width, bbox=bbox, all_touched=all_touched) \
+                == gj2ascii.render(pyramid, width, bbox=bbox, all_touched=all_touched)
+
+
+def test_empty_tiles_are_skipped(point_file, tempdir):
+    path = os.path.join(tempdir, 'store')
+    with fio.open(point_file) as src:
+        store = TileStore.build(src, path, width=256, levels=1, tile_size=16)
+    written = os.listdir(os.path.join(path, '0'))
+    rows, cols = store.shapes[0]
+    assert 0 < len(written) < -(-rows // 16) * -(-cols // 16)
+
+
+def test_read_window(poly_file, tempdir):
+    path = os.path.join(tempdir, 'store')
+    with fio.open(poly_file) as src:
+        pyramid = gj2ascii.Pyramid.build(src, width=64, levels=1)
+        store = TileStore.build(src, path, width=64, levels=1, tile_size=10)
+    window = store.read(0, (5, 27, 3, 41))
+    assert np.array_equal(window, pyramid.levels[0][5:27, 3:41])
+
+
+def test_not_a_store(tempdir, poly_file):
+    assert not is_store(tempdir)
+    assert not is_store(poly_file)
+    with open(os.path.join(tempdir, 'index.json'), 'w') as f:
+        json.dump({'format': 'something-else'}, f)
+    assert not is_store(tempdir)
+    with pytest.raises(ValueError):
+        TileStore(tempdir)
+
+
+def test_cli(runner, poly_file, line_file, tempdir, compare_ascii):
+    path = os.path.join(tempdir, 'polygons.tiles')
+    result = runner.invoke(cli.main, [poly_file, '--build-cache', path])
+    assert result.exit_code == 0
+    assert is_store(path)
+
+    with fio.open(poly_file) as src:
+        bbox = [str(b) for b in src.bounds]
+    # 128 text columns lines up with the coarsest level so the output is exact
+    expected = runner.invoke(cli.main, [poly_file, line_file, '-w', '128', '--bbox'] + bbox)
+    actual = runner.invoke(cli.main, [path, line_file, '-w', '128', '--bbox'] + bbox)
+    assert actual.exit_code == 0
+    assert compare_ascii(expected.output, actual.output)
+
+    result = runner.invoke(cli.main, [path, '--iterate'])
+    assert result.exit_code != 0
+    assert 'Tile stores' in result.output
+
+
+def test_cli_all_touched_mismatch(runner, poly_file, tempdir):
+    path = os.path.join(tempdir, 'polygons.tiles')
+    result = runner.invoke(cli.main, [poly_file, '--build-cache', path, '--all-touched'])
+    assert result.exit_code == 0
+    assert runner.invoke(cli.main, [path, '--all-touched']).exit_code == 0
+    for args in ([path], [path, '--glyphs', 'braille'], [path, '--tiles', '2x2', '--no-prompt']):
+        result = runner.invoke(cli.main, args)
+        assert result.exit_code == 1
+        assert isinstance(result.exception, SystemExit)
+        assert 'built with `--all-touched`' in result.output
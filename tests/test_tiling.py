@@ -0,0 +1,95 @@
+"""
+Unittests for gj2ascii.tiling
+"""
+
+
+import os
+
+import fiona as fio
+import numpy as np
+import pytest
+
+import gj2ascii
+from gj2ascii import cli
+from gj2ascii.geobuffer import GeometryBuffer
+from gj2ascii.pyramid import Pyramid
+from gj2ascii.tiling import tile_bounds
+
+
+def test_tile_bounds():
+    grid = tile_bounds((0, 10, 30, 30), (3, 2))
+    assert grid == [
+        (0, 20, 10, 30), (10, 20, 20, 30), (20, 20, 30, 30),
+        (0, 10, 10, 20), (10, 10, 20, 20), (20, 10, 30, 20)]
+    assert tile_bounds((0, 0, 1, 1), (1, 1)) == [(0, 0, 1, 1)]
+    for tiles in ((0, 1), (1, 0)):
+        with pytest.raises(ValueError):
+            tile_bounds((0, 0, 1, 1), tiles)
+
+
+@pytest.mark.parametrize('all_touched', [False, True])
+@pytest.mark.parametrize('name', ['poly_file', 'line_file', 'point_file'])
+def test_matches_render(request, name, all_touched):
+    with fio.open(request.getfixturevalue(name)) as src:
+        features = list(src)
+        bbox = src.bounds
+    pages = list(gj2ascii.paginate_tiles(
+        features, (3, 2), width=20, fill='.', all_touched=all_touched))
+    assert len(pages) == 6
+    for page, tile in zip(pages, tile_bounds(bbox, (3, 2))):
+        expected = gj2ascii.render(
+            features, 20, fill='.', bbox=tile, all_touched=all_touched) + os.linesep
+        assert page == expected
+
+    # Pre-built buffers are not copied
+    geometries = GeometryBuffer.from_features(features)
+    assert list(gj2ascii.paginate_tiles(
+        geometries, (3, 2), width=20, fill='.', all_touched=all_touched)) == pages
+
+
+def test_stitched(poly_file):
+    with fio.open(poly_file) as src:
+        features = list(src)
+        bbox = src.bounds
+    pages = gj2ascii.paginate_tiles(features, (2, 1), width=20, bbox=bbox)
+    stitched = np.hstack([gj2ascii.ascii2array(p.rstrip(os.linesep)) for p in pages])
+    assert np.array_equal(stitched, gj2ascii.ascii2array(gj2ascii.render(features, 40)))
+
+
+def test_labels_input(poly_file):
+    with fio.open(poly_file) as src:
+        pyramid = Pyramid.build(src, width=64, levels=2)
+    pages = list(gj2ascii.paginate_tiles(pyramid, (2, 2), width=10))
+    assert len(pages) == 4
+    assert pages[0] == gj2ascii.render(
+        pyramid, 10, bbox=tile_bounds(pyramid.bounds, (2, 2))[0]) + os.linesep
+
+
+def test_colormap(poly_file):
+    with fio.open(poly_file) as src:
+        pages = list(gj2ascii.paginate_tiles(
+            src, (2, 1), width=20, char='+', colormap={'+': 'red'}))
+    assert all(gj2ascii.ANSI_COLORMAP['red'] in p for p in pages if '+' in p)
+
+
+def test_cli(runner, poly_file):
+    with fio.open(poly_file) as src:
+        expected = ''.join(p + '\n' for p in gj2ascii.paginate_tiles(src, (2, 3), width=20))
+    result = runner.invoke(cli.main, [
+        poly_file, '--tiles', '2x3', '--width', '20', '--no-prompt', '--no-style'])
+    assert result.exit_code == 0
+    assert result.output == expected
+
+
+@pytest.mark.parametrize('args', [
+    ['--tiles', '2'],
+    ['--tiles', '0x2'],
+    ['--tiles', 'axb'],
+    ['--tiles', '2x2', '--iterate'],
+    ['--tiles', '2x2', '--density', 'linear'],
+    ['--tiles', '2x2', '-c', '+', '-c', '-']])
+def test_cli_exceptions(runner, poly_file, args):
+    result = runner.invoke(cli.main, [poly_file, '--no-prompt'] + args)
+    assert result.exit_code != 0
+    result = runner.invoke(cli.main, ['-', '--tiles', '2x2'], input='')
+    assert result.exit_code != 0